@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Import-time benchmark of :program:`cygenja`.
+
+Imports a module (by default ``cygenja.generator``) in fresh interpreters started with ``python -X importtime`` and
+reports the best cumulative import time. The benchmark fails (exit status 1) if:
+
+- a module that must only be imported when rendering (i.e. ``jinja2``) is imported eagerly;
+- the best cumulative import time exceeds the budget.
+
+Usage (from the root of the repository):
+
+    python3 benchmarks/import_time.py
+    python3 benchmarks/import_time.py --budget 30 --runs 10 --verbose
+
+``-X importtime`` needs Python 3.7 or later: run it with a recent interpreter.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules only needed to render templates (or to analyse them). threading is cheap: the pipeline imports it at once
+LAZY_MODULES = ['jinja2', 'markupsafe', 'inspect', 'glob', 'json', 'hashlib', 'traceback',
+                'cygenja.filters.type_filters', 'cygenja.jinja2_environment', 'cygenja.compiled_templates']
+
+DEFAULT_MODULE = 'cygenja.generator'
+DEFAULT_BUDGET_MS = 40.0
+DEFAULT_RUNS = 5
+
+
+def measure_import(module, python=sys.executable):
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        module (str): Name of the module to import.
+        python (str): Interpreter to use.
+
+    Returns:
+        A dictionary ``(module_name, cumulative_time_in_us)`` of **all** the modules imported by ``module``.
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join([ROOT_DIRECTORY, environment.get('PYTHONPATH', '')])
+
+    process = subprocess.Popen([python, '-X', 'importtime', '-c', 'import %s' % module],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               env=environment)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError('Import of %s failed:\n%s' % (module, stderr.decode('utf-8', 'replace')))
+
+    timings = dict()
+    for line in stderr.decode('utf-8', 'replace').splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        timings[fields[2].strip()] = int(fields[1])
+
+    return timings
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Import-time benchmark of cygenja')
+    parser.add_argument('--module', default=DEFAULT_MODULE, help='Module to import (default: %(default)s)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Budget in milliseconds for the best cumulative import time (default: %(default)s)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Number of runs (default: %(default)s)')
+    parser.add_argument('--verbose', action='store_true', help='Print the 10 slowest imports of the best run')
+    return parser
+
+
+def main():
+    if sys.version_info < (3, 7):
+        print('-X importtime needs Python 3.7 or later')
+        return 2
+
+    arg_options = make_parser().parse_args()
+
+    best_timings = None
+    for _ in range(max(arg_options.runs, 1)):
+        timings = measure_import(arg_options.module)
+        if best_timings is None or timings[arg_options.module] < best_timings[arg_options.module]:
+            best_timings = timings
+
+    best_time_ms = best_timings[arg_options.module] / 1000.0
+    print('%s: %.1f ms (best of %d runs, budget %.1f ms)' % (arg_options.module, best_time_ms, arg_options.runs,
+                                                             arg_options.budget))
+
+    if arg_options.verbose:
+        for name, cumulative in sorted(best_timings.items(), key=lambda item: -item[1])[:10]:
+            print('  %8.1f ms  %s' % (cumulative / 1000.0, name))
+
+    failed = False
+
+    eager_modules = [name for name in LAZY_MODULES if name in best_timings]
+    if eager_modules:
+        print('FAILED: modules imported eagerly: %s' % ', '.join(eager_modules))
+        failed = True
+
+    if best_time_ms > arg_options.budget:
+        print('FAILED: import time over budget')
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
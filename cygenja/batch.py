@@ -0,0 +1,403 @@
+"""
+Generation of several project roots in one process.
+
+A :class:`BatchGenerator` manages one :class:`Generator` per root directory (i.e. per sibling package). All the
+generators share:
+
+- one :program:`Jinja2` environment (imported and created once), with its filters and its cache of compiled templates:
+  a template included by several roots is only compiled once;
+- one pool of workers;
+- one scheduler: the jobs of all the roots are streamed through the same pipeline (longest jobs first), so that the
+  workers are kept busy from the first job of the first root to the last job of the last root.
+
+    batch = BatchGenerator()
+    batch.register_filter('type2enum', type2enum)
+    for directory in ['package_a', 'package_b']:
+        generator = batch.add_root(directory)
+        generator.register_extension('.cpy', '.py')
+        generator.register_action('src/**', '*.cpy', action_function)
+    batch.generate('.', '*.*', recursively=True, workers=8)
+
+Each root keeps its own registry (extensions and actions) and its own state directory.
+"""
+import itertools
+
+from cygenja.generator import LOGGING_INFO, Generator
+from cygenja.pipeline import RunStatistics
+
+
+class BatchGenerator(object):
+    """
+    Driver of several :class:`Generator` objects sharing one environment, one pool of workers and one scheduler.
+
+    """
+    def __init__(self, jinja2_environment=None, logger=None, raise_exception_on_warning=False):
+        """
+        Constructor.
+
+        Args:
+            jinja2_environment: :program:`Jinja2` environment or callable without argument returning one, only called
+                when the environment is first needed. If ``None``, an environment is created with
+                :meth:`Generator.create_jinja2_environment`.
+            logger: A logger (from the standard ``logging``) or ``None`` is no logging is wanted. Also given to the
+                generators created by the batch.
+            raise_exception_on_warning (bool): If set to ``True``, raise a ``RuntimeError`` when logging a warning.
+        """
+        super(BatchGenerator, self).__init__()
+        self.__logger = logger
+        self.__raise_exception_on_warning = raise_exception_on_warning
+
+        self.__jinja2_environment = None
+        self.__jinja2_environment_factory = Generator.create_jinja2_environment
+        if callable(jinja2_environment):
+            self.__jinja2_environment_factory = jinja2_environment
+        elif jinja2_environment is not None:
+            self.__jinja2_environment = jinja2_environment
+
+        # filters shared by all the roots, installed when the environment is created
+        self.__filters = dict()
+        self.__common_type_filters_registered = False
+
+        self.__generators = list()
+
+        # pool of workers kept between runs: (workers, use_processes, pool)
+        self.__pool = None
+        self.__last_run_statistics = None
+
+    ###########################################################################
+    # LOGGING
+    ###########################################################################
+    def log_info(self, msg, *args):
+        """
+        Log an information message. Arguments are only formatted if the message is logged.
+
+        """
+        if self.__logger is not None:
+            self.__logger.info(msg, *args)
+
+    def log_warning(self, msg):
+        """
+        Log a warning and raise a ``RuntimeError`` if asked to.
+
+        """
+        if self.__logger is not None:
+            self.__logger.warning(msg)
+        if self.__raise_exception_on_warning:
+            raise RuntimeError(msg)
+
+    def log_error(self, msg):
+        """
+        Log an error and raise a ``RuntimeError``.
+
+        """
+        if self.__logger is not None:
+            self.__logger.error(msg)
+        raise RuntimeError(msg)
+
+    ###########################################################################
+    # JINJA2 ENVIRONMENT AND FILTERS
+    ###########################################################################
+    def jinja2_environment(self):
+        """
+        Return the shared :program:`Jinja2` environment, created if needed.
+
+        """
+        if self.__jinja2_environment is None:
+            self.__jinja2_environment = self.__jinja2_environment_factory()
+            for filter_name, filter_ref in self.__filters.items():
+                self.__install_filter(filter_name, filter_ref)
+        return self.__jinja2_environment
+
+    def __install_filter(self, filter_name, filter_ref):
+        """
+        Install a filter of the batch in the shared environment.
+
+        Raises:
+            RuntimeError: If a root registered another filter with the same name: it would render with the filter of
+                the batch.
+        """
+        filters = self.__jinja2_environment.filters
+        installed_filter = filters.get(filter_name)
+        if installed_filter is not None and filter_ref not in (installed_filter,
+                                                               getattr(installed_filter, '__wrapped__', None)):
+            if any(filter_name in generator.registered_filters_list() for generator in self.__generators):
+                self.log_error("Filter %s of a root conflicts with the filter of the batch." % filter_name)
+        filters[filter_name] = filter_ref
+
+    def register_filter(self, filter_name, filter_ref, force=False, pure=False):
+        """
+        Add/register one filter for all the roots.
+
+        Args:
+            filter_name (str): Filter name used inside :program:`Jinja2` tags.
+            filter_ref: Reference to the filter itself, i.e. the corresponding :program:`Python` function.
+            force (bool): If set to ``True``, forces the registration of a filter no matter if it already exists or not.
+            pure (bool): Memoize the results of the filter. See :meth:`Generator.register_filter`.
+
+        Raises:
+            RuntimeError: If another filter is registered with the same name (without ``force``) by the batch or by a
+                root: all the roots render with the same filters.
+        """
+        registered_filter = self.__filters.get(filter_name)
+        if registered_filter is not None and filter_ref in (registered_filter,
+                                                            getattr(registered_filter, '__wrapped__', None)):
+            return
+        if not force and registered_filter is not None:
+            # the roots (i.e. of different projects) would render with the other filter
+            self.log_error("Filter %s already exist with another filter." % filter_name)
+
+        if pure:
+            from cygenja.filter_cache import memoize_filter
+
+            filter_ref = memoize_filter(filter_ref)
+
+        self.__filters[filter_name] = filter_ref
+        if self.__jinja2_environment is not None:
+            self.__install_filter(filter_name, filter_ref)
+
+    def register_filters(self, filters, force=False, pure=False):
+        """
+        Add/register filters for all the roots.
+
+        Args:
+            filters (dict): Dictionary of Python functions to use as :program:`Jinja2` filters.
+            force (bool): See :meth:`register_filter`.
+            pure (bool): See :meth:`register_filter`.
+        """
+        for filter_name, filter_ref in filters.items():
+            self.register_filter(filter_name, filter_ref, force, pure)
+
+    def pure_filters_cache_info(self):
+        """
+        Return the ``(filter_name, cache_info)`` dictionary of the pure filters. See
+        :meth:`Generator.pure_filters_cache_info`.
+
+        """
+        return dict((filter_name, filter_ref.cache_info()) for filter_name, filter_ref in self.__filters.items()
+                    if hasattr(filter_ref, 'cache_info'))
+
+    def register_common_type_filters(self, type_registry=None, force=False):
+        """
+        Add/register the common type filters for all the roots. See :meth:`Generator.register_common_type_filters`.
+
+        The filters are only registered once, no matter how many projects ask for them.
+        """
+        if self.__common_type_filters_registered and not force:
+            return
+
+        from cygenja.filters.type_registry import TypeRegistry
+
+        if type_registry is None:
+            type_registry = TypeRegistry()
+
+        try:
+            filters = type_registry.filters()
+        except TypeError as e:
+            self.log_error('Type registry is not valid: %s' % e)
+
+        from cygenja.filter_cache import prime_filter
+
+        self.register_filters(filters, force=True, pure=True)
+        for filter_name, filter_ref in filters.items():
+            prime_filter(self.__filters[filter_name], filter_ref.table)
+        self.__common_type_filters_registered = True
+
+    ###########################################################################
+    # ROOTS
+    ###########################################################################
+    def add_root(self, directory, **options):
+        """
+        Add a root directory.
+
+        Args:
+            directory (str): Root directory of the new :class:`Generator`.
+            options: Other arguments of the :class:`Generator` constructor (``state_directory``, ``log_details``, ...).
+
+        Returns:
+            The :class:`Generator` of the root, sharing the environment of the batch. Register its extensions and actions
+            on it, its filters on the batch.
+        """
+        options.setdefault('logger', self.__logger)
+        options.setdefault('raise_exception_on_warning', self.__raise_exception_on_warning)
+        options['shared_jinja2_environment'] = True
+
+        generator = Generator(directory, self.jinja2_environment, **options)
+        self.__generators.append(generator)
+        return generator
+
+    def add_project(self, project_filename, use_cache=True, log_details=False):
+        """
+        Add the root of a project file. See :mod:`cygenja.project`.
+
+        The filters of the project are registered on the batch. The ``[environment]`` options of the project are
+        ignored: the environment of the batch is used.
+
+        Args:
+            project_filename (str): The project file.
+            use_cache (bool): Reuse (and save) the cached registry of the project.
+            log_details (bool): Log every file.
+
+        Returns:
+            The :class:`Generator` of the project.
+
+        Raises:
+            ValueError: If the project file is not valid.
+        """
+        from cygenja.project import Project
+
+        project = Project(project_filename)
+        generator = project.create_generator(logger=self.__logger,
+                                             use_cache=use_cache,
+                                             log_details=log_details,
+                                             jinja2_environment=self.jinja2_environment,
+                                             register_filters=False)
+        project.register_filters(self)
+        self.__generators.append(generator)
+        return generator
+
+    def generators(self):
+        """
+        Return the list of the :class:`Generator` objects of the roots, in order.
+
+        """
+        return list(self.__generators)
+
+    ###########################################################################
+    # POOL
+    ###########################################################################
+    def __get_pool(self, workers, use_processes):
+        """
+        Return the pool of workers, (re)created if needed.
+
+        Thread pools are kept between runs. Process pools are forked for each run: the workers must inherit the
+        environment as it is at the beginning of the run.
+        """
+        if self.__pool is not None:
+            pool_workers, pool_use_processes, pool = self.__pool
+            if pool_workers == workers and not pool_use_processes and not use_processes:
+                return pool
+            self.close()
+
+        from cygenja.pipeline import create_pool
+
+        pool = create_pool(self.jinja2_environment(), workers, use_processes)
+        self.__pool = (workers, use_processes, pool)
+        return pool
+
+    def close(self):
+        """
+        Close the pool of workers, if any.
+
+        """
+        if self.__pool is not None:
+            pool = self.__pool[2]
+            self.__pool = None
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    ###########################################################################
+    # GENERATION
+    ###########################################################################
+    def generate(self, dir_pattern, file_pattern, action_ch='g', recursively=False, force=False, workers=1,
+                 max_in_flight=None, use_processes=False, resume=False):
+        """
+        Generate the files of all the roots.
+
+        With the `g` action, the jobs of all the roots are streamed, root after root, through **one** pipeline: the
+        workers don't wait for the end of a root to render the jobs of the next one. The `d` and `c` actions are done
+        root after root.
+
+        Args:
+            dir_pattern: ``glob`` pattern taken from the root directory of each generator.
+            file_pattern: ``fnmatch`` pattern taken from all matching directories.
+            action_ch (char): `g`, `d` or `c`. See :meth:`Generator.generate`.
+            recursively (bool): Do we visit the sub-directories?
+            force (bool): Do we force the generation or not?
+            workers (int): Number of workers rendering the templates.
+            max_in_flight (int): Maximum number of jobs rendered or waiting to be written at the same time.
+            use_processes (bool): Render with (forked) processes instead of threads.
+            resume (bool): Resume the interrupted run of each root. See :meth:`Generator.generate`.
+        """
+        if action_ch != 'g':
+            for generator in self.__generators:
+                generator.generate(dir_pattern, file_pattern, action_ch=action_ch, recursively=recursively,
+                                   force=force, workers=workers, resume=resume)
+            return
+
+        from cygenja.pipeline import RenderingError, run_jobs
+
+        statistics = RunStatistics()
+        self.__last_run_statistics = statistics
+
+        # generator of each job in flight
+        owners = dict()
+        started_generators = list()
+
+        def generate_jobs():
+            for generator in self.__generators:
+                started_generators.append(generator)
+                for job in generator.begin_generation(dir_pattern, file_pattern, recursively=recursively, force=force,
+                                                      copy_contexts=workers > 1, resume=resume):
+                    owners[id(job)] = generator
+                    yield job
+
+        def write_job(job, code_generated):
+            owners.pop(id(job)).write_job(job, code_generated)
+
+        def job_cost(job):
+            return owners[id(job)].estimated_render_time(job)
+
+        completed = False
+        statistics.start()
+        try:
+            jobs = generate_jobs()
+            try:
+                first_job = next(jobs)
+            except StopIteration:
+                # nothing to render: the environment is not even needed
+                first_job = None
+
+            if first_job is not None:
+                environment = self.jinja2_environment()
+                # install the filters of every generator before forking workers
+                for generator in self.__generators:
+                    generator.jinja2_environment()
+                pool = self.__get_pool(workers, use_processes) if workers > 1 else None
+                try:
+                    run_jobs(itertools.chain([first_job], jobs),
+                             environment,
+                             write_job,
+                             workers=workers,
+                             max_in_flight=max_in_flight,
+                             statistics=statistics,
+                             pool=pool,
+                             job_cost=job_cost)
+                except RenderingError as e:
+                    self.log_error(str(e))
+                finally:
+                    if use_processes:
+                        self.close()
+            completed = True
+        finally:
+            for generator in started_generators:
+                generator.end_generation(completed)
+            statistics.stop()
+            statistics.written_files = sum(len(generator.written_files()) for generator in started_generators)
+
+        if self.__logger is not None and self.__logger.isEnabledFor(LOGGING_INFO):
+            self.log_info('Batch: %d roots, %d rendered, %d written in %.2f s (peak memory %s kB)',
+                          len(started_generators), statistics.jobs, statistics.written_files, statistics.duration,
+                          statistics.peak_rss_kb)
+
+    def last_run_statistics(self):
+        """
+        Return the :class:`RunStatistics` of the last `g` run of the batch (all roots together) or ``None``.
+
+        """
+        return self.__last_run_statistics
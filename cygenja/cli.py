@@ -0,0 +1,289 @@
+"""
+The ``cygenja`` command.
+
+    cygenja [-p cygenja.cfg] [-v] generate [dir_pattern] [file_pattern] [-f] [-j 4]
+    cygenja dry-run [dir_pattern] [file_pattern] [-j 4]
+    cygenja clean [dir_pattern] [file_pattern]
+    cygenja compile [dir_pattern] [file_pattern]
+    cygenja serve [--socket server.sock]
+
+The project (filters, extensions, actions, ...) is described by a project file: see :mod:`cygenja.project`. With
+several project files (``-p a/cygenja.cfg -p b/cygenja.cfg``), all the projects are generated by one
+:class:`BatchGenerator`, in one process.
+
+``cygenja serve`` keeps the generator of the project warm in a :class:`GenerationServer`. With ``--server``, the
+``generate``, ``dry-run`` and ``clean`` commands are forwarded to this server instead: see :mod:`cygenja.server`.
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import sys
+
+
+def make_parser():
+    """
+    Return the parser of the command line.
+
+    """
+    from cygenja import __version__
+    from cygenja.project import DEFAULT_PROJECT_FILENAME
+
+    parser = argparse.ArgumentParser(prog='cygenja', description='cygenja: a Cython code generator with Jinja2')
+    parser.add_argument('--version', action='version', version='%(prog)s ' + __version__)
+    parser.add_argument('-p', '--project', action='append', dest='projects',
+                        help='Project file (default: %s). Repeat the option to generate several projects in one '
+                             'process' % DEFAULT_PROJECT_FILENAME)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log a summary per directory')
+    parser.add_argument('--details', action='store_true', help='Log every file (implies --verbose)')
+    parser.add_argument('--no-cache', action='store_true', help="Don't use (nor save) the cached registry")
+    parser.add_argument('--server', action='store_true', help='Forward the command to the server of the project')
+    parser.add_argument('--socket', help='Socket of the server (default: server.sock in the state directory)')
+
+    patterns_parser = argparse.ArgumentParser(add_help=False)
+    patterns_parser.add_argument('dir_pattern', nargs='?', default='.', help='Glob pattern')
+    patterns_parser.add_argument('file_pattern', nargs='?', default='*', help='Fnmatch pattern')
+    patterns_parser.add_argument('--no-recursion', action='store_true', help="Don't visit the sub-directories")
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    generate_parser = subparsers.add_parser('generate', parents=[patterns_parser], help='Generate the files')
+    generate_parser.add_argument('-f', '--force', action='store_true', help='Force generation no matter what')
+    generate_parser.add_argument('-j', '--workers', type=int, default=1,
+                                 help='Number of workers rendering the templates')
+    generate_parser.add_argument('--processes', action='store_true', help='Render with processes instead of threads')
+    generate_parser.add_argument('--resume', action='store_true',
+                                 help="Resume the last run if it was interrupted: don't generate again what it wrote")
+    generate_parser.add_argument('--profile-filters', action='store_true',
+                                 help='Count and time the calls to the filters, per template, and print them')
+    generate_parser.add_argument('--depfile', help='Write the dependencies of the generated files in this file')
+    generate_parser.add_argument('--depfile-format', choices=['make', 'ninja'], default='make',
+                                 help='Format of the depfile')
+
+    dry_run_parser = subparsers.add_parser('dry-run', parents=[patterns_parser],
+                                           help='Show what would be generated, without generating anything')
+    dry_run_parser.add_argument('-j', '--workers', type=int, default=1,
+                                help='Number of workers to estimate the rendering time with')
+    dry_run_parser.add_argument('--depfile', help='Write the dependencies of the generated files in this file')
+    dry_run_parser.add_argument('--depfile-format', choices=['make', 'ninja'], default='make',
+                                help='Format of the depfile')
+
+    subparsers.add_parser('clean', parents=[patterns_parser], help='Remove the generated files')
+    subparsers.add_parser('compile', parents=[patterns_parser], help='Compile the templates ahead of time')
+    subparsers.add_parser('serve', help='Serve the commands of clients (see --server), keeping the generator warm')
+
+    return parser
+
+
+def create_logger(verbose):
+    """
+    Return the logger of the command.
+
+    Args:
+        verbose (bool): Log information messages or only warnings and errors.
+    """
+    logger = logging.getLogger('cygenja')
+    logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+def run(arg_options):
+    """
+    Run a command.
+
+    Args:
+        arg_options: Parsed command line.
+    """
+    from cygenja.project import DEFAULT_PROJECT_FILENAME, Project
+
+    logger = create_logger(arg_options.verbose or arg_options.details)
+
+    projects = arg_options.projects or [DEFAULT_PROJECT_FILENAME]
+    if len(projects) > 1:
+        if arg_options.server or arg_options.command == 'serve':
+            raise ValueError('The server only serves one project')
+        return run_batch(arg_options, projects, logger)
+
+    if arg_options.command == 'serve':
+        return run_server(arg_options, projects[0], logger)
+    if arg_options.server:
+        return run_client(arg_options, projects[0])
+
+    profile_filters = getattr(arg_options, 'profile_filters', False)
+    generator = Project(projects[0]).create_generator(logger=logger,
+                                                      use_cache=not arg_options.no_cache,
+                                                      log_details=arg_options.details,
+                                                      profile_filters=profile_filters)
+
+    recursively = not arg_options.no_recursion
+
+    if arg_options.command == 'generate':
+        generator.use_compiled_templates()
+        generator.generate(arg_options.dir_pattern,
+                           arg_options.file_pattern,
+                           action_ch='g',
+                           recursively=recursively,
+                           force=arg_options.force,
+                           depfile=arg_options.depfile,
+                           depfile_format=arg_options.depfile_format,
+                           workers=arg_options.workers,
+                           use_processes=arg_options.processes,
+                           resume=arg_options.resume)
+        if profile_filters:
+            print('Filters:')
+            for line in generator.filter_profile().summary_lines(generator.root_directory()):
+                print('   %s' % line)
+    elif arg_options.command == 'dry-run':
+        generator.generate(arg_options.dir_pattern,
+                           arg_options.file_pattern,
+                           action_ch='d',
+                           recursively=recursively,
+                           depfile=arg_options.depfile,
+                           depfile_format=arg_options.depfile_format,
+                           workers=arg_options.workers)
+    elif arg_options.command == 'clean':
+        generator.generate(arg_options.dir_pattern,
+                           arg_options.file_pattern,
+                           action_ch='c',
+                           recursively=recursively)
+    elif arg_options.command == 'compile':
+        generator.compile_templates(arg_options.dir_pattern,
+                                    arg_options.file_pattern,
+                                    recursively=recursively)
+
+
+def run_batch(arg_options, projects, logger):
+    """
+    Run a command on several projects with one :class:`BatchGenerator`.
+
+    Args:
+        arg_options: Parsed command line.
+        projects (list): Project files.
+        logger: Logger of the command.
+    """
+    from cygenja.batch import BatchGenerator
+
+    with BatchGenerator(logger=logger) as batch:
+        for project in projects:
+            batch.add_project(project, use_cache=not arg_options.no_cache, log_details=arg_options.details)
+
+        recursively = not arg_options.no_recursion
+
+        if arg_options.command == 'generate':
+            if arg_options.depfile is not None:
+                raise ValueError('--depfile is not supported with several projects')
+            if arg_options.profile_filters:
+                raise ValueError('--profile-filters is not supported with several projects')
+            batch.generate(arg_options.dir_pattern,
+                           arg_options.file_pattern,
+                           action_ch='g',
+                           recursively=recursively,
+                           force=arg_options.force,
+                           workers=arg_options.workers,
+                           use_processes=arg_options.processes,
+                           resume=arg_options.resume)
+        elif arg_options.command in ('dry-run', 'clean'):
+            if getattr(arg_options, 'depfile', None) is not None:
+                raise ValueError('--depfile is not supported with several projects')
+            batch.generate(arg_options.dir_pattern,
+                           arg_options.file_pattern,
+                           action_ch='d' if arg_options.command == 'dry-run' else 'c',
+                           recursively=recursively,
+                           workers=getattr(arg_options, 'workers', 1))
+        elif arg_options.command == 'compile':
+            for generator in batch.generators():
+                generator.compile_templates(arg_options.dir_pattern,
+                                            arg_options.file_pattern,
+                                            recursively=recursively)
+
+
+def run_server(arg_options, project, logger):
+    """
+    Serve the requests of clients until a ``shutdown`` request or an interruption.
+
+    Args:
+        arg_options: Parsed command line.
+        project (str): Project file.
+        logger: Logger of the command.
+    """
+    from cygenja.server import GenerationServer
+
+    server = GenerationServer(project, socket_path=arg_options.socket, logger=logger,
+                              use_cache=not arg_options.no_cache)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_client(arg_options, project):
+    """
+    Forward a command to the server of a project and print its answer.
+
+    Args:
+        arg_options: Parsed command line.
+        project (str): Project file.
+
+    Raises:
+        RuntimeError: If the server failed to serve the command.
+    """
+    from cygenja.run_report import RunReport
+    from cygenja.server import default_socket_path, send_request
+
+    commands = {'generate': 'generate', 'dry-run': 'plan', 'clean': 'clean'}
+    if arg_options.command not in commands:
+        raise ValueError("Command '%s' can't be forwarded to the server" % arg_options.command)
+
+    request = {'command': commands[arg_options.command],
+               'dir_pattern': arg_options.dir_pattern,
+               'file_pattern': arg_options.file_pattern,
+               'recursively': not arg_options.no_recursion,
+               'force': getattr(arg_options, 'force', False),
+               'workers': getattr(arg_options, 'workers', 1),
+               'resume': getattr(arg_options, 'resume', False)}
+
+    socket_path = arg_options.socket if arg_options.socket is not None else default_socket_path(project)
+    show_events = arg_options.verbose or arg_options.details or arg_options.command == 'dry-run'
+
+    for answer in send_request(socket_path, request):
+        if 'event' in answer:
+            if show_events:
+                print('   %s %s' % (answer['event'], answer['file']))
+        elif answer['status'] != 'ok':
+            raise RuntimeError(answer.get('message', 'request failed'))
+        else:
+            print('%s (%.2f s)' % (RunReport.format_counts(answer['counts']) or 'nothing to do', answer['duration']))
+
+
+def main(argv=None):
+    """
+    Entry point of the ``cygenja`` command.
+
+    Args:
+        argv (list): Arguments (without the program name). By default, ``sys.argv[1:]``.
+
+    Returns:
+        The exit status.
+    """
+    parser = make_parser()
+    arg_options = parser.parse_args(argv)
+
+    if arg_options.command is None:
+        parser.print_usage()
+        return 2
+
+    try:
+        run(arg_options)
+    except (ValueError, RuntimeError) as e:
+        print('cygenja: error: %s' % e, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Ahead-of-time compiled templates.
+
+:func:`compile_templates_archive` compiles templates into Python modules stored in a zip archive (with
+:meth:`jinja2.Environment.compile_templates`) and writes a manifest with the hash of the source of each template. The
+:class:`CompiledTemplateLoader` loads templates from the archive when their source didn't change since compilation and
+falls back to the source otherwise: lexing and parsing are skipped for unchanged templates.
+
+The compiled code depends on the :program:`Python` and :program:`Jinja2` versions: an archive compiled with other
+versions is ignored.
+"""
+import hashlib
+import json
+import os
+import sys
+
+import jinja2
+
+from cygenja.helpers.template_analysis import find_referenced_templates
+
+
+def template_hash(source):
+    """
+    Return the hash of the source of a template.
+
+    Args:
+        source (unicode): Source of the template.
+    """
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def compilation_versions():
+    """
+    Return the versions the compiled code depends on, as stored in the manifest.
+
+    """
+    return {'python': '%d.%d' % sys.version_info[:2], 'jinja2': jinja2.__version__}
+
+
+def read_manifest(manifest_filename):
+    """
+    Read the manifest of an archive of compiled templates.
+
+    Args:
+        manifest_filename (str): Filename of the manifest.
+
+    Returns:
+        The ``(template_name, template_hash)`` dictionary or ``None`` if the manifest doesn't exist, can't be read or
+        was written for other :program:`Python` or :program:`Jinja2` versions.
+    """
+    try:
+        with open(manifest_filename, 'r') as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if manifest.get('versions') != compilation_versions():
+        return None
+
+    return manifest.get('templates')
+
+
+def find_all_template_names(environment, template_names):
+    """
+    Return the names of some templates and of **all** the templates they reference, recursively.
+
+    Referenced templates are kept with the names used inside the templates: these are the names the compiled templates
+    will be loaded with. Templates that don't exist (anymore) are left out.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+        template_names (list): Names of the templates.
+    """
+    all_names = list()
+    seen = set()
+    to_visit = list(template_names)
+
+    while to_visit:
+        name = to_visit.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            referenced_names = find_referenced_templates(environment, name)
+        except jinja2.TemplateNotFound:
+            # removed template: nothing to compile
+            continue
+        all_names.append(name)
+        to_visit.extend(referenced_names)
+
+    return all_names
+
+
+class _ListedTemplatesLoader(jinja2.BaseLoader):
+    """
+    Loader listing a given set of templates and delegating everything else to another loader.
+
+    :meth:`jinja2.Environment.compile_templates` compiles the templates listed by the loader: our loaders can't list
+    their templates.
+    """
+    def __init__(self, loader, template_names):
+        super(_ListedTemplatesLoader, self).__init__()
+        self.__loader = loader
+        self.__template_names = template_names
+
+    def get_source(self, environment, template):
+        return self.__loader.get_source(environment, template)
+
+    def list_templates(self):
+        return list(self.__template_names)
+
+
+def compile_templates_archive(environment, template_names, archive_filename, manifest_filename):
+    """
+    Compile templates into a zip archive and write its manifest.
+
+    Both files are first written under temporary names and then renamed: a concurrent run either sees the old or the
+    new archive.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+        template_names (list): Names of the templates to compile. Referenced templates are **not** added: see
+            :func:`find_all_template_names`.
+        archive_filename (str): Filename of the zip archive.
+        manifest_filename (str): Filename of the manifest.
+
+    Returns:
+        The ``(template_name, template_hash)`` dictionary of the manifest.
+
+    Raises:
+        TemplateSyntaxError: If a template can not be compiled.
+    """
+    hashes = dict()
+    for name in template_names:
+        source, _, _ = environment.loader.get_source(environment, name)
+        hashes[name] = template_hash(source)
+
+    compile_environment = environment.overlay(loader=_ListedTemplatesLoader(environment.loader, template_names))
+
+    temporary_archive_filename = archive_filename + '.tmp'
+    compile_environment.compile_templates(temporary_archive_filename, zip='deflated', ignore_errors=False)
+
+    temporary_manifest_filename = manifest_filename + '.tmp'
+    with open(temporary_manifest_filename, 'w') as f:
+        json.dump({'versions': compilation_versions(), 'templates': hashes}, f, indent=1, sort_keys=True)
+
+    os.rename(temporary_archive_filename, archive_filename)
+    os.rename(temporary_manifest_filename, manifest_filename)
+
+    return hashes
+
+
+def forget_archive(archive_filename):
+    """
+    Drop the cached directory of a zip archive kept by ``zipimport``.
+
+    ``zipimport`` caches the table of contents of each archive by filename: it must be dropped before a rewritten
+    archive is loaded again in the same process.
+
+    Args:
+        archive_filename (str): Filename of the zip archive.
+    """
+    import zipimport
+    directory_cache = getattr(zipimport, '_zip_directory_cache', None)
+    if directory_cache is not None:
+        directory_cache.pop(archive_filename, None)
+
+
+class CompiledTemplateLoader(jinja2.BaseLoader):
+    """
+    :program:`Jinja2` loader using an archive of compiled templates when possible.
+
+    Sources are always read through the source loader (i.e. an :class:`AbsolutePathLoader`) to compute their hashes: a
+    template is loaded from the archive **only** if its hash is the one recorded in the manifest. Otherwise, it is
+    compiled from its source and recorded as stale.
+    """
+    def __init__(self, source_loader, archive_filename, hashes):
+        """
+        Constructor.
+
+        Args:
+            source_loader: Loader of the sources of the templates.
+            archive_filename (str): Filename of the zip archive.
+            hashes (dict): ``(template_name, template_hash)`` dictionary of the manifest of the archive.
+        """
+        super(CompiledTemplateLoader, self).__init__()
+        self.__source_loader = source_loader
+        self.__hashes = hashes
+        forget_archive(archive_filename)
+        self.__module_loader = jinja2.ModuleLoader(archive_filename)
+        self.__stale_template_names = set()
+
+    def source_loader(self):
+        """
+        Return the loader of the sources of the templates.
+
+        """
+        return self.__source_loader
+
+    def compiled_template_names(self):
+        """
+        Return the names of the templates in the archive.
+
+        """
+        return list(self.__hashes.keys())
+
+    def stale_template_names(self):
+        """
+        Return the names of the templates that had to be compiled from their source: changed or not in the archive.
+
+        """
+        return list(self.__stale_template_names)
+
+    def get_source(self, environment, template):
+        return self.__source_loader.get_source(environment, template)
+
+    def list_templates(self):
+        return self.__source_loader.list_templates()
+
+    def load(self, environment, name, globals=None):
+        if globals is None:
+            globals = {}
+
+        source, filename, uptodate = self.__source_loader.get_source(environment, name)
+
+        if self.__hashes.get(name) == template_hash(source):
+            try:
+                template = self.__module_loader.load(environment, name, globals)
+            except jinja2.TemplateNotFound:
+                pass
+            else:
+                # templates from modules are always considered up to date: keep the check of the source
+                template._uptodate = uptodate
+                return template
+
+        self.__stale_template_names.add(name)
+        code = environment.compile(source, name, filename)
+        return environment.template_class.from_code(environment, code, globals, uptodate)
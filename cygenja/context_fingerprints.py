@@ -0,0 +1,240 @@
+"""
+Fingerprints of the contexts used to generate files.
+
+A generated file is also outdated if the part of its context its template **uses** changed since it was generated.
+Templates are analysed once (per content hash) to find the variables they reference, through their includes, imports
+and parents too: only these keys of the context are fingerprinted. Changing a key that a template never references
+doesn't regenerate its outputs.
+
+Both the variables of the templates and the fingerprints of the generated files are kept in JSON files in the state
+directory of the :class:`Generator`.
+"""
+import hashlib
+import json
+
+from cygenja.helpers.file_helpers import read_json_file, write_json_file
+from cygenja.helpers.template_analysis import resolve_template_name
+from cygenja.layered_context import LayeredContext
+
+
+def _stable_repr(value):
+    """
+    Return a representation of a value that doesn't change between runs.
+
+    Functions and classes are represented by their qualified names (their ``repr`` contains their address).
+
+    Raises:
+        TypeError: If the value only has the default ``repr``, that contains its address.
+    """
+    if callable(value) and hasattr(value, '__name__'):
+        return '%s.%s' % (getattr(value, '__module__', ''), value.__name__)
+    if getattr(getattr(value, '__class__', type(value)), '__repr__', object.__repr__) is object.__repr__:
+        raise TypeError("Object of type %s has no stable representation" % type(value).__name__)
+    return repr(value)
+
+
+def _stable_default(value):
+    """
+    Return a stable representation of a value that JSON can't serialize.
+
+    """
+    if isinstance(value, (set, frozenset)):
+        return sorted(_stable_repr(element) for element in value)
+    if isinstance(value, LayeredContext):
+        # i.e. the contexts of cygenja_outputs
+        return value.flatten()
+    return _stable_repr(value)
+
+
+def context_fingerprint(context, keys):
+    """
+    Return the fingerprint of some keys of a context.
+
+    Args:
+        context (dict): The context.
+        keys: The keys to take into account. Keys not in the context are ignored.
+
+    Raises:
+        TypeError: If the value of a key has no stable representation (i.e. an object with the default ``repr``).
+    """
+    used_context = dict((key, context[key]) for key in keys if key in context)
+    try:
+        serialization = json.dumps(used_context, sort_keys=True, default=_stable_default)
+    except TypeError:
+        # name the culprit
+        for key in sorted(used_context):
+            try:
+                json.dumps(used_context[key], sort_keys=True, default=_stable_default)
+            except TypeError as error:
+                raise TypeError("Key '%s' of the context can't be fingerprinted: %s" % (key, error))
+        raise
+    return hashlib.sha1(serialization.encode('utf-8')).hexdigest()
+
+
+class TemplateVariablesCache(object):
+    """
+    Variables referenced by each template, cached by content hash.
+
+    For each template, the cache records the hash of its source, the undeclared variables it references and the names
+    of the templates it references. Variables of a template are those of the template and of **all** the templates it
+    references, recursively: a change in an included template is taken into account.
+    """
+    def __init__(self, filename, search_directories):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the cache.
+            search_directories (list): **Absolute** directories where templates with relative names are looked for.
+        """
+        super(TemplateVariablesCache, self).__init__()
+        self.__filename = filename
+        self.__search_directories = search_directories
+        self.__entries = read_json_file(filename)
+        self.__modified = False
+        # template filename -> variables, for the current run
+        self.__variables = dict()
+
+    def start_run(self):
+        """
+        Forget the variables computed during the previous run: templates might have changed since.
+
+        """
+        self.__variables = dict()
+
+    def __template_entry(self, environment_factory, template_filename):
+        """
+        Return the up to date cache entry of one template.
+
+        """
+        try:
+            with open(template_filename, 'rb') as f:
+                source = f.read()
+        except (IOError, OSError):
+            return None
+
+        source_hash = hashlib.sha1(source).hexdigest()
+        entry = self.__entries.get(template_filename)
+        if entry is not None and entry['hash'] == source_hash:
+            return entry
+
+        from jinja2 import meta
+
+        environment = environment_factory()
+        ast = environment.parse(source.decode('utf-8'), template_filename, template_filename)
+        entry = {'hash': source_hash,
+                 'variables': sorted(meta.find_undeclared_variables(ast)),
+                 'references': [name for name in meta.find_referenced_templates(ast) if name is not None]}
+        self.__entries[template_filename] = entry
+        self.__modified = True
+
+        return entry
+
+    def variables(self, environment_factory, template_filename):
+        """
+        Return the variables referenced by a template and all the templates it references.
+
+        Args:
+            environment_factory: Callable returning the :program:`Jinja2` environment. Only called if a template has to
+                be parsed.
+            template_filename (str): **Absolute** filename of the template.
+
+        Returns:
+            A ``frozenset`` of variable names.
+        """
+        variables = self.__variables.get(template_filename)
+        if variables is not None:
+            return variables
+
+        variables = set()
+        seen = set([template_filename])
+        to_visit = [template_filename]
+        while to_visit:
+            entry = self.__template_entry(environment_factory, to_visit.pop())
+            if entry is None:
+                continue
+            variables.update(entry['variables'])
+            for name in entry['references']:
+                filename = resolve_template_name(name, self.__search_directories)
+                if filename is not None and filename not in seen:
+                    seen.add(filename)
+                    to_visit.append(filename)
+
+        variables = frozenset(variables)
+        self.__variables[template_filename] = variables
+
+        return variables
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write.
+
+        """
+        return self.__modified
+
+    def save(self):
+        """
+        Write the cache if it was modified.
+
+        """
+        if self.__modified:
+            write_json_file(self.__filename, self.__entries)
+            self.__modified = False
+
+
+class ContextFingerprints(object):
+    """
+    Fingerprints of the contexts of the generated files.
+
+    """
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the fingerprints.
+        """
+        super(ContextFingerprints, self).__init__()
+        self.__filename = filename
+        self.__fingerprints = read_json_file(filename)
+        self.__modified = False
+
+    def get_fingerprint(self, generated_filename):
+        """
+        Return the recorded fingerprint of a generated file or ``None``.
+
+        """
+        return self.__fingerprints.get(generated_filename)
+
+    def set_fingerprint(self, generated_filename, fingerprint):
+        """
+        Record the fingerprint of a generated file.
+
+        """
+        if self.__fingerprints.get(generated_filename) != fingerprint:
+            self.__fingerprints[generated_filename] = fingerprint
+            self.__modified = True
+
+    def remove_fingerprint(self, generated_filename):
+        """
+        Forget the fingerprint of a (removed) generated file.
+
+        """
+        if self.__fingerprints.pop(generated_filename, None) is not None:
+            self.__modified = True
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write.
+
+        """
+        return self.__modified
+
+    def save(self):
+        """
+        Write the fingerprints if they were modified.
+
+        """
+        if self.__modified:
+            write_json_file(self.__filename, self.__fingerprints)
+            self.__modified = False
@@ -0,0 +1,112 @@
+"""
+Memoisation of pure filters.
+
+A pure filter (its result only depends on its arguments, i.e. a type mapping) is called again for every occurrence of
+``@type|generic_to_c_type@`` in every rendered template. Registered with ``pure=True`` (see
+:meth:`Generator.register_filter`), it is wrapped by :func:`memoize_filter`: results are kept in a bounded LRU cache
+shared by all the renderings (and threads) of the generator. The arguments of a pure filter must be hashable.
+
+Process workers are forked at the beginning of each run: they inherit the results cached so far (by the previous runs,
+or by :func:`prime_filter`), but what they cache themselves is lost with them.
+"""
+import threading
+
+from collections import namedtuple, OrderedDict
+
+# default maximum number of results kept per filter
+DEFAULT_CACHE_SIZE = 1024
+
+# same fields as functools.lru_cache
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def _lru_cache(filter_ref, maxsize):
+    """
+    Return ``filter_ref`` wrapped with a bounded LRU cache, for :program:`Python` versions without
+    ``functools.lru_cache``.
+
+    """
+    import functools
+
+    cache = OrderedDict()
+    # hits, misses
+    counts = [0, 0]
+    lock = threading.Lock()
+
+    def memoized_filter(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        with lock:
+            try:
+                result = cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                # the most recently used entry goes last: the least recently used one is dropped first
+                cache[key] = result
+                counts[0] += 1
+                return result
+
+        result = filter_ref(*args, **kwargs)
+        with lock:
+            counts[1] += 1
+            cache[key] = result
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+        return result
+
+    def cache_info():
+        return CacheInfo(counts[0], counts[1], maxsize, len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            counts[0] = counts[1] = 0
+
+    try:
+        functools.update_wrapper(memoized_filter, filter_ref)
+    except AttributeError:
+        # i.e. a callable object without __name__
+        memoized_filter.__dict__.update(getattr(filter_ref, '__dict__', dict()))
+    memoized_filter.__wrapped__ = filter_ref
+    memoized_filter.cache_info = cache_info
+    memoized_filter.cache_clear = cache_clear
+
+    return memoized_filter
+
+
+def memoize_filter(filter_ref, maxsize=DEFAULT_CACHE_SIZE):
+    """
+    Return a pure filter wrapped with a bounded LRU cache of its results.
+
+    The wrapper has the ``cache_info()`` (hits, misses, maxsize, currsize) and ``cache_clear()`` methods of
+    ``functools.lru_cache``, which is used when available.
+
+    Args:
+        filter_ref: The pure filter.
+        maxsize (int): Maximum number of results kept.
+    """
+    maxsize = max(maxsize, 1)
+    try:
+        from functools import lru_cache
+    except ImportError:
+        # Python 2
+        return _lru_cache(filter_ref, maxsize)
+
+    return lru_cache(maxsize=maxsize)(filter_ref)
+
+
+def prime_filter(memoized_filter, values):
+    """
+    Cache the results of a memoized filter for some values, i.e. before process workers are forked.
+
+    Values the filter rejects (``TypeError`` or ``ValueError``) are skipped.
+
+    Args:
+        memoized_filter: Filter returned by :func:`memoize_filter`.
+        values: Iterable of the values to call the filter with (one argument per call).
+    """
+    for value in values:
+        try:
+            memoized_filter(value)
+        except (TypeError, ValueError):
+            pass
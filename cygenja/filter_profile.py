@@ -0,0 +1,126 @@
+"""
+Profiling of the registered filters.
+
+When filter profiling is on (``profile_filters=True``), the :class:`Generator` installs each registered filter in its
+:program:`Jinja2` environment wrapped by a :class:`FilterProfile`: every call is counted and timed, per filter and per
+template. A call made from an included (imported, extended...) template is attributed to the template of the job.
+
+    engine = Generator('.', profile_filters=True)
+    engine.generate('.', '*.*', recursively=True)
+    for line in engine.filter_profile().summary_lines(engine.root_directory()):
+        print(line)
+
+Only calls made in the generator process are profiled: with process workers, filters run in the workers.
+"""
+import os
+import threading
+import time
+
+from cygenja.pipeline import rendered_template_filename
+
+# attributes of the filters read by Jinja2 (contextfilter, jinja_pass_arg, ...) are kept by the wrappers
+WRAPPED_ATTRIBUTES = ('__module__', '__name__', '__doc__')
+
+
+class FilterProfile(object):
+    """
+    Number of calls and time spent in each filter, per template.
+
+    """
+    def __init__(self):
+        super(FilterProfile, self).__init__()
+        # (filter_name, template_filename) -> [calls, seconds]
+        self.__entries = dict()
+        # filters can be called by several threads
+        self.__lock = threading.Lock()
+
+    def wrap(self, filter_name, filter_ref):
+        """
+        Return a filter counting and timing the calls to another filter.
+
+        Args:
+            filter_name (str): Filter name used inside :program:`Jinja2` tags.
+            filter_ref: The filter to profile.
+        """
+        entries = self.__entries
+        lock = self.__lock
+
+        def profiled_filter(*args, **kwargs):
+            start_time = time.time()
+            try:
+                return filter_ref(*args, **kwargs)
+            finally:
+                duration = time.time() - start_time
+                key = (filter_name, rendered_template_filename())
+                with lock:
+                    entry = entries.get(key)
+                    if entry is None:
+                        entries[key] = [1, duration]
+                    else:
+                        entry[0] += 1
+                        entry[1] += duration
+
+        for attribute in WRAPPED_ATTRIBUTES:
+            if hasattr(filter_ref, attribute):
+                setattr(profiled_filter, attribute, getattr(filter_ref, attribute))
+        profiled_filter.__dict__.update(getattr(filter_ref, '__dict__', dict()))
+        profiled_filter.__wrapped__ = filter_ref
+
+        return profiled_filter
+
+    def reset(self):
+        """
+        Forget all the calls.
+
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def template_counts(self):
+        """
+        Return the ``(filter_name, (template_filename, (calls, seconds)))`` dictionary of the calls.
+
+        ``template_filename`` is ``None`` for the calls made outside the rendering of a job.
+        """
+        counts = dict()
+        with self.__lock:
+            for (filter_name, template_filename), (calls, seconds) in self.__entries.items():
+                counts.setdefault(filter_name, dict())[template_filename] = (calls, seconds)
+        return counts
+
+    def counts(self):
+        """
+        Return the ``(filter_name, (calls, seconds))`` dictionary of the calls, all templates together.
+
+        """
+        return dict((filter_name, (sum(calls for calls, _ in templates.values()),
+                                   sum(seconds for _, seconds in templates.values())))
+                    for filter_name, templates in self.template_counts().items())
+
+    def summary_lines(self, root_directory=None):
+        """
+        Return the lines of a report: one line per filter followed by one line per template, the most costly first.
+
+        Args:
+            root_directory (str): If given, templates are shown relative to this directory.
+        """
+        lines = list()
+        counts = self.counts()
+        template_counts = self.template_counts()
+
+        for filter_name in sorted(counts, key=lambda name: (-counts[name][1], name)):
+            calls, seconds = counts[filter_name]
+            lines.append('%s: %d calls, %.4f s' % (filter_name, calls, seconds))
+
+            templates = template_counts[filter_name]
+            for template_filename in sorted(templates, key=lambda filename: (-templates[filename][1], filename or '')):
+                calls, seconds = templates[template_filename]
+                if template_filename is None:
+                    template_name = '(outside templates)'
+                elif root_directory is not None:
+                    template_name = os.path.relpath(template_filename, root_directory)
+                else:
+                    template_name = template_filename
+                lines.append('   %s: %d calls, %.4f s' % (template_name, calls, seconds))
+
+        return lines
@@ -0,0 +1,196 @@
+"""
+Precomputed registry of :program:`CySparse` types.
+
+The type filters defined in :mod:`cygenja.filters.type_filters` are called for every occurrence of a filtered variable
+in every rendered template. Instead of slicing strings and walking ``if``/``elif`` chains on each call, a
+:class:`TypeRegistry` computes **once** every mapping for all known types and exposes filters that simply look up
+these tables.
+
+The :mod:`cygenja.filters.type_filters` functions stay the reference implementation: the tables are filled by calling
+them.
+"""
+from cygenja.filters.type_filters import type2enum, cysparse_type_to_numpy_c_type, cysparse_type_to_numpy_type, \
+    cysparse_type_to_numpy_enum_type, cysparse_type_to_real_sum_cysparse_type, \
+    cysparse_real_type_from_real_cysparse_complex_type
+
+# known CySparse types
+CYSPARSE_INDEX_TYPES = ['INT32_t', 'UINT32_t', 'INT64_t', 'UINT64_t']
+CYSPARSE_REAL_ELEMENT_TYPES = ['FLOAT32_t', 'FLOAT64_t', 'FLOAT128_t']
+CYSPARSE_COMPLEX_ELEMENT_TYPES = ['COMPLEX64_t', 'COMPLEX128_t', 'COMPLEX256_t']
+
+CYSPARSE_TYPES = CYSPARSE_INDEX_TYPES + CYSPARSE_REAL_ELEMENT_TYPES + CYSPARSE_COMPLEX_ELEMENT_TYPES
+
+# filters computed by string transformations: an unknown type is transformed on the fly
+STRING_TYPE_FILTERS = {
+    'type2enum': type2enum,
+    'cysparse_type_to_numpy_c_type': cysparse_type_to_numpy_c_type,
+    'cysparse_type_to_numpy_type': cysparse_type_to_numpy_type,
+    'cysparse_type_to_numpy_enum_type': cysparse_type_to_numpy_enum_type,
+}
+
+# filters only defined for some types: an unknown type raises a ``TypeError``
+REAL_SUM_TYPE_FILTER = 'cysparse_type_to_real_sum_cysparse_type'
+REAL_PART_TYPE_FILTER = 'cysparse_real_type_from_real_cysparse_complex_type'
+
+
+def _make_table_filter(filter_name, table, fallback):
+    """
+    Return a :program:`Jinja2` filter looking up its result in ``table``.
+
+    Args:
+        filter_name (str): Name given to the filter function.
+        table (dict): Precomputed ``(type, result)`` mapping.
+        fallback: Function called with the type if it is not in ``table``.
+    """
+    def table_filter(cysparse_type):
+        try:
+            return table[cysparse_type]
+        except KeyError:
+            return fallback(cysparse_type)
+
+    table_filter.__name__ = filter_name
+    table_filter.table = table
+
+    return table_filter
+
+
+def _raise_unknown_type(error_message):
+    """
+    Return a fallback that raises a ``TypeError`` with ``error_message``.
+
+    Args:
+        error_message (str): Message of the exception.
+    """
+    def raise_unknown_type(cysparse_type):
+        raise TypeError(error_message)
+
+    return raise_unknown_type
+
+
+class TypeRegistry(object):
+    """
+    Registry of :program:`CySparse` types with precomputed filter tables.
+
+    By default, all the known :program:`CySparse` types are registered. User types can be added with
+    :meth:`register_type`.
+    """
+    def __init__(self, register_cysparse_types=True):
+        """
+        Constructor.
+
+        Args:
+            register_cysparse_types (bool): Register the known :program:`CySparse` types or start with an empty
+                registry.
+        """
+        super(TypeRegistry, self).__init__()
+        self.__types = list()
+        self.__real_sum_types = dict()
+        self.__real_part_types = dict()
+
+        if register_cysparse_types:
+            for cysparse_type in CYSPARSE_TYPES:
+                real_part_type = None
+                if cysparse_type in CYSPARSE_COMPLEX_ELEMENT_TYPES:
+                    real_part_type = cysparse_real_type_from_real_cysparse_complex_type(cysparse_type)
+                self.register_type(cysparse_type,
+                                   real_sum_type=cysparse_type_to_real_sum_cysparse_type(cysparse_type),
+                                   real_part_type=real_part_type)
+
+    def register_type(self, cysparse_type, real_sum_type, real_part_type=None):
+        """
+        Add/register one type.
+
+        Args:
+            cysparse_type (str): Type name, for instance ``'COMPLEX128_t'``.
+            real_sum_type (str): Best **real** type for a **real** sum of this type, for instance ``'FLOAT64_t'``.
+            real_part_type (str): **Real** type of the real and imaginary parts if ``cysparse_type`` is a complex
+                type, ``None`` otherwise.
+
+        Note:
+            The consistency of the registry is only tested by :meth:`validate`, once all types are registered.
+        """
+        if cysparse_type not in self.__types:
+            self.__types.append(cysparse_type)
+
+        self.__real_sum_types[cysparse_type] = real_sum_type
+
+        if real_part_type is not None:
+            self.__real_part_types[cysparse_type] = real_part_type
+        else:
+            self.__real_part_types.pop(cysparse_type, None)
+
+    def registered_types_list(self):
+        """
+        Return the list of registered types.
+
+        """
+        return list(self.__types)
+
+    def validate(self):
+        """
+        Test the consistency of the registry.
+
+        Raises:
+            TypeError: If a type name is malformed or if a real sum or real part type is not a registered type.
+        """
+        for cysparse_type in self.__types:
+            if not cysparse_type.endswith('_t') or len(cysparse_type) < 3:
+                raise TypeError("Type '%s' is not a recognized type name (must end with '_t')" % cysparse_type)
+
+        for table in (self.__real_sum_types, self.__real_part_types):
+            for cysparse_type, r_type in table.items():
+                if r_type not in self.__types:
+                    raise TypeError("Type '%s' (for type '%s') is not a registered type" % (r_type, cysparse_type))
+                if r_type in self.__real_part_types:
+                    raise TypeError("Type '%s' (for type '%s') is not a real type" % (r_type, cysparse_type))
+
+    def tables(self):
+        """
+        Compute and return all the filter tables.
+
+        Returns:
+            A dictionary ``(filter_name, table)`` where each table is a ``(type, result)`` dictionary.
+
+        Note:
+            Filters computed by string transformations accept both the type (``INT32_t``) and the corresponding enum
+            type (``INT32_T``).
+        """
+        tables = dict()
+
+        for filter_name, filter_function in STRING_TYPE_FILTERS.items():
+            table = dict()
+            for cysparse_type in self.__types:
+                for key in (cysparse_type, type2enum(cysparse_type)):
+                    table[key] = filter_function(key)
+            tables[filter_name] = table
+
+        tables[REAL_SUM_TYPE_FILTER] = dict(self.__real_sum_types)
+        tables[REAL_PART_TYPE_FILTER] = dict(self.__real_part_types)
+
+        return tables
+
+    def filters(self):
+        """
+        Return a dictionary ``(filter_name, filter)`` of table backed filters.
+
+        The tables are computed once, when calling this method. Types registered later are **not** taken into account.
+
+        Raises:
+            TypeError: See :meth:`validate`.
+        """
+        self.validate()
+
+        tables = self.tables()
+        filters = dict()
+
+        for filter_name, filter_function in STRING_TYPE_FILTERS.items():
+            filters[filter_name] = _make_table_filter(filter_name, tables[filter_name], filter_function)
+
+        filters[REAL_SUM_TYPE_FILTER] = _make_table_filter(REAL_SUM_TYPE_FILTER,
+                                                           tables[REAL_SUM_TYPE_FILTER],
+                                                           _raise_unknown_type("Not a recognized type"))
+        filters[REAL_PART_TYPE_FILTER] = _make_table_filter(REAL_PART_TYPE_FILTER,
+                                                            tables[REAL_PART_TYPE_FILTER],
+                                                            _raise_unknown_type("Not a recognized complex type"))
+
+        return filters
@@ -1,17 +1,66 @@
 from __future__ import print_function
 
-import jinja2
 import os
-import glob
+import re
+import sys
 import fnmatch
-
-from cygenja.filters.type_filters import *
-from cygenja.helpers.file_helpers import find_files
+import itertools
+
+# Only light modules are imported here: Jinja2, the pipeline, the type filters... are imported when first needed so
+# that dry runs and cleanings don't pay for them.
+from cygenja.helpers.filesystem_snapshot import DirectoryListingCache, FileSystemSnapshot
+from cygenja.layered_context import LayeredContext, shallow_copy_context
+from cygenja.output_index import OutputIndex, OutputIndexEntry
+from cygenja.pipeline import GenerationJob, RunStatistics
+from cygenja.run_report import RunReport, RENDERED, COPIED, WRITTEN, UP_TO_DATE, REMOVED, LISTED
 from cygenja.treemap.treemap import TreeMap
 
+# a generated file is outdated if its template is more recent by more than this tolerance (1 second)
+MTIME_TOLERANCE_NS = 1000000000
+
+# default directory (inside the root directory) of the persistent data of a generator
+STATE_DIRECTORY_NAME = '.cygenja'
+COMPILED_TEMPLATES_ARCHIVE = 'templates.zip'
+COMPILED_TEMPLATES_MANIFEST = 'templates.json'
+TEMPLATE_VARIABLES_FILENAME = 'template_variables.json'
+CONTEXT_FINGERPRINTS_FILENAME = 'context_fingerprints.json'
+RENDER_HISTORY_FILENAME = 'render_times.json'
+STATIC_TEMPLATES_FILENAME = 'static_templates.json'
+JOURNAL_FILENAME = 'journal.jsonl'
+LISTINGS_FILENAME = 'listings.json'
+TEMPLATE_HASHES_FILENAME = 'template_hashes.json'
+
+CHANGE_DETECTIONS = ('mtime', 'git', 'hash')
+
+# logging.INFO, without importing logging
+LOGGING_INFO = 20
+
+
+# The type filters used to be imported here with 'import *': they stay reachable from this module but are only imported
+# on first access. Module level __getattr__ needs Python 3.7+.
+if sys.version_info < (3, 7):
+    from cygenja.filters.type_filters import *
+
+
+def __getattr__(name):
+    if not name.startswith('_'):
+        from cygenja.filters import type_filters
+
+        if hasattr(type_filters, name):
+            return getattr(type_filters, name)
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+# messages of the per-file details
+EVENT_MESSAGES = {RENDERED: '   Parsing file %s',
+                  WRITTEN: '   Generating file %s',
+                  COPIED: '   Copied static template %s',
+                  UP_TO_DATE: '   Up to date file %s',
+                  REMOVED: '   Removed file %s',
+                  LISTED: '   Listed file %s'}
+
 
 class GeneratorAction(object):
-    def __init__(self, file_pattern, action_function):
+    def __init__(self, file_pattern, action_function, multi_output=False):
         """
         Container to store an "action".
 
@@ -20,10 +69,15 @@ class GeneratorAction(object):
         Args:
             file_pattern: fnmatch pattern.
             action_function: Callback without argument. See documentation.
+            multi_output (bool): If ``True``, templates are rendered **once** for all the outputs of the action.
+                See :mod:`cygenja.helpers.multi_output_helpers`.
         """
         super(GeneratorAction, self).__init__()
         self.__file_pattern = file_pattern
+        # compiled once: the pattern is matched against every template of the directory
+        self.__file_pattern_regex = re.compile(fnmatch.translate(os.path.normcase(file_pattern)))
         self.__action_function = action_function
+        self.__multi_output = multi_output
 
     def run(self):
         return self.__action_function()
@@ -31,8 +85,28 @@ class GeneratorAction(object):
     def action_function_name(self):
         return self.__action_function.__name__
 
+    def action_function_source_file(self):
+        """
+        Return the absolute filename of the module defining the action function or ``None`` if it can not be found.
+
+        """
+        import inspect
+
+        try:
+            source_file = inspect.getsourcefile(self.__action_function)
+        except TypeError:
+            return None
+
+        if source_file is None:
+            return None
+
+        return os.path.abspath(source_file)
+
     def act_on_file(self, filename):
-        return fnmatch.fnmatch(filename, self.__file_pattern)
+        return self.__file_pattern_regex.match(os.path.normcase(filename)) is not None
+
+    def is_multi_output(self):
+        return self.__multi_output
 
 
 class GeneratorActionContainer(object):
@@ -71,7 +145,97 @@ class GeneratorActionContainer(object):
             if action.act_on_file(filename):
                 return action
 
-        return None
+    def copy(self):
+        """
+        Return a new container with the same :class:`GeneratorAction` objects.
+
+        """
+        generator_action_container = GeneratorActionContainer()
+        generator_action_container.__generator_actions = list(self.__generator_actions)
+        return generator_action_container
+
+
+class ActionResolver(object):
+    def __init__(self, actions, subtree_actions, default_action):
+        """
+        Find the actions of the templates in one version of the registered actions.
+
+        The resolver works on frozen snapshots of the :class:`TreeMap` objects of the actions: it can be used during a
+        whole run while other actions are registered. The containers of each directory are only resolved once.
+
+        Args:
+            actions (TreeMap): Actions registered on directories.
+            subtree_actions (TreeMap): Actions registered on subtrees.
+            default_action (GeneratorAction): Default action or ``None``.
+        """
+        super(ActionResolver, self).__init__()
+        self.__actions = actions
+        self.__subtree_actions = subtree_actions
+        self.__default_action = default_action
+        # relative directory -> containers of the actions to try, in order
+        self.__directory_action_containers = dict()
+
+    def is_resolving(self, actions, subtree_actions, default_action):
+        """
+        Test if the resolver works on the current versions of the registered actions.
+
+        """
+        return (self.__actions.version() == actions.version() and
+                self.__subtree_actions.version() == subtree_actions.version() and
+                self.__default_action is default_action)
+
+    def find_action(self, relative_directory, filename):
+        """
+        Return the action to use for a template or ``None`` if none is found.
+
+        Args:
+            relative_directory (str): Directory of the template, relative to the root directory.
+            filename (str): Filename (without directory) of the template.
+
+        Returns:
+            The first compatible :class:`GeneratorAction` registered for this directory (or inherited from one of its
+            ancestors) or the default action.
+        """
+        for generator_action_container in self.__action_containers(relative_directory):
+            action = generator_action_container.get_compatible_generator_action(filename)
+            if action is not None:
+                return action
+
+        # is there a default action if needed?
+        return self.__default_action
+
+    def __action_containers(self, relative_directory):
+        """
+        Return the :class:`GeneratorActionContainer` objects to try, in order, for the templates of a directory.
+
+        The containers of a directory are resolved once: the directory's own actions, then the subtree actions from
+        the directory itself up to the root directory.
+
+        Args:
+            relative_directory (str): Directory, relative to the root directory.
+        """
+        generator_action_containers = self.__directory_action_containers.get(relative_directory)
+        if generator_action_containers is not None:
+            return generator_action_containers
+
+        generator_action_containers = list()
+
+        generator_action_container = self.__actions.retrieve_element_or_default(relative_directory, None)
+        if generator_action_container is not None:
+            generator_action_containers.append(generator_action_container)
+
+        # one walk down the subtree actions, nearest ancestor first
+        subtree_action_containers = list(self.__subtree_actions.generate_elements_along(relative_directory))
+        generator_action_containers.extend(reversed(subtree_action_containers))
+        if relative_directory:
+            # the root directory is the '' location, not a prefix of the other locations
+            root_action_container = self.__subtree_actions.retrieve_element_or_default('', None)
+            if root_action_container is not None:
+                generator_action_containers.append(root_action_container)
+
+        self.__directory_action_containers[relative_directory] = generator_action_containers
+
+        return generator_action_containers
 
 
 class Generator(object):
@@ -82,53 +246,205 @@ class Generator(object):
 
 
     """
-    def __init__(self, directory, jinja2_environment, logger=None, raise_exception_on_warning=False):
+    def __init__(self, directory, jinja2_environment=None, logger=None, raise_exception_on_warning=False, state_directory=None,
+                 log_details=False, check_contexts=False, copy_static_templates=True, profile_filters=False,
+                 cache_listings=True, change_detection='mtime', shared_jinja2_environment=False):
         """
         Constructor of a :program:`cygenja` template machine.
 
         Args:
             directory (str): Absolute or relative base directory. Everything happens in that directory and sub-directories.
-            jinja2_environment: :program:`Jinja2` environment.
+            jinja2_environment: :program:`Jinja2` environment or callable without argument returning one. A callable
+                is only called when the environment is first needed: dry runs and cleanings don't import
+                :program:`Jinja2`. If ``None``, an environment is created with :meth:`create_jinja2_environment`
+                when needed.
             logger: A logger (from the standard ``logging``) or ``None`` is no logging is wanted.
             raise_exception_on_warning (bool): If set to ``True``, raise a ``RuntimeError`` when logging a warning.
+            state_directory (str): Directory where persistent data (i.e. compiled templates) are kept. By default,
+                ``.cygenja`` inside the base directory. It is only created when needed.
+            log_details (bool): If set to ``True``, log every parsed, written, up to date and removed file. By default,
+                only a summary per directory is logged at the end of each run.
+            check_contexts (bool): If set to ``True``, a generated file is also outdated when the values of the
+                variables its template uses changed since it was generated. See :mod:`cygenja.context_fingerprints`.
+                Files whose contexts can't be fingerprinted (i.e. an object with the default ``repr``) are only tested
+                for their modification times, with a warning.
+            copy_static_templates (bool): If set to ``True``, templates without any :program:`Jinja2` construct are
+                copied instead of rendered. See :mod:`cygenja.static_templates`.
+            profile_filters (bool): If set to ``True``, the calls to the registered filters are counted and timed per
+                template. See :meth:`filter_profile`.
+            cache_listings (bool): If set to ``True``, the listings of the directories are kept in the state directory:
+                a directory whose modification time and inode didn't change is not listed again by the next runs. See
+                :class:`DirectoryListingCache`.
+            change_detection (str): How outdated files are found: ``'mtime'`` compares the modification times of the
+                templates and of the generated files, ``'git'`` compares the blob hashes of the templates with the
+                hashes recorded when the files were generated (hashes are read from :program:`git` when possible) and
+                ``'hash'`` does the same without :program:`git`. See :mod:`cygenja.template_hashes`.
+            shared_jinja2_environment (bool): Is the environment shared with other generators (i.e. by a
+                :class:`BatchGenerator`)? If so, registering a filter whose name is already used in the environment is
+                an error, even with ``force``: the other generators would render with this filter or this generator with
+                theirs.
         """
         super(Generator, self).__init__()
 
         # before all the rest, prepare logging
         self.__logger = logger
         self.__raise_exception_on_warning = raise_exception_on_warning
+        self.__log_details = log_details
+        self.__event_listeners = list()
 
         # test if directory exists
         if not os.path.isdir(directory):
             self.log_error('Main directory \'%s\' does not exists!' % directory)
 
         self.__root_directory = os.path.abspath(directory)   # main base directory
-        self.__jinja2_environment = jinja2_environment
+        self.__root_directory_prefix = os.path.join(self.__root_directory, '')
+
+        if state_directory is None:
+            state_directory = os.path.join(self.__root_directory, STATE_DIRECTORY_NAME)
+        self.__state_directory = os.path.abspath(state_directory)
 
+        if change_detection not in CHANGE_DETECTIONS:
+            self.log_error("Change detection '%s' is not recognized (use %s)" %
+                           (change_detection, ', '.join("'%s'" % name for name in CHANGE_DETECTIONS)))
 
+        # listings of the previous runs, loaded with the first snapshot
+        self.__cache_listings = cache_listings
+        self.__listing_cache = None
 
-        self.__jinja2_predefined_filters = self.__jinja2_environment.filters.keys()
+        # listings and stats of the file system, renewed for each run
+        self.__file_system_snapshot = FileSystemSnapshot()
 
+        # the environment is created (and Jinja2 imported) on first use
+        self.__jinja2_environment = None
+        self.__jinja2_environment_factory = self.create_jinja2_environment
+        # only our own loader can reuse the stats made by the generator
+        self.__template_loader = None
+        # manifest of the compiled templates to use once the environment is created
+        self.__compiled_template_hashes = None
 
+        # registered filters, installed in the environment when it is created
+        self.__filters = dict()
+        self.__forced_filter_names = set()
+        self.__shared_jinja2_environment = shared_jinja2_environment
+
+        # calls to the registered filters, if they are profiled
+        self.__filter_profile = None
+        if profile_filters:
+            from cygenja.filter_profile import FilterProfile
+
+            self.__filter_profile = FilterProfile()
+
+        if callable(jinja2_environment):
+            self.__jinja2_environment_factory = jinja2_environment
+        elif jinja2_environment is not None:
+            self.__set_jinja2_environment(jinja2_environment)
 
         self.__extensions = {}
-        self.__actions = TreeMap()
+        # actions can be registered while a run (working on snapshots) is in progress
+        self.__actions = TreeMap(copy_on_write=True)
+        # actions registered on whole subtrees (``dir/**``)
+        self.__subtree_actions = TreeMap(copy_on_write=True)
+        self.__action_resolver = None
 
         self.__default_action = None
 
+        # files written during the current (or last) run
+        self.__written_files = list()
+        self.__last_run_statistics = None
+        self.__run_report = None
+
+        # context fingerprints, loaded from the state directory on first run
+        self.__check_contexts = check_contexts
+        self.__template_variables = None
+        self.__context_fingerprints = None
+        # generated filename -> fingerprint of the context of its pending job
+        self.__pending_fingerprints = dict()
+        # templates whose contexts can't be fingerprinted, reported once per run
+        self.__unfingerprinted_templates = set()
+
+        # render times of the previous runs, loaded when first needed
+        self.__render_history = None
+        # keys in the render history of the jobs listed by a dry run
+        self.__listed_job_keys = list()
+
+        # detection of the static templates, loaded when first needed
+        self.__copy_static_templates = copy_static_templates
+        self.__static_templates = None
+
+        # journal of the written files of the current `g` run, see cygenja.journal
+        self.__journal = None
+
+        # hashes of the templates of the generated files, loaded on first run if content changes are detected
+        self.__change_detection = change_detection
+        self.__template_hashes = None
+        # are the current hashes of the templates read yet (from git if possible)?
+        self.__template_hashes_read = False
+        # generated filename -> hash of the template of its pending job
+        self.__pending_template_hashes = dict()
+
     ###########################################################################
     # LOGGING
     ###########################################################################
-    def log_info(self, msg):
+    def log_info(self, msg, *args):
         """
         Log an information message if ``logger`` exists.
 
         Args:
             msg: Message to log.
+            args: Arguments of the message. The message is only formatted (``msg % args``) if it is logged.
 
         """
         if self.__logger:
-            self.__logger.info(msg)
+            self.__logger.info(msg, *args)
+
+    def __is_logging_info(self):
+        """
+        Test if information messages are logged.
+
+        """
+        return self.__logger is not None and self.__logger.isEnabledFor(LOGGING_INFO)
+
+    def add_event_listener(self, listener):
+        """
+        Add a listener of the generation events.
+
+        Args:
+            listener: Callable ``listener(outcome, filename)`` called for each event of the next runs. ``outcome`` is one
+                of the outcomes of :mod:`cygenja.run_report` and ``filename`` the **absolute** filename of the template
+                (for ``'rendered'``) or of the generated file.
+        """
+        self.__event_listeners.append(listener)
+
+    def __log_event(self, outcome, filename):
+        """
+        Log the details of one event.
+
+        """
+        self.log_info(EVENT_MESSAGES[outcome], filename)
+
+    def __log_run_summary(self, statistics):
+        """
+        Log the summary of the last run: one line per directory and one line for the whole run.
+
+        Args:
+            statistics (RunStatistics): Figures of the run.
+        """
+        if not self.__is_logging_info():
+            return
+
+        for line in self.__run_report.summary_lines():
+            self.log_info('   %s', line)
+
+        summary = RunReport.format_counts(self.__run_report.counts()) or 'nothing to do'
+        if statistics.peak_rss_kb is not None:
+            self.log_info('Run: %s (peak memory %d kB, +%d kB)', summary, statistics.peak_rss_kb, statistics.rss_increase_kb)
+        else:
+            self.log_info('Run: %s', summary)
+
+        if self.__filter_profile is not None:
+            self.log_info('Filters:')
+            for line in self.__filter_profile.summary_lines(self.__root_directory):
+                self.log_info('   %s', line)
 
     def log_warning(self, msg):
         """
@@ -172,10 +488,338 @@ class Generator(object):
         """
         return self.__root_directory
 
+    def state_directory(self):
+        """
+        Return the **absolute** directory of the persistent data of the generator.
+
+        """
+        return self.__state_directory
+
+    def __state_filename(self, basename):
+        """
+        Return the **absolute** filename of a file in the state directory.
+
+        Args:
+            basename (str): Name of the file.
+        """
+        return os.path.join(self.__state_directory, basename)
+
+    def __ensure_state_directory(self):
+        """
+        Create the state directory if needed. Only called right before something is written in it.
+
+        """
+        if not os.path.isdir(self.__state_directory):
+            os.makedirs(self.__state_directory)
+
+    def __save_state(self, state):
+        """
+        Save a persistent state (i.e. :class:`RenderHistory`) if it was created and modified during the run.
+
+        """
+        if state is not None and state.is_modified():
+            self.__ensure_state_directory()
+            state.save()
+
+    def file_system_snapshot(self):
+        """
+        Return the :class:`FileSystemSnapshot` of the current (or last) run.
+
+        """
+        return self.__file_system_snapshot
+
+    def written_files(self):
+        """
+        Return the list of the **absolute** filenames of the files written during the current (or last) run.
+
+        """
+        return list(self.__written_files)
+
+    def __start_run(self):
+        """
+        Reset everything that is recorded per run.
+
+        """
+        self.__written_files = list()
+
+        # files might have changed since the last call
+        self.__renew_file_system_snapshot()
+
+        listeners = list(self.__event_listeners)
+        if self.__log_details:
+            listeners.append(self.__log_event)
+        self.__run_report = RunReport(self.__root_directory, listeners)
+
+        self.__pending_fingerprints = dict()
+        self.__unfingerprinted_templates = set()
+        self.__pending_template_hashes = dict()
+        self.__listed_job_keys = list()
+        if self.__filter_profile is not None:
+            self.__filter_profile.reset()
+        if self.__static_templates is not None:
+            self.__static_templates.start_run()
+        if self.__template_variables is not None:
+            self.__template_variables.start_run()
+        if self.__check_contexts and self.__context_fingerprints is None:
+            from cygenja.context_fingerprints import TemplateVariablesCache, ContextFingerprints
+
+            self.__template_variables = TemplateVariablesCache(
+                os.path.join(self.__state_directory, TEMPLATE_VARIABLES_FILENAME), [self.__root_directory])
+            self.__context_fingerprints = ContextFingerprints(
+                os.path.join(self.__state_directory, CONTEXT_FINGERPRINTS_FILENAME))
+        if self.__change_detection != 'mtime':
+            if self.__template_hashes is None:
+                from cygenja.template_hashes import TemplateHashes
+
+                self.__template_hashes = TemplateHashes(os.path.join(self.__state_directory, TEMPLATE_HASHES_FILENAME),
+                                                        self.__root_directory)
+            self.__template_hashes.start_run()
+            self.__template_hashes_read = False
+
+    def last_run_report(self):
+        """
+        Return the :class:`RunReport` of the last run (counts of events per directory and per outcome) or ``None``.
+
+        """
+        return self.__run_report
+
+    def __renew_file_system_snapshot(self):
+        """
+        Start a new :class:`FileSystemSnapshot` for a new run.
+
+        Files might have changed since the last run.
+        """
+        if self.__cache_listings and self.__listing_cache is None:
+            self.__listing_cache = DirectoryListingCache(os.path.join(self.__state_directory, LISTINGS_FILENAME),
+                                                         self.__root_directory)
+
+        self.__file_system_snapshot = FileSystemSnapshot(self.__listing_cache)
+        if self.__template_loader is not None:
+            self.__template_loader.set_file_system_snapshot(self.__file_system_snapshot)
+
+    def __relative_directory(self, directory):
+        """
+        Return the directory relative to the root directory.
+
+        Args:
+            directory (str): **Absolute** and normalized directory.
+
+        Returns:
+            The relative directory or ``''`` for the root directory itself.
+        """
+        if directory == self.__root_directory:
+            return ''
+        if directory.startswith(self.__root_directory_prefix):
+            return directory[len(self.__root_directory_prefix):]
+        return os.path.relpath(directory, self.__root_directory)
+
+    ###########################################################################
+    # JINJA2 ENVIRONMENT
+    ###########################################################################
+    @staticmethod
+    def create_jinja2_environment(cache_size=400, auto_reload=True, **options):
+        """
+        Create a :program:`Jinja2` environment suited for a :class:`Generator`.
+
+        The environment loads templates by their absolute filenames and reuses the stats made by the :class:`Generator`
+        to check if cached templates are up-to-date. By default, variables are delimited by ``@`` and blocks are trimmed.
+
+        Args:
+            cache_size (int): Size of the cache of compiled templates. ``-1`` means no limit, ``0`` means no cache at all.
+            auto_reload (bool): Check if a cached template is up-to-date before using it. For one-shot batch runs,
+                ``False`` avoids these checks.
+            options: Any other :class:`jinja2.Environment` options (``variable_start_string``, ``trim_blocks``, ...).
+
+        Returns:
+            A :class:`jinja2.Environment` object.
+        """
+        from cygenja.jinja2_environment import create_environment
+
+        return create_environment(cache_size=cache_size, auto_reload=auto_reload, **options)
+
+    def __set_jinja2_environment(self, jinja2_environment):
+        """
+        Install the :program:`Jinja2` environment with its loader and the registered filters.
+
+        Args:
+            jinja2_environment: :program:`Jinja2` environment.
+        """
+        from cygenja.jinja2_environment import AbsolutePathLoader
+
+        self.__jinja2_environment = jinja2_environment
+
+        if self.__static_templates is not None:
+            from cygenja.static_templates import template_syntax
+
+            self.__static_templates.set_syntax(template_syntax(jinja2_environment))
+
+        if isinstance(jinja2_environment.loader, AbsolutePathLoader):
+            self.__template_loader = jinja2_environment.loader
+            self.__template_loader.set_file_system_snapshot(self.__file_system_snapshot)
+            self.__template_loader.add_search_directory(self.__root_directory)
+
+        for filter_name in list(self.__filters.keys()):
+            installed_filter = jinja2_environment.filters.get(filter_name)
+            if self.__filters[filter_name] in (installed_filter, getattr(installed_filter, '__wrapped__', None)):
+                # i.e. environment shared with another generator
+                continue
+            if filter_name in jinja2_environment.filters and self.__shared_jinja2_environment:
+                self.__log_shared_filter_conflict(filter_name)
+            if filter_name in jinja2_environment.filters and filter_name not in self.__forced_filter_names:
+                self.log_warning("Filter %s already exist, ignore redefinition." % filter_name)
+                del self.__filters[filter_name]
+                continue
+            jinja2_environment.filters[filter_name] = self.__environment_filter(filter_name, self.__filters[filter_name])
+
+        if self.__compiled_template_hashes is not None:
+            hashes = self.__compiled_template_hashes
+            self.__compiled_template_hashes = None
+            self.__install_compiled_template_loader(hashes)
+
+    def jinja2_environment(self):
+        """
+        Return the :program:`Jinja2` environment, created if needed.
+
+        """
+        if self.__jinja2_environment is None:
+            self.__set_jinja2_environment(self.__jinja2_environment_factory())
+        return self.__jinja2_environment
+
+    ###########################################################################
+    # COMPILED TEMPLATES
+    ###########################################################################
+    def __install_compiled_template_loader(self, hashes):
+        """
+        Load the templates from the archive of compiled templates from now on.
+
+        If the environment doesn't exist yet, the loader is installed when it is created.
+
+        Args:
+            hashes (dict): ``(template_name, template_hash)`` dictionary of the manifest of the archive.
+        """
+        if self.__jinja2_environment is None:
+            self.__compiled_template_hashes = hashes
+            return
+
+        from cygenja.compiled_templates import CompiledTemplateLoader
+
+        jinja2_environment = self.__jinja2_environment
+        source_loader = jinja2_environment.loader
+        if isinstance(source_loader, CompiledTemplateLoader):
+            source_loader = source_loader.source_loader()
+
+        jinja2_environment.loader = CompiledTemplateLoader(source_loader,
+                                                           self.__state_filename(COMPILED_TEMPLATES_ARCHIVE),
+                                                           hashes)
+
+    def __compile_template_names(self, template_names):
+        """
+        Compile templates and all the templates they reference into the archive and load templates from it.
+
+        Args:
+            template_names (list): Names of the templates.
+
+        Returns:
+            The number of compiled templates.
+        """
+        import jinja2
+        from cygenja.compiled_templates import compile_templates_archive, find_all_template_names
+
+        jinja2_environment = self.jinja2_environment()
+        template_names = find_all_template_names(jinja2_environment, template_names)
+
+        self.__ensure_state_directory()
+        try:
+            hashes = compile_templates_archive(jinja2_environment,
+                                               template_names,
+                                               self.__state_filename(COMPILED_TEMPLATES_ARCHIVE),
+                                               self.__state_filename(COMPILED_TEMPLATES_MANIFEST))
+        except jinja2.TemplateError as e:
+            self.log_error('Templates could not be compiled: %s' % e)
+
+        self.__install_compiled_template_loader(hashes)
+
+        return len(hashes)
+
+    def compile_templates(self, dir_pattern='.', file_pattern='*', recursively=True):
+        """
+        Compile ahead of time the templates into a zip archive in the state directory and load templates from it.
+
+        Templates are found as with :meth:`generate`: **only** templates with a registered extension and a compatible
+        action are compiled, with all the templates they include, import or extend.
+
+        Args:
+            dir_pattern: ``glob`` pattern taken from the root directory. **Only** used for directories.
+            file_pattern: ``fnmatch`` pattern taken from all matching directories. **Only** used for files.
+            recursively: Do we compile the templates in the sub-directories?
+
+        Returns:
+            The number of compiled templates.
+
+        Note:
+            Unchanged templates are loaded from the archive: they are not lexed nor parsed anymore. A changed template
+            is compiled from its source and the archive is rebuilt at the end of the run. See
+            :meth:`use_compiled_templates`.
+        """
+        self.__renew_file_system_snapshot()
+
+        template_filenames = [template_filename for template_filename, _, _ in
+                              self.__discover_templates(self.__match_directories(dir_pattern), file_pattern, recursively)]
+        number_of_templates = self.__compile_template_names(template_filenames)
+        self.log_info('%d template(s) compiled', number_of_templates)
+
+        return number_of_templates
+
+    def use_compiled_templates(self):
+        """
+        Load templates from the archive of compiled templates of the state directory, if any.
+
+        Returns:
+            ``True`` if the archive exists and was compiled with the current :program:`Python` and
+            :program:`Jinja2` versions, ``False`` otherwise.
+
+        Note:
+            The hash of the source of each template is checked before using its compiled version. When a template
+            changed (or isn't in the archive), it is compiled from its source and the archive is rebuilt at the end of
+            the run. With process workers, changed templates are not reported to the generator and the archive isn't
+            rebuilt.
+        """
+        from cygenja.compiled_templates import read_manifest
+
+        archive_filename = os.path.join(self.__state_directory, COMPILED_TEMPLATES_ARCHIVE)
+        hashes = read_manifest(os.path.join(self.__state_directory, COMPILED_TEMPLATES_MANIFEST))
+        if hashes is None or not os.path.isfile(archive_filename):
+            return False
+
+        self.__install_compiled_template_loader(hashes)
+
+        return True
+
+    def __update_compiled_templates(self):
+        """
+        Rebuild the archive of compiled templates if some templates changed since their compilation.
+
+        """
+        if self.__jinja2_environment is None:
+            return
+
+        from cygenja.compiled_templates import CompiledTemplateLoader
+
+        loader = self.__jinja2_environment.loader
+        if not isinstance(loader, CompiledTemplateLoader):
+            return
+
+        stale_template_names = loader.stale_template_names()
+        if not stale_template_names:
+            return
+
+        self.log_info('%d template(s) changed: recompiling templates', len(stale_template_names))
+        self.__compile_template_names(sorted(set(loader.compiled_template_names()) | set(stale_template_names)))
+
     ###########################################################################
     # FILTERS
     ###########################################################################
-    def register_filter(self, filter_name, filter_ref, force=False):
+    def register_filter(self, filter_name, filter_ref, force=False, pure=False):
         """
         Add/register one filter.
 
@@ -183,27 +827,83 @@ class Generator(object):
             filter_name (str): Filter name used inside :program:`Jinja2` tags.
             filter_ref: Reference to the filter itself, i.e. the corresponding :program:`Python` function.
             force (bool): If set to ``True``, forces the registration of a filter no matter if it already exists or not.
+            pure (bool): If set to ``True``, the filter only depends on its (hashable) arguments: its results are
+                memoized in a bounded LRU cache shared by all the renderings. See :meth:`pure_filters_cache_info`.
 
         Note:
             The list of user added/registered filters can be retrieve with :mth:`registered_filters_list`
         """
-        if not force and (filter_name in self.filters_list()):
-            self.log_warning("Extension %s already exist, ignore redefinition." % ext_in)
+        if not force and filter_name in self.__filters:
+            self.log_warning("Filter %s already exist, ignore redefinition." % filter_name)
             return
 
-        self.__jinja2_environment.filters[filter_name] = filter_ref
+        if pure:
+            from cygenja.filter_cache import memoize_filter
+
+            filter_ref = memoize_filter(filter_ref)
+
+        if self.__jinja2_environment is not None:
+            installed_filter = self.__jinja2_environment.filters.get(filter_name)
+            same_filter = filter_ref in (installed_filter, getattr(installed_filter, '__wrapped__', None))
+            if installed_filter is not None and not same_filter and self.__shared_jinja2_environment:
+                self.__log_shared_filter_conflict(filter_name)
+            if not force and filter_name in self.__jinja2_environment.filters:
+                self.log_warning("Filter %s already exist, ignore redefinition." % filter_name)
+                return
+            self.__jinja2_environment.filters[filter_name] = self.__environment_filter(filter_name, filter_ref)
+        elif force:
+            # predefined filters are only known once the environment is created
+            self.__forced_filter_names.add(filter_name)
 
-    def register_filters(self, filters, force=False):
+        self.__filters[filter_name] = filter_ref
+
+    def __log_shared_filter_conflict(self, filter_name):
+        """
+        Log the error of a filter whose name is already used in the shared environment.
+
+        """
+        self.log_error("Filter %s is already used in the shared environment: register it for all the roots." %
+                       filter_name)
+
+    def register_filters(self, filters, force=False, pure=False):
         """
         Add/register filters.
 
         Args:
             filters (dict): Dictionary of Python functions to use as :program:`Jinja2` filters.
             force (bool): If set to ``True``, forces the registration of a filter no matter if it already exists or not.
+            pure (bool): Are the filters pure? See :meth:`register_filter`.
 
         """
         for filter_name, filter_ref in filters.items():
-            self.register_filter(filter_name, filter_ref, force)
+            self.register_filter(filter_name, filter_ref, force, pure)
+
+    def pure_filters_cache_info(self):
+        """
+        Return the ``(filter_name, cache_info)`` dictionary of the registered pure filters.
+
+        ``cache_info`` is a ``(hits, misses, maxsize, currsize)`` named tuple, as given by ``functools.lru_cache``.
+        Only the calls made in the generator process are counted: not the calls made in process workers.
+        """
+        return dict((filter_name, filter_ref.cache_info()) for filter_name, filter_ref in self.__filters.items()
+                    if hasattr(filter_ref, 'cache_info'))
+
+    def __environment_filter(self, filter_name, filter_ref):
+        """
+        Return the filter to install in the environment: the registered filter itself or its profiled version.
+
+        """
+        if self.__filter_profile is None:
+            return filter_ref
+        return self.__filter_profile.wrap(filter_name, filter_ref)
+
+    def filter_profile(self):
+        """
+        Return the :class:`FilterProfile` (calls and time per filter and per template) of the current (or last) run or
+        ``None`` if filters are not profiled.
+
+        """
+        return self.__filter_profile
 
     def filters_list(self):
         """
@@ -213,7 +913,7 @@ class Generator(object):
 
 
         """
-        return self.__jinja2_environment.filters.keys()
+        return self.jinja2_environment().filters.keys()
 
     def registered_filters_list(self):
         """
@@ -222,20 +922,49 @@ class Generator(object):
         The list **only** includes registered filters (**not** the predefined :program:`Jinja2` filters).
 
         """
-        return [filter_name for filter_name in self.__jinja2_environment.filters.keys() if filter_name not in self.__jinja2_predefined_filters ]
+        return list(self.__filters.keys())
 
     # TODO: transform names and put in POCS
-    def register_common_type_filters(self):
+    def register_common_type_filters(self, type_registry=None, force=False):
         """
         Add/register common type filters for the :program:`CySparse` project.
 
+        The filters are backed by tables precomputed by a :class:`TypeRegistry`. The tables are computed and validated
+        once, here, and not during the rendering of the templates. The filters are pure (see :meth:`register_filter`):
+        their caches are primed with the types of the tables, i.e. before process workers are forked.
+
+        Args:
+            type_registry (TypeRegistry): Registry with the types to support. If ``None``, a registry with the known
+                :program:`CySparse` types is used. User types must be registered **before** calling this method.
+            force (bool): If set to ``True``, forces the registration of the filters no matter if they already exist or not.
+
+        Raises:
+            RuntimeError: If the type registry is not consistent.
+        """
+        from cygenja.filters.type_registry import TypeRegistry
+
+        if type_registry is None:
+            type_registry = TypeRegistry()
+
+        try:
+            filters = type_registry.filters()
+        except TypeError as e:
+            self.log_error('Type registry is not valid: %s' % e)
+
+        self.register_filters(filters, force, pure=True)
+        self.__prime_type_filters(filters)
+
+    def __prime_type_filters(self, filters):
+        """
+        Prime the caches of the registered type filters with the types of their tables.
+
         """
-        self.register_filter('type2enum', type2enum)
-        self.register_filter('cysparse_type_to_numpy_c_type', cysparse_type_to_numpy_c_type)
-        self.register_filter('cysparse_type_to_numpy_type', cysparse_type_to_numpy_type)
-        self.register_filter('cysparse_type_to_numpy_enum_type', cysparse_type_to_numpy_enum_type)
-        self.register_filter('cysparse_type_to_real_sum_cysparse_type', cysparse_type_to_real_sum_cysparse_type)
-        self.register_filter('cysparse_real_type_from_real_cysparse_complex_type', cysparse_real_type_from_real_cysparse_complex_type)
+        from cygenja.filter_cache import prime_filter
+
+        for filter_name, filter_ref in filters.items():
+            registered_filter = self.__filters.get(filter_name)
+            if getattr(registered_filter, '__wrapped__', None) is filter_ref:
+                prime_filter(registered_filter, filter_ref.table)
 
     ###########################################################################
     # FILE EXTENSIONS
@@ -279,26 +1008,39 @@ class Generator(object):
         """
         return self.__extensions.keys()
 
+    def registered_extensions_dict(self):
+        """
+        Return a dictionary ``(ext_in, ext_out)`` of registered extensions.
+
+        """
+        return dict(self.__extensions)
+
     ###########################################################################
     # ACTIONS
     ###########################################################################
-    def __add_action(self, relative_directory, action):
+    def __add_action(self, relative_directory, action, subtree=False):
         """
         Add action into the dictionary of actions.
 
         Args:
             relative_directory:
             action:
+            subtree (bool): Is the action registered for the whole subtree of the directory?
 
         """
-        generator_action_container = self.__actions.retrieve_element_or_default(relative_directory, None)
-
-        if generator_action_container is None:
-            generator_action_container = GeneratorActionContainer()
-            generator_action_container.add_generator_action(action)
-            self.__actions.add_element(location=relative_directory, element=generator_action_container)
-        else:
+        actions = self.__subtree_actions if subtree else self.__actions
+
+        def add_generator_action(generator_action_container):
+            if generator_action_container is None:
+                generator_action_container = GeneratorActionContainer()
+            elif actions.is_copy_on_write():
+                # the container might be used by a run: publish a new one
+                generator_action_container = generator_action_container.copy()
             generator_action_container.add_generator_action(action)
+            return generator_action_container
+
+        # concurrent registrations on the same directory are serialized by the tree
+        actions.update_element(relative_directory, add_generator_action)
 
     def __retrieve_generator_action_container(self, relative_directory):
         """
@@ -332,15 +1074,15 @@ class Generator(object):
             for end_string, context in action_function():
                 if not isinstance(end_string, basestring):
                     self.log_error("Action function must return end of filename as a string as first argument")
-                if not isinstance(context, dict):
-                    self.log_error("Action function must return context as a dict as second argument")
+                if not isinstance(context, (dict, LayeredContext)):
+                    self.log_error("Action function must return context as a dict (or a LayeredContext) as second argument")
                 break
         except Exception:
             is_function_action = False
 
         return is_function_action
 
-    def register_action(self, relative_directory, file_pattern, action_function):
+    def register_action(self, relative_directory, file_pattern, action_function, multi_output=False):
         """
         Add/register an "action".
 
@@ -353,30 +1095,46 @@ class Generator(object):
                 This means that all files corresponding to the `'find*.cpy'` pattern inside the `cysparse/sparse/utils`
                 directory can (see Warning) be dealt with the `action_function`.
 
+                A relative directory ending with ``**`` registers the action for the whole subtree of the directory:
+
+                >>> register_action('cysparse/sparse/**', '*.cpy', action_function)
+
+                applies to the templates of `cysparse/sparse` and of all its sub-directories. Use ``'**'`` for the whole
+                tree.
+
             file_pattern: A :program:`fnmatch` pattern for the files concerned by this action.
             action_function: A callback without argument. See documentation.
+            multi_output (bool): If ``True``, each template is rendered **once** for all the outputs of the action
+                and marks the region of each output. See :mod:`cygenja.helpers.multi_output_helpers`.
 
         Warning:
             The order in which you add actions is important. A file will be dealt with the **first** compatible
-            action found.
+            action found. Actions registered on the directory of the file come first, then the subtree actions of the
+            directory itself and of its ancestors, from the nearest to the farthest.
         """
+        subtree = False
+        if relative_directory == '**' or relative_directory.endswith(os.sep + '**') or relative_directory.endswith('/**'):
+            subtree = True
+            relative_directory = relative_directory[:-2].rstrip('/' + os.sep)
+
         # test if directory exists
-        if not os.path.isdir(os.path.join(self.__root_directory, relative_directory)):
+        if not self.__file_system_snapshot.is_dir(os.path.join(self.__root_directory, relative_directory)):
             self.log_error('Relative directory \'%s\' does not exist.' % relative_directory)
             return
 
         if not self.__is_function_action(action_function):
                 self.log_error('Attached function is not an action function.')
 
-        self.__add_action(relative_directory, GeneratorAction(file_pattern, action_function))
+        self.__add_action(relative_directory, GeneratorAction(file_pattern, action_function, multi_output), subtree)
 
-    def register_default_action(self, file_pattern,  action_function):
+    def register_default_action(self, file_pattern,  action_function, multi_output=False):
         """
         Default action used if no compatible action is found.
 
         Args:
             file_pattern: A :program:`fnmatch` pattern for the files concerned by this action.
             action_function:
+            multi_output (bool): See :meth:`register_action`.
 
         Warning:
             Be careful when defining a default action. This action is be applied to **all** template files for
@@ -390,50 +1148,998 @@ class Generator(object):
         if not self.__is_function_action(action_function):
             self.log_error('Attached default function is not an action function.')
 
-        self.__default_action = GeneratorAction(file_pattern=file_pattern, action_function=action_function)
+        self.__default_action = GeneratorAction(file_pattern=file_pattern, action_function=action_function, multi_output=multi_output)
 
-    def registered_actions_treemap(self):
+    def __get_action_resolver(self):
         """
-        Return a list of registered actions.
+        Return the :class:`ActionResolver` of the current version of the registered actions.
+
+        A run gets the resolver once: actions registered during the run (i.e. by another thread) are only taken into
+        account by the next runs.
+        """
+        action_resolver = self.__action_resolver
+        if action_resolver is None or not action_resolver.is_resolving(self.__actions, self.__subtree_actions,
+                                                                        self.__default_action):
+            action_resolver = ActionResolver(self.__snapshot(self.__actions),
+                                             self.__snapshot(self.__subtree_actions),
+                                             self.__default_action)
+            self.__action_resolver = action_resolver
+
+        return action_resolver
+
+    @staticmethod
+    def __snapshot(treemap):
+        """
+        Return a frozen view of a :class:`TreeMap` or the tree itself if it is not in copy-on-write mode.
+
+        """
+        return treemap.snapshot() if treemap.is_copy_on_write() else treemap
+
+    def export_registry(self):
+        """
+        Return the registered extensions and actions.
+
+        The registry can be pickled (if the action functions can be) and installed in another :class:`Generator` with
+        :meth:`import_registry`. Filters are **not** part of the registry.
+
+        Returns:
+            A ``dict`` with the ``'extensions'``, ``'actions'`` (the :class:`TreeMap` of the actions),
+            ``'subtree_actions'`` (the :class:`TreeMap` of the actions registered on subtrees) and ``'default_action'``
+            keys.
+        """
+        return {'extensions': self.__extensions,
+                'actions': self.__actions,
+                'subtree_actions': self.__subtree_actions,
+                'default_action': self.__default_action}
+
+    def import_registry(self, registry):
+        """
+        Install extensions and actions exported by :meth:`export_registry`.
+
+        Previously registered extensions and actions are replaced. Nothing is checked: the registry is supposed to have
+        been built by a :class:`Generator` with the same root directory.
+
+        Args:
+            registry (dict): The registry.
+        """
+        self.__extensions = registry['extensions']
+        self.__actions = registry['actions']
+        self.__subtree_actions = registry.get('subtree_actions', TreeMap(copy_on_write=True))
+        self.__default_action = registry['default_action']
+
+    def registered_actions_treemap(self):
+        """
+        Return a list of registered actions.
 
 
         """
         return self.__actions
 
+    def registered_subtree_actions_treemap(self):
+        """
+        Return the :class:`TreeMap` of the actions registered on subtrees (``dir/**``).
+
+        """
+        return self.__subtree_actions
+
     ###########################################################################
     # FILE GENERATION
     ###########################################################################
-    def __generate_file(self, template_filename, context, generated_filename, force=False):
+    def __single_output_job(self, template_filename, context, generated_filename, force=False, copy_context=False):
         """
-        Generate **one** (source code) file from a template.
+        Return the job to generate **one** (source code) file from a template.
+
+        The file is **only** generated if needed, i.e. if ``force`` is set to ``True``, if generated file is older
+        than the template file or if the context it was generated with changed (see ``check_contexts``). The generated
+        file is written in the same directory as the template file.
 
-        The file is **only** generated if needed, i.e. if ``force`` is set to ``True`` or if generated file is older
-        than the template file. The generated file is written in the same directory as the template file.
+        A static template (without any :program:`Jinja2` construct) is copied right away: no job is returned.
 
         Args:
             template_filename (str): **Absolute** filename of a template file to translate.
             context (dict): Dictionary with ``(key, val)`` replacements.
             generated_filename (str): **Absolute** filename of the generated file filename.
             force (bool): If set to ``True``, file is generated no matter what.
+            copy_context (bool): If set to ``True``, the job keeps a **shallow** copy of the context. Needed when the job
+                is rendered after the action has modified its context.
 
-
+        Returns:
+            A :class:`GenerationJob` or ``None`` if the file is up to date or was copied.
         """
-        # TODO: maybe avoid reading same template file again and again... i.e. parse it once and generate all needed files without reparsing the template.
+        fingerprint = self.__context_fingerprint(template_filename, context)
+
         # test if file is non existing or needs to be regenerated
-        if force or (not os.path.isfile(generated_filename) or os.stat(template_filename).st_mtime - os.stat(generated_filename).st_mtime > 1):
-            self.log_info('   Parsing file %s' % template_filename)
-            code_generated = self.__jinja2_environment.get_template(template_filename).render(context)
+        if not self.__needs_generation(template_filename, generated_filename, fingerprint, force):
+            self.__run_report.record(UP_TO_DATE, generated_filename)
+            return None
+
+        static_output_length = self.__static_output_length(template_filename)
+        if static_output_length is not None:
+            self.__copy_static_template(template_filename, generated_filename, static_output_length)
+            return None
+
+        if copy_context:
+            context = shallow_copy_context(context)
+
+        return GenerationJob(template_filename, context, [generated_filename])
+
+    def __multi_output_job(self, template_filename, outputs, force=False, targets=None):
+        """
+        Return the job to generate **all** the (source code) files of a multi-output template with **one** rendering.
+
+        The template is rendered with the first context of the action, completed by ``cygenja_outputs``, the list of
+        ``(filename_end, context)`` couples of the action, and by the ``cygenja_output(filename_end)`` function that
+        marks the beginning of the region of one output. The code rendered before the first region is copied at the
+        beginning of every output.
+
+        The template is **only** rendered if one of the files needs to be (re)generated and only these files are written.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file to translate.
+            outputs (list): List of ``(filename_end, context, generated_filename)`` triples. **All** the outputs of the
+                action must be given.
+            force (bool): If set to ``True``, files are generated no matter what.
+            targets (set): If given, only these generated files are considered for (re)generation.
+
+        Returns:
+            A :class:`GenerationJob` or ``None`` if all the files are up to date.
+        """
+        from cygenja.helpers.multi_output_helpers import output_marker
+
+        render_context = dict(outputs[0][1])
+        render_context['cygenja_outputs'] = [(filename_end, context) for filename_end, context, _ in outputs]
+        render_context['cygenja_output'] = output_marker
+
+        # all the outputs are rendered with the same context
+        fingerprint = self.__context_fingerprint(template_filename, render_context)
+
+        filename_ends = list()
+        generated_filenames = list()
+        for filename_end, context, generated_filename in outputs:
+            if targets is not None and generated_filename not in targets:
+                continue
+            if self.__needs_generation(template_filename, generated_filename, fingerprint, force):
+                filename_ends.append(filename_end)
+                generated_filenames.append(generated_filename)
+            else:
+                self.__run_report.record(UP_TO_DATE, generated_filename)
+
+        if not generated_filenames:
+            return None
+
+        return GenerationJob(template_filename, render_context, generated_filenames, filename_ends)
+
+    def __write_job(self, job, code_generated):
+        """
+        Write the file(s) of a rendered :class:`GenerationJob`.
+
+        Args:
+            job (GenerationJob): The rendered job.
+            code_generated (str): Rendered template.
+        """
+        self.__run_report.record(RENDERED, job.template_filename)
+        if job.render_time is not None:
+            self.__get_render_history().record(job.history_key(), job.render_time)
+
+        if not job.is_multi_output():
+            self.__write_file(job.generated_filenames[0], code_generated)
+            return
+
+        outdated_filenames = dict(zip(job.filename_ends, job.generated_filenames))
+        known_filename_ends = [filename_end for filename_end, _ in job.context['cygenja_outputs']]
+
+        from cygenja.helpers.multi_output_helpers import split_outputs
+
+        preamble, regions = split_outputs(code_generated)
+
+        for filename_end, code in regions:
+            if filename_end not in outdated_filenames:
+                if filename_end not in known_filename_ends:
+                    self.log_error("Template '%s' defines an unknown output '%s'" % (job.template_filename, filename_end))
+                continue
+            self.__write_file(outdated_filenames.pop(filename_end), preamble + code)
+
+        for filename_end in job.filename_ends:
+            if filename_end in outdated_filenames:
+                self.log_warning("Template '%s' doesn't define output '%s'" % (job.template_filename, filename_end))
+
+    def __run_jobs(self, jobs, workers=1, max_in_flight=None, use_processes=False, save_state=True):
+        """
+        Render and write a stream of :class:`GenerationJob` objects and record the statistics of the run.
+
+        Args:
+            jobs: Iterable of jobs, pulled lazily.
+            workers (int): Number of workers rendering the templates. See :func:`run_jobs`.
+            max_in_flight (int): Maximum number of jobs rendered or waiting to be written at the same time.
+            use_processes (bool): Render with (forked) processes instead of threads.
+            save_state (bool): Is the state recorded during the run saved? Dry runs and clean runs don't write in the
+                state directory.
+        """
+        statistics = self.__start_statistics()
+        completed = False
+        try:
+            jobs = iter(jobs)
+            try:
+                first_job = next(jobs)
+            except StopIteration:
+                # nothing to render: the environment is not even needed
+                first_job = None
+
+            if first_job is not None:
+                from cygenja.pipeline import RenderingError, run_jobs
+
+                if self.__filter_profile is not None and use_processes and workers > 1:
+                    self.log_warning('Filters rendered in process workers are not profiled')
+
+                render_history = self.__get_render_history()
+
+                try:
+                    run_jobs(itertools.chain([first_job], jobs),
+                             self.jinja2_environment(),
+                             self.__write_job,
+                             workers=workers,
+                             max_in_flight=max_in_flight,
+                             use_processes=use_processes,
+                             statistics=statistics,
+                             job_cost=lambda job: render_history.estimated_render_time(job.history_key()))
+                except RenderingError as e:
+                    self.log_error(str(e))
+            completed = True
+        finally:
+            # keep what was recorded for the files written so far
+            self.__stop_statistics(statistics, save_state)
+            self.__stop_journal(completed)
+
+        self.__log_run_summary(statistics)
+
+        if save_state:
+            self.__update_compiled_templates()
+
+    def __start_statistics(self):
+        """
+        Start the :class:`RunStatistics` of a run.
+
+        """
+        statistics = RunStatistics()
+        self.__last_run_statistics = statistics
+        statistics.start()
+        return statistics
+
+    def __stop_statistics(self, statistics, save_state=True):
+        """
+        Stop the :class:`RunStatistics` of a run and save the state recorded during the run.
+
+        Args:
+            statistics (RunStatistics): Statistics of the run.
+            save_state (bool): Is the state recorded during the run saved?
+        """
+        statistics.stop()
+        statistics.written_files = len(self.__written_files)
+
+        if not save_state:
+            return
+
+        self.__save_state(self.__render_history)
+        self.__save_state(self.__template_variables)
+        self.__save_state(self.__context_fingerprints)
+        self.__save_state(self.__static_templates)
+        self.__save_state(self.__listing_cache)
+        self.__save_state(self.__template_hashes)
+
+    def begin_generation(self, dir_pattern, file_pattern, recursively=False, force=False, copy_contexts=False,
+                         resume=False):
+        """
+        Start a generation run whose jobs are rendered by the caller, i.e. by a :class:`BatchGenerator`.
+
+        Same as :meth:`generate` with the `g` action but the jobs are returned instead of rendered: each rendered job
+        must be given to :meth:`write_job` and the run must be ended by :meth:`end_generation`.
+
+        Args:
+            dir_pattern: ``glob`` pattern taken from the root directory.
+            file_pattern: ``fnmatch`` pattern taken from all matching directories.
+            recursively (bool): Do we visit the sub-directories?
+            force (bool): Do we force the generation or not?
+            copy_contexts (bool): Do the jobs keep **shallow** copies of their contexts? Needed if the jobs are rendered
+                concurrently.
+            resume (bool): Resume the interrupted run. See :meth:`generate`.
+
+        Returns:
+            The stream (generator) of the :class:`GenerationJob` objects of the outdated files.
+        """
+        self.__start_run()
+        self.__start_statistics()
 
-            with open(generated_filename, 'w') as f:
-                self.log_info('   Generating file %s' % generated_filename)
+        templates = self.__discover_templates(self.__match_directories(dir_pattern), file_pattern, recursively)
+        jobs = self.__expand_jobs(templates, 'g', force, copy_contexts, None, dict())
+        self.__start_journal(resume)
+        return jobs
+
+    def write_job(self, job, code_generated):
+        """
+        Write the file(s) of a job of a run started by :meth:`begin_generation`.
+
+        Args:
+            job (GenerationJob): The rendered job.
+            code_generated (str): Rendered template.
+        """
+        statistics = self.__last_run_statistics
+        statistics.jobs += 1
+        statistics.max_code_size = max(statistics.max_code_size, len(code_generated))
+        if job.render_time is not None:
+            statistics.render_time += job.render_time
+
+        self.__write_job(job, code_generated)
+
+    def end_generation(self, completed=True):
+        """
+        End a run started by :meth:`begin_generation`: the state of the run is saved and its summary logged.
+
+        Args:
+            completed (bool): Were all the jobs of the run written? If not, the journal of the run is kept to be resumed.
+        """
+        statistics = self.__last_run_statistics
+        self.__stop_statistics(statistics)
+        self.__stop_journal(completed)
+        self.__log_run_summary(statistics)
+        self.__update_compiled_templates()
+
+    def estimated_render_time(self, job):
+        """
+        Return the estimated render time (in seconds) of a :class:`GenerationJob` from the render times of the previous
+        runs.
+
+        """
+        return self.__get_render_history().estimated_render_time(job.history_key())
+
+    def __get_render_history(self):
+        """
+        Return the :class:`RenderHistory` of the generator, loading it from the state directory if needed.
+
+        """
+        if self.__render_history is None:
+            from cygenja.render_history import RenderHistory
+
+            self.__render_history = RenderHistory(os.path.join(self.__state_directory, RENDER_HISTORY_FILENAME))
+
+        return self.__render_history
+
+    def __print_render_estimate(self, workers):
+        """
+        Print the estimated rendering time of the jobs listed by a dry run.
+
+        Render times are those of the previous runs. Jobs never rendered are estimated with the mean render time.
+
+        Args:
+            workers (int): Number of workers rendering the templates.
+        """
+        if not self.__listed_job_keys:
+            return
+
+        from cygenja.render_history import estimate_makespan
+
+        render_history = self.__get_render_history()
+        known_jobs = sum(1 for key in self.__listed_job_keys if render_history.render_time(key) is not None)
+        if not known_jobs:
+            print('Estimated rendering time: unknown (no render time recorded yet)')
+            return
+
+        render_times = [render_history.estimated_render_time(key) for key in self.__listed_job_keys]
+        print('Estimated rendering time: %.2f s with %d worker%s (%d of %d jobs rendered before)' %
+              (estimate_makespan(render_times, workers), max(workers, 1), 's' if workers > 1 else '',
+               known_jobs, len(self.__listed_job_keys)))
+
+    def last_run_statistics(self):
+        """
+        Return the :class:`RunStatistics` of the last run or ``None`` if nothing was generated yet.
+
+        """
+        return self.__last_run_statistics
+
+    def __write_file(self, generated_filename, code_generated):
+        """
+        Write one generated file.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the generated file.
+            code_generated (str): Generated code.
+        """
+        from cygenja.helpers.file_helpers import atomic_destination
+
+        with atomic_destination(generated_filename) as temporary_filename:
+            with open(temporary_filename, 'w') as f:
                 f.write(code_generated.encode('utf8'))
+        self.__record_written_file(generated_filename)
+
+    def __record_written_file(self, generated_filename):
+        """
+        Record that a generated file was written.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the generated file.
+        """
+        self.__file_system_snapshot.record_written_file(generated_filename)
+        self.__written_files.append(generated_filename)
+
+        fingerprint = self.__pending_fingerprints.pop(generated_filename, None)
+        if fingerprint is not None:
+            self.__context_fingerprints.set_fingerprint(generated_filename, fingerprint)
+        self.__confirm_template_hash(generated_filename)
+
+        if self.__journal is not None:
+            # the journal is created with the first written file
+            self.__ensure_state_directory()
+            self.__journal.record(generated_filename, fingerprint)
+
+        self.__run_report.record(WRITTEN, generated_filename)
+
+    def __static_output_length(self, template_filename):
+        """
+        Return the length (in bytes) of the rendering of a static template or ``None`` if the template is not static.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+        """
+        if not self.__copy_static_templates:
+            return None
+
+        from cygenja.static_templates import StaticTemplates, template_syntax
+
+        if self.__static_templates is None:
+            self.__static_templates = StaticTemplates(os.path.join(self.__state_directory, STATIC_TEMPLATES_FILENAME))
+            if self.__jinja2_environment is not None:
+                self.__static_templates.set_syntax(template_syntax(self.__jinja2_environment))
+
+        return self.__static_templates.output_length(template_filename,
+                                                     lambda: template_syntax(self.jinja2_environment()),
+                                                     self.__file_system_snapshot.mtime_ns(template_filename))
 
-    def generate(self, dir_pattern, file_pattern, action_ch='g', recursively=False, force=False):
+    def __copy_static_template(self, template_filename, generated_filename, length):
+        """
+        Generate a file by copying (the beginning of) its static template.
+
+        Args:
+            template_filename (str): **Absolute** filename of a static template file.
+            generated_filename (str): **Absolute** filename of the generated file.
+            length (int): Length (in bytes) of the rendering of the template.
+        """
+        from cygenja.helpers.file_helpers import atomic_destination, copy_file
+
+        with atomic_destination(generated_filename) as temporary_filename:
+            copy_file(template_filename, temporary_filename, length)
+        self.__confirm_template_hash(generated_filename)
+        self.__run_report.record(COPIED, template_filename)
+        self.__record_written_file(generated_filename)
+
+    def __is_outdated(self, template_filename, generated_filename):
+        """
+        Test if a generated file doesn't exist or is older than its template.
+
+        Existence and modification times are taken from the :class:`FileSystemSnapshot` of the run. If content changes
+        are detected (see ``change_detection``), a file is outdated if its template changed since it was generated: only
+        files without recorded hash are tested with their modification times.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            generated_filename (str): **Absolute** filename of the generated file.
+        """
+        if not self.__file_system_snapshot.is_file(generated_filename):
+            return True
+
+        if self.__template_hashes is not None:
+            recorded_hash = self.__template_hashes.recorded_hash(generated_filename)
+            if recorded_hash is not None:
+                return recorded_hash != self.__template_hash(template_filename)
+
+        generated_mtime = self.__file_system_snapshot.mtime_ns(generated_filename)
+        if generated_mtime is None:
+            return True
+
+        return self.__file_system_snapshot.mtime_ns(template_filename) - generated_mtime > MTIME_TOLERANCE_NS
+
+    def __context_fingerprint(self, template_filename, context):
+        """
+        Return the fingerprint of the variables of a context a template uses or ``None`` if contexts are not checked.
+
+        A context that can't be fingerprinted is reported once per template and run: ``None`` is returned and the
+        generated files are only tested for their modification times.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            context (dict): Context of the rendering.
+        """
+        if not self.__check_contexts:
+            return None
+
+        from cygenja.context_fingerprints import context_fingerprint
+
+        variables = self.__template_variables.variables(self.jinja2_environment, template_filename)
+        try:
+            return context_fingerprint(context, variables)
+        except TypeError as error:
+            if template_filename not in self.__unfingerprinted_templates:
+                self.__unfingerprinted_templates.add(template_filename)
+                self.log_warning("Context of template '%s' not checked: %s" % (template_filename, error))
+            return None
+
+    def __needs_generation(self, template_filename, generated_filename, fingerprint, force=False):
+        """
+        Test if a generated file is outdated or was generated with another context.
+
+        A file without recorded fingerprint (i.e. generated before contexts were checked) is only tested for its
+        modification time: its fingerprint is recorded as is.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            generated_filename (str): **Absolute** filename of the generated file.
+            fingerprint (str): Fingerprint of the context (see :meth:`__context_fingerprint`) or ``None``.
+            force (bool): If set to ``True``, the file is generated no matter what (except if it was written by the
+                resumed run).
+        """
+        if self.__is_resumed_file(template_filename, generated_filename, fingerprint):
+            if fingerprint is not None:
+                self.__context_fingerprints.set_fingerprint(generated_filename, fingerprint)
+            self.__record_template_hash(template_filename, generated_filename, pending=False)
+            return False
+
+        outdated = force or self.__is_outdated(template_filename, generated_filename)
+
+        if fingerprint is not None:
+            recorded_fingerprint = self.__context_fingerprints.get_fingerprint(generated_filename)
+            if outdated or (recorded_fingerprint is not None and recorded_fingerprint != fingerprint):
+                self.__pending_fingerprints[generated_filename] = fingerprint
+                outdated = True
+            else:
+                self.__context_fingerprints.set_fingerprint(generated_filename, fingerprint)
+
+        self.__record_template_hash(template_filename, generated_filename, pending=outdated)
+        return outdated
+
+    ###########################################################################
+    # TEMPLATE HASHES
+    ###########################################################################
+    def __template_hash(self, template_filename):
+        """
+        Return the current hash of a template. The hashes are read from :program:`git` on first call of a run, if
+        possible.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+        """
+        if not self.__template_hashes_read:
+            self.__template_hashes_read = True
+            if self.__change_detection == 'git':
+                if self.__template_hashes.read_git_hashes():
+                    self.log_info('Templates compared with their hashes recorded up to commit %s',
+                                  self.__template_hashes.commit())
+                else:
+                    self.log_info("Git repository not found in '%s': templates are hashed", self.__root_directory)
+
+        return self.__template_hashes.template_hash(template_filename)
+
+    def __record_template_hash(self, template_filename, generated_filename, pending):
+        """
+        Record the current hash of the template of a generated file, if content changes are detected.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            generated_filename (str): **Absolute** filename of the generated file.
+            pending (bool): Is the file to be (re)generated? If so, the hash is only recorded once the file is written.
+        """
+        if self.__template_hashes is None:
+            return
+
+        template_hash = self.__template_hash(template_filename)
+        if pending:
+            self.__pending_template_hashes[generated_filename] = template_hash
+        else:
+            self.__template_hashes.set_recorded_hash(generated_filename, template_hash)
+
+    def __confirm_template_hash(self, generated_filename):
+        """
+        Record the hash of the template of a file that was just written.
+
+        """
+        template_hash = self.__pending_template_hashes.pop(generated_filename, None)
+        if template_hash is not None:
+            self.__template_hashes.set_recorded_hash(generated_filename, template_hash)
+
+    ###########################################################################
+    # JOURNAL
+    ###########################################################################
+    def __start_journal(self, resume):
+        """
+        Start the journal of a `g` run.
+
+        Args:
+            resume (bool): Resume the interrupted run of the journal, if any.
+        """
+        from cygenja.journal import GenerationJournal
+
+        self.__journal = GenerationJournal(self.__state_filename(JOURNAL_FILENAME))
+        resumed_files = self.__journal.start(resume)
+        if resumed_files:
+            self.log_info('Resuming the interrupted run: %d file(s) already generated', resumed_files)
+
+    def __stop_journal(self, completed):
+        """
+        Stop the journal of a `g` run, if any. The journal of an incomplete run is kept to be resumed.
+
+        """
+        if self.__journal is not None:
+            self.__journal.stop(completed)
+            self.__journal = None
+
+    def __is_resumed_file(self, template_filename, generated_filename, fingerprint):
+        """
+        Test if a file was written by the resumed run and is still up to date.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            generated_filename (str): **Absolute** filename of the generated file.
+            fingerprint (str): Fingerprint of the context or ``None``.
+        """
+        if self.__journal is None or not self.__journal.is_completed(generated_filename):
+            return False
+
+        recorded_fingerprint = self.__journal.fingerprint(generated_filename)
+        if recorded_fingerprint is not None and recorded_fingerprint != fingerprint:
+            return False
+
+        # the template might have changed since the interruption
+        return not self.__is_outdated(template_filename, generated_filename)
+
+    def __output_dependencies(self, template_filename, action, cache):
+        """
+        Return the files (other than the template itself) every output of a template depends on.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+            action (GeneratorAction): Action used to generate the outputs.
+            cache (dict): ``(template_filename, dependencies)`` cache of the templates dependencies.
+
+        Returns:
+            The list of the **absolute** filenames of the included/imported/extended templates and of the module defining the
+            action function.
+        """
+        from cygenja.helpers.template_analysis import find_template_dependencies
+
+        dependencies = list(find_template_dependencies(self.jinja2_environment(), template_filename, self.__root_directory, cache))
+
+        action_source_file = action.action_function_source_file()
+        if action_source_file is not None:
+            dependencies.append(action_source_file)
+
+        return dependencies
+
+    def __match_directories(self, dir_pattern):
+        """
+        Return the **absolute** directories matching a ``glob`` pattern taken from the root directory.
+
+        Args:
+            dir_pattern (str): ``glob`` pattern.
+        """
+        # the root directory is absolute: normalizing is enough to extract absolute cleaned paths
+        import glob
+
+        pattern = os.path.join(self.__root_directory, dir_pattern)
+        if glob.has_magic(pattern):
+            directories = [os.path.normpath(directory) for directory in glob.glob(pattern)]
+        else:
+            directories = [os.path.normpath(pattern)]
+
+        return [directory for directory in directories if self.__file_system_snapshot.is_dir(directory)]
+
+    def __discover_templates(self, directories, file_pattern, recursively):
+        """
+        Generate the templates to process with their actions.
+
+        Args:
+            directories (list): **Absolute** directories to visit.
+            file_pattern (str): ``fnmatch`` pattern for the template files.
+            recursively (bool): Do we visit the sub-directories?
+
+        Yields:
+            ``(template_filename, relative_directory, action)`` triples for each template with a registered extension
+            and a compatible action.
+        """
+        extensions = self.__extensions
+        action_resolver = self.__get_action_resolver()
+
+        for directory in directories:
+            for b, f in self.__file_system_snapshot.find_files(directory, file_pattern, recursively=recursively):
+                # test if some template files can be processed
+                if os.path.splitext(f)[1] not in extensions:
+                    continue
+
+                relative_directory = self.__relative_directory(b)
+                action = action_resolver.find_action(relative_directory, f)
+                if action:
+                    yield os.path.join(b, f), relative_directory, action
+
+    def __generated_filename(self, template_filename, filename_end):
+        """
+        Return the **absolute** filename of a generated file.
+
+        Args:
+            template_filename (str): **Absolute** filename of the template.
+            filename_end (str): End of filename returned by the action.
+        """
+        template_filename_without_ext, template_ext = os.path.splitext(template_filename)
+        return template_filename_without_ext + filename_end + self.__extensions[template_ext]
+
+    def __index_outputs(self, output_index, directories, file_pattern, recursively):
+        """
+        Add the outputs of the templates found in some directories to an :class:`OutputIndex`.
+
+        Args:
+            output_index (OutputIndex): Index to complete.
+            directories (list): **Absolute** directories to visit.
+            file_pattern (str): ``fnmatch`` pattern for the template files.
+            recursively (bool): Do we visit the sub-directories?
+        """
+        for template_filename, _, action in self.__discover_templates(directories, file_pattern, recursively):
+            for filename_end, context in action.run():
+                # contexts are often the same dict modified between outputs: keep a copy of each
+                output_index.add_entry(OutputIndexEntry(generated_filename=self.__generated_filename(template_filename, filename_end),
+                                                        template_filename=template_filename,
+                                                        action=action,
+                                                        filename_end=filename_end,
+                                                        context=shallow_copy_context(context)))
+
+    def build_output_index(self, dir_pattern='.', file_pattern='*', recursively=True):
+        """
+        Build the reverse index from generated files to their templates, actions and contexts.
+
+        Args:
+            dir_pattern: ``glob`` pattern taken from the root directory. **Only** used for directories.
+            file_pattern: ``fnmatch`` pattern taken from all matching directories. **Only** used for files.
+            recursively: Do we index the sub-directories?
+
+        Returns:
+            An :class:`OutputIndex` object.
+
+        Note:
+            Actions are run but no template is rendered. Contexts are **shallow** copies of the contexts returned by the
+            actions.
+        """
+        self.__renew_file_system_snapshot()
+
+        output_index = OutputIndex()
+        self.__index_outputs(output_index, self.__match_directories(dir_pattern), file_pattern, recursively)
+
+        return output_index
+
+    def __index_directories_of(self, generated_filenames):
+        """
+        Build an :class:`OutputIndex` of the templates in the directories of some generated files.
+
+        Args:
+            generated_filenames (list): **Absolute** filenames of generated files.
+        """
+        output_index = OutputIndex()
+
+        directories = list()
+        for generated_filename in generated_filenames:
+            directory = os.path.dirname(generated_filename)
+            if directory not in directories:
+                directories.append(directory)
+
+        self.__index_outputs(output_index, directories, '*', False)
+
+        return output_index
+
+    def build_output_index_for(self, generated_filenames):
+        """
+        Build the reverse index of the templates in the directories of some generated files.
+
+        Args:
+            generated_filenames (list): Filenames (absolute or relative to the root directory) of generated files.
+                These files don't need to exist.
+
+        Returns:
+            An :class:`OutputIndex` object. See :meth:`build_output_index`.
+        """
+        self.__renew_file_system_snapshot()
+
+        return self.__index_directories_of(self.__absolute_filenames(generated_filenames))
+
+    def __absolute_filenames(self, filenames):
+        """
+        Return **absolute** and normalized filenames.
+
+        Args:
+            filenames (list): Filenames, absolute or relative to the root directory.
+        """
+        return [os.path.normpath(os.path.join(self.__root_directory, filename)) for filename in filenames]
+
+    def find_templates(self, generated_filenames):
+        """
+        Find the templates of generated files.
+
+        The templates are looked for in the directory of each generated file: a template is found if its extension
+        corresponds to the extension of the generated file and if its action returns the right end of filename.
+
+        Args:
+            generated_filenames (list): Filenames (absolute or relative to the root directory) of generated files.
+                These files don't need to exist.
+
+        Returns:
+            A dictionary ``(generated_filename, template_filename)`` with **absolute** filenames. Generated files that
+            don't correspond to any template are not included.
+
+        Note:
+            Actions are run but no template is rendered.
+        """
+        self.__renew_file_system_snapshot()
+
+        generated_filenames = self.__absolute_filenames(generated_filenames)
+        output_index = self.__index_directories_of(generated_filenames)
+
+        templates = dict()
+        for generated_filename in generated_filenames:
+            entry = output_index.get_entry(generated_filename)
+            if entry is not None:
+                templates[generated_filename] = entry.template_filename
+
+        return templates
+
+    def generate_targets(self, generated_filenames, force=False, output_index=None, workers=1, max_in_flight=None, use_processes=False,
+                         resume=False):
+        """
+        Generate **only** some given files.
+
+        Only the requested files are rendered (with their exact contexts), not all the outputs of their templates.
+        As with :meth:`generate`, files are only generated if they are outdated, unless ``force`` is set.
+
+        Args:
+            generated_filenames (list): Filenames (absolute or relative to the root directory) of the files to generate.
+            force (bool): Do we force the generation or not?
+            output_index (OutputIndex): Index to use (see :meth:`build_output_index`). If ``None``, the templates in the
+                directories of the requested files are indexed.
+            workers (int): Number of workers rendering the templates. See :meth:`generate`.
+            max_in_flight (int): Maximum number of jobs rendered or waiting to be written at the same time.
+            use_processes (bool): Render with (forked) processes instead of threads.
+            resume (bool): Resume the interrupted run. See :meth:`generate`.
+
+        Returns:
+            The list of the **absolute** filenames of the written files.
+
+        Note:
+            A requested file that doesn't correspond to any template triggers a warning.
+        """
+        self.__start_run()
+
+        generated_filenames = self.__absolute_filenames(generated_filenames)
+        if output_index is None:
+            output_index = self.__index_directories_of(generated_filenames)
+
+        # group the requested files by template
+        templates = list()
+        template_entries = dict()
+        for generated_filename in generated_filenames:
+            entry = output_index.get_entry(generated_filename)
+            if entry is None:
+                self.log_warning("No template generates file '%s'" % generated_filename)
+                continue
+            if entry.template_filename not in template_entries:
+                templates.append(entry.template_filename)
+                template_entries[entry.template_filename] = list()
+            template_entries[entry.template_filename].append(entry)
+
+        def generate_jobs():
+            for template_filename in templates:
+                entries = template_entries[template_filename]
+                if entries[0].action.is_multi_output():
+                    outputs = [(entry.filename_end, entry.context, entry.generated_filename)
+                               for entry in output_index.template_entries(template_filename)]
+                    job = self.__multi_output_job(template_filename=template_filename,
+                                                  outputs=outputs,
+                                                  force=force,
+                                                  targets=set(entry.generated_filename for entry in entries))
+                    if job is not None:
+                        yield job
+                else:
+                    for entry in entries:
+                        # contexts of the index are already copies
+                        job = self.__single_output_job(template_filename=template_filename,
+                                                       context=entry.context,
+                                                       generated_filename=entry.generated_filename,
+                                                       force=force)
+                        if job is not None:
+                            yield job
+
+        self.__start_journal(resume)
+        self.__run_jobs(generate_jobs(), workers=workers, max_in_flight=max_in_flight, use_processes=use_processes)
+
+        return self.written_files()
+
+    def __expand_jobs(self, templates, action_ch, force, copy_contexts, dependency_graph, dependencies_cache):
+        """
+        Expand the contexts of the actions of a stream of templates into a stream of :class:`GenerationJob` objects.
+
+        Actions are run lazily: the next context is only asked for when the job of the previous one has been pulled.
+        For the `d` and `c` actions, nothing is yielded: files are listed or removed as the stream is consumed.
+
+        Args:
+            templates: Iterable of ``(template_filename, relative_directory, action)`` triples.
+            action_ch (char): Action to be taken. See :meth:`generate`.
+            force (bool): Do we force the generation or not?
+            copy_contexts (bool): Do the jobs keep copies of the contexts? Needed when jobs are rendered concurrently.
+            dependency_graph (DependencyGraph): If not ``None``, graph to complete with every output.
+            dependencies_cache (dict): ``(template_filename, dependencies)`` cache of the templates dependencies.
+
+        Yields:
+            The jobs of the outdated files for the `g` action.
+        """
+        file_system_snapshot = self.__file_system_snapshot
+
+        for in_file_name, rel_basename, action in templates:
+            output_dependencies = None
+            if dependency_graph is not None:
+                output_dependencies = self.__output_dependencies(in_file_name, action, dependencies_cache)
+
+            if action_ch == 'd':
+                print("Process file '%s' with function '%s':" % (os.path.join(rel_basename, os.path.basename(in_file_name)), action.action_function_name()))
+                if action.is_multi_output():
+                    # one rendering for all the outputs
+                    self.__listed_job_keys.append(in_file_name)
+
+            if action.is_multi_output() and action_ch == 'g':
+                # contexts are often the same dict modified between outputs: keep a copy of each
+                outputs = [(filename_end, shallow_copy_context(context), self.__generated_filename(in_file_name, filename_end))
+                           for filename_end, context in action.run()]
+                if dependency_graph is not None:
+                    for _, _, out_file_name in outputs:
+                        dependency_graph.add_output(out_file_name, in_file_name, output_dependencies)
+                if outputs:
+                    job = self.__multi_output_job(template_filename=in_file_name, outputs=outputs, force=force)
+                    if job is not None:
+                        yield job
+                continue
+
+            for filename_end, context in action.run():
+                # generated absolute file name
+                out_file_name = self.__generated_filename(in_file_name, filename_end)
+                if dependency_graph is not None:
+                    dependency_graph.add_output(out_file_name, in_file_name, output_dependencies)
+                if action_ch == 'g':
+                    job = self.__single_output_job(template_filename=in_file_name,
+                                                   context=context,
+                                                   generated_filename=out_file_name,
+                                                   force=force,
+                                                   copy_context=copy_contexts)
+                    if job is not None:
+                        yield job
+                elif action_ch == 'c':
+                    if not file_system_snapshot.is_file(out_file_name):
+                        continue
+                    try:
+                        os.remove(out_file_name)
+                        file_system_snapshot.record_removed_file(out_file_name)
+                        self.__run_report.record(REMOVED, out_file_name)
+                        if self.__context_fingerprints is not None:
+                            self.__context_fingerprints.remove_fingerprint(out_file_name)
+                        if self.__template_hashes is not None:
+                            self.__template_hashes.remove_recorded_hash(out_file_name)
+                    except OSError:
+                        pass
+                elif action_ch == 'd':
+                    # we only print relative path
+                    print("   -> %s" % os.path.join(rel_basename, os.path.basename(out_file_name)))
+                    self.__run_report.record(LISTED, out_file_name)
+                    if not action.is_multi_output():
+                        self.__listed_job_keys.append(out_file_name)
+
+    def generate(self, dir_pattern, file_pattern, action_ch='g', recursively=False, force=False, depfile=None, depfile_format='make',
+                 workers=1, max_in_flight=None, use_processes=False, resume=False):
         """
         Main method to generate (source code) files from templates.
 
         See documentation about the directory and file patterns and their possible combinations.
 
+        Files are generated as a stream: templates are discovered, dispatched to their actions, expanded into jobs,
+        rendered and written one after the other. Only ``max_in_flight`` jobs are kept in memory at any time.
+
         Args:
             dir_pattern: ``glob`` pattern taken from the root directory. **Only** used for directories.
             file_pattern: ``fnmatch`` pattern taken from all matching directories. **Only** used for files.
@@ -441,59 +2147,49 @@ class Generator(object):
                 - g: Generate all files that match both directory and file patterns. This is the default behavior.
                 - d: Same as `g` but with doing anything, i.e. dry run.
                 - c: Same as `g` but erasing the generated files instead, i.e. clean.
+                Only the `g` action writes in the state directory.
             recursively: Do we do the actions in the sub-directories? Note that in this case **only** the file pattern applies as **all**
                 the subdirectories are visited.
             force (boolean): Do we force the generation or not?
+            depfile (str): If given, the dependencies of all the generated files (templates, included templates and
+                modules of the action functions) are written in this file. Only for the `g` and `d` actions.
+            depfile_format (str): Format of the depfile: ``'make'`` for a Make-style depfile or ``'ninja'`` for a
+                ``build.ninja`` fragment. See :class:`DependencyGraph`.
+            workers (int): Number of workers rendering the templates. With one worker (the default), everything happens
+                in the calling thread. With several workers, jobs are submitted longest first, according to the render
+                times of the previous runs. For the `d` action, the number of workers used to estimate the rendering time.
+            max_in_flight (int): Maximum number of jobs rendered or waiting to be written at the same time. By default,
+                twice the number of workers.
+            use_processes (bool): Render with (forked) processes instead of threads. Contexts must then be picklable.
+            resume (bool): Resume the last run if it was interrupted: the files it wrote (see its journal) are not
+                generated again, even with ``force``, unless their templates or contexts changed since. Only for the `g`
+                action.
 
+        Note:
+            With several workers, each job keeps a **shallow** copy of its context: actions can keep modifying the same
+            ``dict`` but must not modify the objects it contains. Figures about the run (including peak memory) are
+            given by :meth:`last_run_statistics`.
         """
-        # directories to visit
-        # using heavy machinery to extract absolute cleaned paths... to avoid any problem...
-        directories = [os.path.abspath(directory) for directory in glob.glob(os.path.join(self.__root_directory, dir_pattern)) if os.path.isdir(directory)]
-
-        # list of extensions
-        extensions = self.__extensions.keys()
-
-        for directory in directories:
-            for b, f in find_files(directory, file_pattern, recursively=recursively):
-                # test if some template files can be processed
-                file_basename, file_ext = os.path.splitext(f)
-
-                if file_ext in extensions:
-                    # try to find corresponding action
-                    rel_path = os.path.relpath(os.path.join(b,f), self.__root_directory)
-                    rel_basename, rel_filename = os.path.split(rel_path)
-                    rel_filename_without_ext, rel_ext = os.path.splitext(rel_filename)
-
-                    # template absolute filename
-                    in_file_name = os.path.join(b, f)
-
-                    generator_action_container = self.__actions.retrieve_element_or_default(rel_basename, None)
-                    action = None
-
-                    if generator_action_container is not None:
-                        action = generator_action_container.get_compatible_generator_action(f)
-
-                    # is there a default action if needed?
-                    if action is None:
-                        action = self.__default_action
-
-                    if action:
-
-                        if action_ch == 'd':
-                            print("Process file '%s' with function '%s':" % (rel_path, action.action_function_name()))
-                        for filename_end, context in action.run():
-                            # generated absolute file name
-                            out_file_name = os.path.join(b, rel_filename_without_ext + filename_end + self.__extensions[file_ext])
-                            if action_ch == 'g':
-                                self.__generate_file(template_filename=in_file_name, context=context, generated_filename=out_file_name, force=force)
-                            elif action_ch == 'c':
-                                try:
-                                    os.remove(out_file_name)
-                                    self.log_info("Removed file '%s'" % out_file_name)
-                                except OSError:
-                                    pass
-                            elif action_ch == 'd':
-                                # we only print relative path
-                                print("   -> %s" % os.path.join(rel_basename, rel_filename_without_ext + filename_end + self.__extensions[file_ext]))
-
-
+        dependency_graph = None
+        dependencies_cache = dict()
+        if depfile is not None and action_ch in ('g', 'd'):
+            if depfile_format not in ('make', 'ninja'):
+                self.log_error("Depfile format '%s' is not recognized (use 'make' or 'ninja')" % depfile_format)
+            from cygenja.helpers.dependency_helpers import DependencyGraph
+            dependency_graph = DependencyGraph(self.__root_directory)
+
+        self.__start_run()
+
+        templates = self.__discover_templates(self.__match_directories(dir_pattern), file_pattern, recursively)
+        jobs = self.__expand_jobs(templates, action_ch, force, workers > 1, dependency_graph, dependencies_cache)
+        if action_ch == 'g':
+            self.__start_journal(resume)
+        self.__run_jobs(jobs, workers=workers, max_in_flight=max_in_flight, use_processes=use_processes,
+                        save_state=action_ch == 'g')
+
+        if action_ch == 'd':
+            self.__print_render_estimate(workers)
+
+        if dependency_graph is not None:
+            dependency_graph.write(depfile, depfile_format)
+            self.log_info("Dependencies written in '%s'", depfile)
@@ -0,0 +1,174 @@
+"""
+Export of the generation graph for build tools.
+
+A :class:`DependencyGraph` records, for each generated file, its template and everything the generated file depends on
+(included templates, module of the action function). It can be written as a Make-style depfile or as a
+:program:`Ninja` ``build.ninja`` fragment so that the build tool can regenerate files incrementally.
+"""
+import os
+
+try:
+    from shlex import quote as _shell_quote
+except ImportError:
+    # Python 2
+    from pipes import quote as _shell_quote
+
+
+def _escape_make_path(path):
+    """
+    Escape a path for a Make rule.
+
+    Args:
+        path (str): Path to escape.
+    """
+    return path.replace('\\', '\\\\').replace(' ', '\\ ').replace('#', '\\#').replace(':', '\\:').replace('$', '$$')
+
+
+def _escape_ninja_path(path):
+    """
+    Escape a path for a :program:`Ninja` build statement.
+
+    Args:
+        path (str): Path to escape.
+    """
+    return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+
+def _escape_ninja_argument(argument):
+    """
+    Escape an argument of a :program:`Ninja` command: quoted for the shell, then escaped for :program:`Ninja`.
+
+    Args:
+        argument (str): Argument to escape.
+    """
+    return _escape_ninja_path(_shell_quote(argument))
+
+
+class DependencyGraph(object):
+    """
+    Graph of the generated files, their templates and their dependencies.
+
+    Outputs are grouped by template, in order of registration.
+    """
+    def __init__(self, root_directory):
+        """
+        Constructor.
+
+        Args:
+            root_directory (str): **Absolute** root directory of the :class:`Generator`.
+        """
+        super(DependencyGraph, self).__init__()
+        self.__root_directory = root_directory
+        # template -> list of outputs
+        self.__outputs = dict()
+        # template -> list of dependencies
+        self.__dependencies = dict()
+        self.__templates = list()
+
+    def add_output(self, generated_filename, template_filename, dependencies):
+        """
+        Record one generated file.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the generated file.
+            template_filename (str): **Absolute** filename of its template.
+            dependencies (list): **Absolute** filenames of the other files the generated file depends on.
+        """
+        if template_filename not in self.__outputs:
+            self.__templates.append(template_filename)
+            self.__outputs[template_filename] = list()
+            self.__dependencies[template_filename] = list()
+
+        if generated_filename not in self.__outputs[template_filename]:
+            self.__outputs[template_filename].append(generated_filename)
+
+        template_dependencies = self.__dependencies[template_filename]
+        for dependency in dependencies:
+            if dependency not in template_dependencies:
+                template_dependencies.append(dependency)
+
+    def is_empty(self):
+        """
+        Test if no generated file was recorded.
+
+        """
+        return not self.__templates
+
+    def generate_entries(self):
+        """
+        Generate all recorded entries.
+
+        Yields:
+            ``(template_filename, generated_filenames, dependencies)`` triples.
+        """
+        for template_filename in self.__templates:
+            yield template_filename, self.__outputs[template_filename], self.__dependencies[template_filename]
+
+    def to_make_depfile(self):
+        """
+        Return the graph as a Make-style depfile.
+
+        Each generated file depends on its template and on the template dependencies.
+        """
+        lines = list()
+        for template_filename, generated_filenames, dependencies in self.generate_entries():
+            prerequisites = ' '.join(_escape_make_path(path) for path in [template_filename] + dependencies)
+            for generated_filename in generated_filenames:
+                lines.append('%s: %s' % (_escape_make_path(generated_filename), prerequisites))
+
+        return '\n'.join(lines) + '\n'
+
+    def to_ninja(self, rule_name='cygenja'):
+        """
+        Return the graph as a :program:`Ninja` ``build.ninja`` fragment.
+
+        The fragment defines one rule and one build statement per template. The command of the rule is
+        ``$cygenja_command $dir_pattern $file_pattern`` where ``$dir_pattern`` (relative directory of the template) and
+        ``$file_pattern`` (template file name), both quoted for the shell, are set by each build statement. The
+        ``cygenja_command`` variable must be defined by the including ``build.ninja`` file (for instance
+        ``cygenja_command = python generate_code.py``).
+
+        Args:
+            rule_name (str): Name of the rule.
+        """
+        lines = ['# Generated by cygenja',
+                 'rule %s' % rule_name,
+                 '  command = $cygenja_command $dir_pattern $file_pattern',
+                 '  description = CYGENJA $in',
+                 '  restat = 1',
+                 '']
+
+        for template_filename, generated_filenames, dependencies in self.generate_entries():
+            template_directory, template_basename = os.path.split(template_filename)
+            relative_directory = os.path.relpath(template_directory, self.__root_directory)
+            statement = 'build %s: %s %s' % (' '.join(_escape_ninja_path(path) for path in generated_filenames),
+                                             rule_name,
+                                             _escape_ninja_path(template_filename))
+            if dependencies:
+                statement += ' | ' + ' '.join(_escape_ninja_path(path) for path in dependencies)
+            lines.append(statement)
+            lines.append('  dir_pattern = %s' % _escape_ninja_argument(relative_directory))
+            lines.append('  file_pattern = %s' % _escape_ninja_argument(template_basename))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename, depfile_format='make'):
+        """
+        Write the graph to a file.
+
+        Args:
+            filename (str): Name of the file to write.
+            depfile_format (str): ``'make'`` for a Make-style depfile or ``'ninja'`` for a ``build.ninja`` fragment.
+
+        Raises:
+            ValueError: If the format is not recognized.
+        """
+        if depfile_format == 'make':
+            content = self.to_make_depfile()
+        elif depfile_format == 'ninja':
+            content = self.to_ninja()
+        else:
+            raise ValueError("Depfile format '%s' is not recognized (use 'make' or 'ninja')" % depfile_format)
+
+        with open(filename, 'w') as f:
+            f.write(content)
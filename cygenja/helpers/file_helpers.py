@@ -1,6 +1,9 @@
 # Several helpers to find files and/or directories
 import os
 import fnmatch
+import json
+import shutil
+import contextlib
 
 
 def find_files(directory, pattern, recursively=True):
@@ -23,3 +26,114 @@ def find_files(directory, pattern, recursively=True):
                 yield root, basename
         if not recursively:
             break
+
+
+def read_json_file(filename):
+    """
+    Return the content of a JSON file or an empty ``dict`` if the file doesn't exist or is not valid.
+
+    Args:
+        filename: name of the JSON file.
+    """
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+
+def write_json_file(filename, content):
+    """
+    Write a JSON file atomically: the content is written in a temporary file renamed afterwards.
+
+    Args:
+        filename: name of the JSON file. Its directory must exist.
+        content: object to serialize.
+    """
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w') as f:
+        json.dump(content, f, sort_keys=True)
+    os.rename(temporary_filename, filename)
+
+
+# suffix of the temporary files written before being renamed
+TEMPORARY_SUFFIX = '.cygenja-tmp'
+
+
+@contextlib.contextmanager
+def atomic_destination(filename):
+    """
+    Context manager to write a file atomically: the file is written under a temporary name and renamed at the end.
+
+        with atomic_destination(filename) as temporary_filename:
+            with open(temporary_filename, 'w') as f:
+                f.write(content)
+
+    If the writing fails or is interrupted, the temporary file is removed: the file is either completely written or
+    left untouched. A temporary file left behind by a killed process is ignored and overwritten by the next writing.
+
+    The new file keeps the permissions of the file it replaces.
+
+    Args:
+        filename: name of the file to write.
+    """
+    temporary_filename = filename + TEMPORARY_SUFFIX
+    try:
+        yield temporary_filename
+        if os.path.exists(filename):
+            shutil.copymode(filename, temporary_filename)
+        os.rename(temporary_filename, filename)
+    except BaseException:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
+
+
+# ioctl request to clone (reflink) a file under Linux
+FICLONE = 0x40049409
+
+
+def copy_file(source, destination, length=None):
+    """
+    Copy (the beginning of) a file.
+
+    The copy is made by the file system whenever possible: with a reflink (``FICLONE``, i.e. on Btrfs or XFS), then with
+    ``os.copy_file_range`` (Python 3.8+ under Linux) and by reading and writing the file otherwise.
+
+    Args:
+        source: name of the file to copy.
+        destination: name of the copy, overwritten if it exists.
+        length: number of bytes to copy. By default, the whole file.
+    """
+    with open(source, 'rb') as source_file:
+        if length is None:
+            length = os.fstat(source_file.fileno()).st_size
+
+        with open(destination, 'wb') as destination_file:
+            try:
+                import fcntl
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+                destination_file.truncate(length)
+                return
+            except (ImportError, IOError, OSError):
+                pass
+
+            copied = 0
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    while copied < length:
+                        count = os.copy_file_range(source_file.fileno(), destination_file.fileno(), length - copied)
+                        if count == 0:
+                            break
+                        copied += count
+                except OSError:
+                    # not supported between these file systems: start over
+                    copied = 0
+                    destination_file.seek(0)
+                    destination_file.truncate()
+                    source_file.seek(0)
+
+            if copied < length:
+                source_file.seek(copied)
+                destination_file.seek(copied)
+                destination_file.write(source_file.read(length - copied))
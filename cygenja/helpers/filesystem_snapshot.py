@@ -0,0 +1,442 @@
+"""
+Snapshot of the file system for one generation run.
+
+A :class:`FileSystemSnapshot` lists each directory and stats each file **at most once**. The discovery of the templates,
+the tests to decide if a file needs to be regenerated, the clean mode and the template loader all consult the same
+snapshot. On network file systems where each ``stat`` is a round trip, this avoids most of the system calls of a run
+where nothing needs to be generated.
+
+Modification times are given in nanoseconds.
+
+Listings can also be kept between runs in a :class:`DirectoryListingCache`: a directory whose modification time and
+inode didn't change since it was listed isn't listed again, it is only stated.
+"""
+import os
+import fnmatch
+import time
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def stat_mtime_ns(stat_result):
+    """
+    Return the modification time in nanoseconds of an ``os.stat`` result.
+
+    Args:
+        stat_result: Result of ``os.stat``.
+    """
+    try:
+        return stat_result.st_mtime_ns
+    except AttributeError:
+        # Python 2: only a float is available
+        return int(stat_result.st_mtime * 1000000000)
+
+
+# a listing made less than 2 seconds after the last change of its directory is not cached: the directory could change
+# again without changing its modification time (i.e. on file systems with a coarse time resolution)
+RACY_LISTING_DELAY_NS = 2000000000
+
+
+# Python 2 reads JSON strings as unicode strings
+_UNICODE = type(u'')
+_DECODED_NAMES = bytes is str
+
+
+def _native_name(name):
+    """
+    Return a name read from JSON as a native string (Python 2 reads ``unicode`` strings).
+
+    """
+    if _DECODED_NAMES and isinstance(name, _UNICODE):
+        return name.encode('utf-8')
+    return name
+
+
+class _DirectoryListing(object):
+    """
+    Listing of one directory.
+
+    Names are kept in lists to preserve the order of the listing and in sets for fast membership tests.
+    """
+    def __init__(self):
+        super(_DirectoryListing, self).__init__()
+        self.dirnames = list()
+        self.filenames = list()
+        self.dirname_set = set()
+        self.filename_set = set()
+        self.symlinked_dirname_set = set()
+
+    def add_dirname(self, name, is_symlink=False):
+        self.dirnames.append(name)
+        self.dirname_set.add(name)
+        if is_symlink:
+            self.symlinked_dirname_set.add(name)
+
+    def add_filename(self, name):
+        if name not in self.filename_set:
+            self.filenames.append(name)
+            self.filename_set.add(name)
+
+    def remove_filename(self, name):
+        if name in self.filename_set:
+            self.filenames.remove(name)
+            self.filename_set.discard(name)
+
+
+class DirectoryListingCache(object):
+    """
+    Listings of directories kept between runs, valid as long as their directories keep the same modification time and
+    inode.
+
+    Adding, removing or renaming an entry changes the modification time of its directory: changing the content of a
+    file doesn't, but listings only record names.
+    """
+    def __init__(self, filename, root_directory):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the cache.
+            root_directory (str): **Absolute** directory: only the listings of the directories inside it are cached.
+        """
+        # json is only imported when listings are cached
+        from cygenja.helpers.file_helpers import read_json_file
+
+        super(DirectoryListingCache, self).__init__()
+        self.__filename = filename
+        self.__root_directory = root_directory
+        self.__root_directory_prefix = os.path.join(root_directory, '')
+        # directory -> {'mtime_ns', 'inode', 'dirnames', 'symlinks', 'filenames'}
+        self.__entries = read_json_file(filename)
+        self.__modified = False
+        self.hits = 0
+        self.misses = 0
+
+    def covers(self, directory):
+        """
+        Test if the listing of a directory can be cached.
+
+        Args:
+            directory (str): **Absolute** and normalized directory name.
+        """
+        return directory == self.__root_directory or directory.startswith(self.__root_directory_prefix)
+
+    def get_listing(self, directory, stat_result):
+        """
+        Return the cached listing of a directory or ``None`` if it is unknown or outdated.
+
+        Args:
+            directory (str): **Absolute** and normalized directory name.
+            stat_result: Result of ``os.stat`` on the directory.
+        """
+        entry = self.__entries.get(directory)
+        if entry is None or entry['mtime_ns'] != stat_mtime_ns(stat_result) or entry['inode'] != stat_result.st_ino:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # names were unique when the listing was cached: no need to add them one by one
+        listing = _DirectoryListing()
+        listing.dirnames = [_native_name(name) for name in entry['dirnames']]
+        listing.filenames = [_native_name(name) for name in entry['filenames']]
+        listing.dirname_set = set(listing.dirnames)
+        listing.filename_set = set(listing.filenames)
+        listing.symlinked_dirname_set = set(_native_name(name) for name in entry['symlinks'])
+        return listing
+
+    def set_listing(self, directory, stat_result, listing):
+        """
+        Cache the listing of a directory, unless its directory changed too recently.
+
+        Args:
+            directory (str): **Absolute** and normalized directory name.
+            stat_result: Result of ``os.stat`` on the directory, **before** it was listed.
+            listing (_DirectoryListing): The listing.
+        """
+        mtime_ns = stat_mtime_ns(stat_result)
+        if time.time() * 1000000000 - mtime_ns < RACY_LISTING_DELAY_NS:
+            self.remove_listing(directory)
+            return
+
+        self.__entries[directory] = {'mtime_ns': mtime_ns,
+                                     'inode': stat_result.st_ino,
+                                     'dirnames': list(listing.dirnames),
+                                     'symlinks': sorted(listing.symlinked_dirname_set),
+                                     'filenames': list(listing.filenames)}
+        self.__modified = True
+
+    def remove_listing(self, directory):
+        """
+        Forget the listing of a directory.
+
+        """
+        if self.__entries.pop(directory, None) is not None:
+            self.__modified = True
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write.
+
+        """
+        return self.__modified
+
+    def save(self):
+        """
+        Write the cache if it was modified.
+
+        """
+        if self.__modified:
+            from cygenja.helpers.file_helpers import write_json_file
+
+            write_json_file(self.__filename, self.__entries)
+            self.__modified = False
+
+
+class FileSystemSnapshot(object):
+    """
+    Cache of directory listings and file stats.
+
+    Directory listings are made once and also tell which entries exist and are files or directories. Stats are made
+    once per file, when first needed. The snapshot must be updated (:meth:`record_written_file`,
+    :meth:`record_removed_file`) whenever the generator changes the file system.
+
+    Warning:
+        Changes made on the file system by others after a directory is listed or a file is stated are **not** seen.
+        Use a new snapshot for each run.
+    """
+    def __init__(self, listing_cache=None):
+        """
+        Constructor.
+
+        Args:
+            listing_cache (DirectoryListingCache): Listings of the previous runs to reuse, completed by the listings of
+                this snapshot.
+        """
+        super(FileSystemSnapshot, self).__init__()
+        # directory -> _DirectoryListing or None if the directory doesn't exist
+        self.__listings = dict()
+        # path -> stat result or None if the path doesn't exist
+        self.__stats = dict()
+        self.__listing_cache = listing_cache
+
+    ####################################################################################################################
+    # Directory listings
+    ####################################################################################################################
+    def __list_directory(self, directory):
+        """
+        List a directory and cache the listing.
+
+        Args:
+            directory (str): **Absolute** and normalized directory name.
+
+        Returns:
+            A :class:`_DirectoryListing` or ``None`` if ``directory`` is not a directory.
+        """
+        try:
+            return self.__listings[directory]
+        except KeyError:
+            pass
+
+        if self.__listing_cache is not None and self.__listing_cache.covers(directory):
+            # stated before being listed: a change during the listing invalidates the cached listing
+            stat_result = self.stat(directory)
+            if stat_result is None:
+                self.__listing_cache.remove_listing(directory)
+                self.__listings[directory] = None
+                return None
+            listing = self.__listing_cache.get_listing(directory, stat_result)
+            if listing is None:
+                listing = self.__scan_directory(directory)
+                if listing is not None:
+                    self.__listing_cache.set_listing(directory, stat_result, listing)
+        else:
+            listing = self.__scan_directory(directory)
+
+        self.__listings[directory] = listing
+        return listing
+
+    @staticmethod
+    def __scan_directory(directory):
+        """
+        List a directory on the file system.
+
+        Returns:
+            A :class:`_DirectoryListing` or ``None`` if ``directory`` is not a directory.
+        """
+        listing = _DirectoryListing()
+        try:
+            if scandir is not None:
+                for entry in scandir(directory):
+                    if entry.is_dir():
+                        listing.add_dirname(entry.name, entry.is_symlink())
+                    else:
+                        listing.add_filename(entry.name)
+            else:
+                for name in os.listdir(directory):
+                    path = os.path.join(directory, name)
+                    if os.path.isdir(path):
+                        listing.add_dirname(name, os.path.islink(path))
+                    else:
+                        listing.add_filename(name)
+        except OSError:
+            listing = None
+
+        return listing
+
+    def list_directory(self, directory):
+        """
+        Return the sub-directory names and the file names of a directory.
+
+        Args:
+            directory (str): **Absolute** directory name.
+
+        Returns:
+            A ``(dirnames, filenames)`` couple or ``None`` if ``directory`` is not a directory.
+        """
+        listing = self.__list_directory(os.path.normpath(directory))
+        if listing is None:
+            return None
+        return list(listing.dirnames), list(listing.filenames)
+
+    def find_files(self, directory, pattern, recursively=True):
+        """
+        Yield files matching a pattern with their base directories, recursively or not.
+
+        Same as :func:`cygenja.helpers.file_helpers.find_files` but using the snapshot.
+
+        Args:
+            directory (str): **Absolute** base directory to start the search.
+            pattern (str): ``fnmatch`` pattern for file names.
+            recursively (bool): Do we recurse or not? Symbolic links to directories are not followed.
+
+        Yields:
+            ``(base_directory, filename)`` couples.
+        """
+        directories = [os.path.normpath(directory)]
+        while directories:
+            root = directories.pop()
+            listing = self.__list_directory(root)
+            if listing is None:
+                continue
+            # files written during the iteration are not yielded
+            for basename in list(listing.filenames):
+                if fnmatch.fnmatch(basename, pattern):
+                    yield root, basename
+            if not recursively:
+                break
+            # keep top-down order of os.walk
+            for dirname in reversed(listing.dirnames):
+                if dirname not in listing.symlinked_dirname_set:
+                    directories.append(os.path.join(root, dirname))
+
+    ####################################################################################################################
+    # Existence and stats
+    ####################################################################################################################
+    def __parent_listing(self, path):
+        """
+        Return the listing of the parent directory of ``path`` and the base name of ``path``.
+
+        Args:
+            path (str): **Absolute** path.
+        """
+        path = os.path.normpath(path)
+        parent, basename = os.path.split(path)
+        if not basename:
+            # root of the file system
+            return None, basename
+        return self.__list_directory(parent), basename
+
+    def is_dir(self, path):
+        """
+        Test if ``path`` is an existing directory.
+
+        Args:
+            path (str): **Absolute** path.
+        """
+        listing, basename = self.__parent_listing(path)
+        if listing is None:
+            return self.__list_directory(os.path.normpath(path)) is not None
+        return basename in listing.dirname_set
+
+    def is_file(self, path):
+        """
+        Test if ``path`` is an existing file (or at least an existing entry that is not a directory).
+
+        Args:
+            path (str): **Absolute** path.
+        """
+        listing, basename = self.__parent_listing(path)
+        if listing is None:
+            return False
+        return basename in listing.filename_set
+
+    def stat(self, path):
+        """
+        Return the ``os.stat`` result of a path or ``None`` if it doesn't exist.
+
+        Args:
+            path (str): **Absolute** path.
+        """
+        path = os.path.normpath(path)
+        try:
+            return self.__stats[path]
+        except KeyError:
+            pass
+
+        stat_result = None
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            pass
+
+        self.__stats[path] = stat_result
+        return stat_result
+
+    def mtime_ns(self, path):
+        """
+        Return the modification time in nanoseconds of a file or ``None`` if it doesn't exist.
+
+        Args:
+            path (str): **Absolute** path.
+        """
+        stat_result = self.stat(path)
+        if stat_result is None:
+            return None
+        return stat_mtime_ns(stat_result)
+
+    ####################################################################################################################
+    # Updates
+    ####################################################################################################################
+    def record_written_file(self, path):
+        """
+        Record that a file was (re)written.
+
+        Args:
+            path (str): **Absolute** filename.
+        """
+        path = os.path.normpath(path)
+        self.__stats.pop(path, None)
+        parent, basename = os.path.split(path)
+        listing = self.__listings.get(parent)
+        if listing is not None:
+            listing.add_filename(basename)
+
+    def record_removed_file(self, path):
+        """
+        Record that a file was removed.
+
+        Args:
+            path (str): **Absolute** filename.
+        """
+        path = os.path.normpath(path)
+        self.__stats[path] = None
+        parent, basename = os.path.split(path)
+        listing = self.__listings.get(parent)
+        if listing is not None:
+            listing.remove_filename(basename)
@@ -0,0 +1,50 @@
+"""
+Helpers for multi-output templates.
+
+A multi-output template is rendered **once** for all the outputs of its action. Inside the template, each output region
+starts with ``@cygenja_output(filename_end)@``, alone on its line. Everything rendered before the first region is a
+common preamble, copied at the beginning of every output:
+
+    import numpy as np
+    {% for filename_end, context in cygenja_outputs %}
+    @cygenja_output(filename_end)@
+    cpdef axpy_@context.index@_@context.type@(...):
+        ...
+    {% endfor %}
+"""
+import re
+
+# ASCII record separators are not expected in templates
+OUTPUT_MARKER_TEMPLATE = u'\x1ecygenja-output:%s\x1e'
+OUTPUT_MARKER_REGEX = re.compile(u'\x1ecygenja-output:(.*?)\x1e\n?')
+
+
+def output_marker(filename_end):
+    """
+    Return the marker starting the region of one output.
+
+    Args:
+        filename_end (str): End of filename of the output, as given by the action.
+    """
+    return OUTPUT_MARKER_TEMPLATE % filename_end
+
+
+def split_outputs(rendered_code):
+    """
+    Split the rendered code of a multi-output template into the code of each output.
+
+    Args:
+        rendered_code (str): Rendered template.
+
+    Returns:
+        A ``(preamble, regions)`` couple where ``regions`` is a list of ``(filename_end, code)`` couples in the order of
+        the template. ``preamble`` is the code before the first region.
+    """
+    parts = OUTPUT_MARKER_REGEX.split(rendered_code)
+
+    preamble = parts[0]
+    regions = list()
+    for i in range(1, len(parts), 2):
+        regions.append((parts[i], parts[i + 1]))
+
+    return preamble, regions
@@ -0,0 +1,89 @@
+"""
+Static analysis of templates.
+
+Templates are parsed (not compiled nor rendered) by :program:`Jinja2` to find what they depend on.
+"""
+import os
+
+
+def resolve_template_name(template_name, search_directories, is_file=os.path.isfile):
+    """
+    Return the absolute filename of a template.
+
+    Absolute names are kept as is. Relative names (for instance inside an ``include``) are looked for from the file
+    system root (as a ``FileSystemLoader('/')`` would do) and then from each of the ``search_directories``.
+
+    Args:
+        template_name (str): Name of the template.
+        search_directories (list): **Absolute** directories to look into for relative names.
+        is_file: Function to test if a file exists.
+
+    Returns:
+        The absolute filename or ``None`` if no such file exists.
+    """
+    if os.path.isabs(template_name):
+        candidates = [template_name]
+    else:
+        candidates = [os.path.join(os.sep, template_name)]
+        candidates.extend(os.path.join(directory, template_name) for directory in search_directories)
+
+    for candidate in candidates:
+        candidate = os.path.normpath(candidate)
+        if is_file(candidate):
+            return candidate
+
+    return None
+
+
+def find_referenced_templates(environment, template_filename):
+    """
+    Return the names of the templates directly referenced by a template.
+
+    Only constant names are returned: dynamic references (i.e. ``{% include some_variable %}``) can not be resolved
+    statically and are ignored.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+        template_filename (str): **Absolute** filename of the template.
+    """
+    from jinja2 import meta
+
+    source, _, _ = environment.loader.get_source(environment, template_filename)
+    ast = environment.parse(source, template_filename, template_filename)
+
+    return [name for name in meta.find_referenced_templates(ast) if name is not None]
+
+
+def find_template_dependencies(environment, template_filename, root_directory, cache=None):
+    """
+    Return the absolute filenames of **all** the templates a template depends on, recursively.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+        template_filename (str): **Absolute** filename of the template.
+        root_directory (str): **Absolute** root directory of the :class:`Generator`.
+        cache (dict): Optional ``(template_filename, dependencies)`` cache shared between calls.
+
+    Returns:
+        A list of absolute filenames, without ``template_filename`` itself, in order of discovery.
+    """
+    if cache is not None and template_filename in cache:
+        return cache[template_filename]
+
+    dependencies = list()
+    seen = set([template_filename])
+    to_visit = [template_filename]
+
+    while to_visit:
+        filename = to_visit.pop(0)
+        for name in find_referenced_templates(environment, filename):
+            dependency = resolve_template_name(name, [root_directory])
+            if dependency is not None and dependency not in seen:
+                seen.add(dependency)
+                dependencies.append(dependency)
+                to_visit.append(dependency)
+
+    if cache is not None:
+        cache[template_filename] = dependencies
+
+    return dependencies
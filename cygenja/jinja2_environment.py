@@ -0,0 +1,152 @@
+"""
+:program:`Jinja2` environment and loader used by :program:`cygenja`.
+
+:program:`cygenja` only ever loads templates by their **absolute** filenames. The :class:`AbsolutePathLoader` is
+specialised for this: no search path, no template name splitting and, when ``auto_reload`` is enabled, up-to-date checks
+that reuse the :class:`FileSystemSnapshot` of the :class:`Generator` instead of stating each template again.
+"""
+import os
+
+import jinja2
+
+from cygenja.helpers.filesystem_snapshot import stat_mtime_ns
+from cygenja.helpers.template_analysis import resolve_template_name
+
+
+# Default settings of the environment: '@' delimits variables, i.e. @type@ instead of {{ type }}
+DEFAULT_ENVIRONMENT_OPTIONS = {
+    'autoescape': False,
+    'trim_blocks': True,
+    'lstrip_blocks': True,
+    'variable_start_string': '@',
+    'variable_end_string': '@',
+}
+
+
+class AbsolutePathLoader(jinja2.BaseLoader):
+    """
+    :program:`Jinja2` loader for templates given by their absolute filenames.
+
+    Relative names (i.e. inside ``include`` tags) are resolved from the file system root, like a
+    ``FileSystemLoader('/')`` would do, and then from the search directories (the :class:`Generator` adds its root
+    directory).
+
+    Modification times of the templates are taken from a :class:`FileSystemSnapshot`. The :class:`Generator` installs
+    the snapshot of the current run: a cached template is only stated once per run, by the generator, and is
+    considered outdated if its modification time changed between runs. Without snapshot, templates are stated
+    directly.
+    """
+    def __init__(self, encoding='utf-8'):
+        """
+        Constructor.
+
+        Args:
+            encoding (str): Encoding of the template files.
+        """
+        super(AbsolutePathLoader, self).__init__()
+        self.__encoding = encoding
+        self.__file_system_snapshot = None
+        self.__search_directories = list()
+
+    def add_search_directory(self, directory):
+        """
+        Add a directory where templates with relative names are looked for.
+
+        Args:
+            directory (str): **Absolute** directory.
+        """
+        if directory not in self.__search_directories:
+            self.__search_directories.append(directory)
+
+    def set_file_system_snapshot(self, file_system_snapshot):
+        """
+        Install the snapshot used to retrieve the modification times of the templates.
+
+        Args:
+            file_system_snapshot (FileSystemSnapshot): Snapshot of the current run or ``None`` to state the templates
+                directly.
+        """
+        self.__file_system_snapshot = file_system_snapshot
+
+    def __mtime_ns(self, filename):
+        """
+        Return the modification time in nanoseconds of a template or ``None`` if it doesn't exist.
+
+        Args:
+            filename (str): **Absolute** filename of the template.
+        """
+        if self.__file_system_snapshot is not None:
+            return self.__file_system_snapshot.mtime_ns(filename)
+
+        try:
+            return stat_mtime_ns(os.stat(filename))
+        except OSError:
+            return None
+
+    def __is_file(self, filename):
+        """
+        Test if a template exists.
+
+        Args:
+            filename (str): **Absolute** filename of the template.
+        """
+        if self.__file_system_snapshot is not None:
+            return self.__file_system_snapshot.is_file(filename)
+
+        return os.path.isfile(filename)
+
+    def get_source(self, environment, template):
+        """
+        Return the source of a template, its filename and its ``uptodate`` callback.
+
+        Args:
+            environment: :program:`Jinja2` environment.
+            template (str): **Absolute** filename of the template or relative name (see class documentation).
+
+        Raises:
+            TemplateNotFound: If ``template`` can not be resolved to an existing file.
+        """
+        if os.path.isabs(template):
+            filename = template
+        else:
+            filename = resolve_template_name(template, self.__search_directories, self.__is_file)
+            if filename is None:
+                raise jinja2.TemplateNotFound(template)
+
+        mtime = self.__mtime_ns(filename)
+        if mtime is None:
+            raise jinja2.TemplateNotFound(template)
+
+        try:
+            with open(filename, 'rb') as f:
+                contents = f.read().decode(self.__encoding)
+        except (IOError, OSError):
+            raise jinja2.TemplateNotFound(template)
+
+        def uptodate():
+            return self.__mtime_ns(filename) == mtime
+
+        return contents, filename, uptodate
+
+
+def create_environment(cache_size=400, auto_reload=True, encoding='utf-8', **options):
+    """
+    Create a :program:`Jinja2` environment with an :class:`AbsolutePathLoader`.
+
+    Args:
+        cache_size (int): Size of the cache of compiled templates. ``-1`` means no limit, ``0`` means no cache at all.
+        auto_reload (bool): Check if a cached template is up-to-date before using it. For one-shot batch runs,
+            ``False`` avoids these checks.
+        encoding (str): Encoding of the template files.
+        options: Any other :class:`jinja2.Environment` options. They override the :data:`DEFAULT_ENVIRONMENT_OPTIONS`.
+
+    Returns:
+        A :class:`jinja2.Environment` object.
+    """
+    environment_options = dict(DEFAULT_ENVIRONMENT_OPTIONS)
+    environment_options.update(options)
+
+    return jinja2.Environment(loader=AbsolutePathLoader(encoding=encoding),
+                              cache_size=cache_size,
+                              auto_reload=auto_reload,
+                              **environment_options)
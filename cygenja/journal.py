@@ -0,0 +1,124 @@
+"""
+Journal of the generation runs.
+
+During a run, the :class:`Generator` appends one JSON line to a journal in its state directory each time a file is
+completely written (files are written atomically: see :func:`atomic_destination`). The journal is removed at the end of
+a successful run. If the run is interrupted (exception, Ctrl-C, killed process...), the journal is left behind and the
+next run can resume it (``resume=True``): the files it lists are not generated again.
+
+    {"file": "/abs/src/basic_INT32_FLOAT32.pyx", "fingerprint": "3f2a..."}
+
+The fingerprint of the context of each file (see ``check_contexts``) is recorded too: it is lost if the interrupted
+run couldn't save the fingerprints.
+"""
+import json
+import os
+
+
+class GenerationJournal(object):
+    """
+    Append-only journal of the files written during a run.
+
+    """
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        Args:
+            filename (str): File of the journal.
+        """
+        super(GenerationJournal, self).__init__()
+        self.__filename = filename
+        # mode the journal is opened with by the first record, None if no run is journaled
+        self.__mode = None
+        self.__file = None
+        # generated filename -> fingerprint of the files written by the interrupted run
+        self.__completed_files = dict()
+
+    def __read(self):
+        """
+        Return the ``(generated_filename, fingerprint)`` dictionary of the journal.
+
+        The last line is ignored if it was only partially written.
+        """
+        completed_files = dict()
+        try:
+            with open(self.__filename, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    completed_files[entry['file']] = entry.get('fingerprint')
+        except (IOError, OSError):
+            pass
+        return completed_files
+
+    def start(self, resume=False):
+        """
+        Start journaling a run.
+
+        Args:
+            resume (bool): Resume the interrupted run of the journal, if any. Otherwise, the journal is discarded.
+
+        Returns:
+            The number of files written by the resumed run.
+        """
+        if resume:
+            self.__completed_files = self.__read()
+        else:
+            self.__completed_files = dict()
+            if os.path.exists(self.__filename):
+                os.remove(self.__filename)
+
+        # the journal of a resumed run is completed by the new run. It is only opened (and created) once a file is
+        # written: a run writing nothing leaves the state directory alone
+        self.__mode = 'a' if resume else 'w'
+
+        return len(self.__completed_files)
+
+    def is_completed(self, generated_filename):
+        """
+        Test if a file was written by the resumed run.
+
+        """
+        return generated_filename in self.__completed_files
+
+    def fingerprint(self, generated_filename):
+        """
+        Return the fingerprint recorded for a file written by the resumed run or ``None``.
+
+        """
+        return self.__completed_files.get(generated_filename)
+
+    def record(self, generated_filename, fingerprint=None):
+        """
+        Append a written file to the journal.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the written file.
+            fingerprint (str): Fingerprint of its context or ``None``.
+        """
+        if self.__file is None:
+            if self.__mode is None:
+                return
+            self.__file = open(self.__filename, self.__mode)
+        self.__file.write(json.dumps({'file': generated_filename, 'fingerprint': fingerprint}) + '\n')
+        # a killed process doesn't lose what it wrote
+        self.__file.flush()
+
+    def stop(self, completed):
+        """
+        Stop journaling a run.
+
+        Args:
+            completed (bool): Did the run complete? If so, the journal is removed. Otherwise, it is kept to be resumed.
+        """
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__mode = None
+
+        self.__completed_files = dict()
+        if completed and os.path.exists(self.__filename):
+            os.remove(self.__filename)
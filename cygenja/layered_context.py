@@ -0,0 +1,205 @@
+"""
+Layered rendering contexts.
+
+Actions usually yield one big base context shared by all their outputs plus a couple of per-output keys (``index``,
+``type``...). A :class:`LayeredContext` is such a context: an immutable base layer, shared, and a small overlay seen
+together as one mapping by the templates.
+
+    base = LayeredContext({'index_list': index_list, 'type_list': type_list, ...})
+    for index, type in itertools.product(index_list, type_list):
+        yield '_%s_%s' % (index, type), base.layer(index=index, type=type)
+
+Only the overlay is copied when the :class:`Generator` keeps a copy of a context (i.e. with several workers). When
+jobs are sent to process workers, the base layer is pickled **once** and unpickled once per worker: each job only
+carries the pickled bytes of the base and its own overlay.
+
+Only the most recently used base layers are kept pickled (in the :class:`Generator` process) and unpickled (in each
+worker): a pool of workers reused run after run doesn't keep every base it was ever sent.
+"""
+import binascii
+import os
+import pickle
+import threading
+
+from collections import OrderedDict
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2
+    from collections import MutableMapping
+
+# maximum number of base layers kept pickled and unpickled per process. Jobs come template after template: the bases of
+# the templates rendered before are rarely needed again
+MAX_CACHED_BASE_LAYERS = 16
+
+
+class _RecentlyUsedCache(object):
+    """
+    Bounded mapping dropping its least recently used entries.
+
+    """
+    def __init__(self, maxsize):
+        super(_RecentlyUsedCache, self).__init__()
+        self.__maxsize = maxsize
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            try:
+                value = self.__entries.pop(key)
+            except KeyError:
+                return None
+            # the most recently used entry goes last
+            self.__entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = value
+            if len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+# base layers unpickled in this process (i.e. a worker): token -> base layer
+_restored_base_layers = _RecentlyUsedCache(MAX_CACHED_BASE_LAYERS)
+# base layers pickled by this process: token -> pickled mapping
+_pickled_base_layers = _RecentlyUsedCache(MAX_CACHED_BASE_LAYERS)
+
+
+def _restore_base_layer(token, pickled_mapping):
+    """
+    Return the base layer of a token, unpickled only the first time (as long as it is cached).
+
+    """
+    base_layer = _restored_base_layers.get(token)
+    if base_layer is None:
+        base_layer = _BaseLayer(pickle.loads(pickled_mapping), token)
+        _restored_base_layers.set(token, base_layer)
+    return base_layer
+
+
+class _BaseLayer(object):
+    """
+    Immutable base layer shared by several :class:`LayeredContext` objects.
+
+    """
+    def __init__(self, mapping, token=None):
+        super(_BaseLayer, self).__init__()
+        self.mapping = mapping
+        # unique across processes: base layers can be pickled in files too
+        self.token = token if token is not None else binascii.hexlify(os.urandom(16)).decode('ascii')
+
+    def __reduce__(self):
+        pickled_mapping = _pickled_base_layers.get(self.token)
+        if pickled_mapping is None:
+            pickled_mapping = pickle.dumps(self.mapping, pickle.HIGHEST_PROTOCOL)
+            _pickled_base_layers.set(self.token, pickled_mapping)
+        return _restore_base_layer, (self.token, pickled_mapping)
+
+
+class LayeredContext(MutableMapping):
+    """
+    Rendering context made of a shared immutable base layer and of a per-output overlay.
+
+    Keys of the overlay hide the keys of the base. Setting or deleting a key only changes the overlay: the base layer is
+    never modified.
+    """
+    def __init__(self, base, overlay=None):
+        """
+        Constructor.
+
+        Args:
+            base: Mapping of the base layer. It is copied once: later changes to ``base`` are not seen.
+            overlay (dict): Per-output keys.
+        """
+        super(LayeredContext, self).__init__()
+        if not isinstance(base, _BaseLayer):
+            base = _BaseLayer(dict(base))
+        self.__base_layer = base
+        self.__overlay = dict(overlay) if overlay else dict()
+
+    def layer(self, **overlay):
+        """
+        Return a new context sharing the same base layer, with a copy of this overlay completed by some keys.
+
+        """
+        layered_overlay = dict(self.__overlay)
+        layered_overlay.update(overlay)
+        return LayeredContext(self.__base_layer, layered_overlay)
+
+    def copy(self):
+        """
+        Return a copy of the context: the overlay is copied, the base layer is shared.
+
+        """
+        return LayeredContext(self.__base_layer, self.__overlay)
+
+    def base(self):
+        """
+        Return the mapping of the base layer. It must not be modified.
+
+        """
+        return self.__base_layer.mapping
+
+    def overlay(self):
+        return self.__overlay
+
+    def flatten(self):
+        """
+        Return the context as one ``dict`` (a **shallow** copy of the base updated by the overlay).
+
+        """
+        flat_context = dict(self.__base_layer.mapping)
+        flat_context.update(self.__overlay)
+        return flat_context
+
+    def __getitem__(self, key):
+        try:
+            return self.__overlay[key]
+        except KeyError:
+            return self.__base_layer.mapping[key]
+
+    def __contains__(self, key):
+        return key in self.__overlay or key in self.__base_layer.mapping
+
+    def __setitem__(self, key, value):
+        self.__overlay[key] = value
+
+    def __delitem__(self, key):
+        if key not in self.__overlay and key in self.__base_layer.mapping:
+            raise KeyError("Key '%s' belongs to the base layer" % key)
+        del self.__overlay[key]
+
+    def __iter__(self):
+        for key in self.__overlay:
+            yield key
+        for key in self.__base_layer.mapping:
+            if key not in self.__overlay:
+                yield key
+
+    def __len__(self):
+        return len(self.__overlay) + sum(1 for key in self.__base_layer.mapping if key not in self.__overlay)
+
+    def __repr__(self):
+        return 'LayeredContext(%d base keys, overlay=%r)' % (len(self.__base_layer.mapping), self.__overlay)
+
+    def __reduce__(self):
+        return LayeredContext, (self.__base_layer, self.__overlay)
+
+
+def shallow_copy_context(context):
+    """
+    Return a **shallow** copy of a context: only the overlay of a :class:`LayeredContext` is copied.
+
+    Args:
+        context: ``dict`` or :class:`LayeredContext`.
+    """
+    if isinstance(context, LayeredContext):
+        return context.copy()
+    return dict(context)
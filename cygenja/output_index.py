@@ -0,0 +1,100 @@
+"""
+Reverse index from generated files to their templates, actions and contexts.
+
+An :class:`OutputIndex` is built by :meth:`Generator.build_output_index` and allows to regenerate a given generated file
+without knowing its template: see :meth:`Generator.generate_targets`.
+"""
+
+
+class OutputIndexEntry(object):
+    """
+    Everything needed to generate one file.
+
+    Attributes:
+        generated_filename (str): **Absolute** filename of the generated file.
+        template_filename (str): **Absolute** filename of its template.
+        action (GeneratorAction): Action used to generate the file.
+        filename_end (str): End of filename returned by the action.
+        context (dict): **Copy** of the context returned by the action.
+    """
+    def __init__(self, generated_filename, template_filename, action, filename_end, context):
+        super(OutputIndexEntry, self).__init__()
+        self.generated_filename = generated_filename
+        self.template_filename = template_filename
+        self.action = action
+        self.filename_end = filename_end
+        self.context = context
+
+
+class OutputIndex(object):
+    """
+    Index of :class:`OutputIndexEntry` objects by generated filename.
+
+    Entries are also kept by template, in the order given by their action.
+    """
+    def __init__(self):
+        """
+        Constructor.
+
+        """
+        super(OutputIndex, self).__init__()
+        self.__entries = dict()
+        self.__template_entries = dict()
+        self.__templates = list()
+
+    def add_entry(self, entry):
+        """
+        Add/replace one entry.
+
+        Args:
+            entry (OutputIndexEntry): Entry to add.
+        """
+        if entry.template_filename not in self.__template_entries:
+            self.__templates.append(entry.template_filename)
+            self.__template_entries[entry.template_filename] = list()
+
+        if entry.generated_filename in self.__entries:
+            old_entry = self.__entries[entry.generated_filename]
+            self.__template_entries[old_entry.template_filename].remove(old_entry)
+
+        self.__entries[entry.generated_filename] = entry
+        self.__template_entries[entry.template_filename].append(entry)
+
+    def get_entry(self, generated_filename, default=None):
+        """
+        Return the entry of a generated file or ``default`` if it is not indexed.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the generated file.
+            default: Value to return if the file is not indexed.
+        """
+        return self.__entries.get(generated_filename, default)
+
+    def template_entries(self, template_filename):
+        """
+        Return the list of entries of one template, in the order given by their action.
+
+        Args:
+            template_filename (str): **Absolute** filename of the template.
+        """
+        return list(self.__template_entries.get(template_filename, []))
+
+    def templates_list(self):
+        """
+        Return the list of indexed templates.
+
+        """
+        return list(self.__templates)
+
+    def generated_filenames_list(self):
+        """
+        Return the list of indexed generated files.
+
+        """
+        return list(self.__entries.keys())
+
+    def __contains__(self, generated_filename):
+        return generated_filename in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
@@ -0,0 +1,395 @@
+"""
+Streaming execution of generation jobs.
+
+A run of the :class:`Generator` is a pipeline of generators: discovery of the templates -> dispatch to their actions
+-> expansion of the contexts into :class:`GenerationJob` objects -> rendering -> writing. Jobs are pulled one at a time
+from this stream and at most ``max_in_flight`` jobs (with their contexts and rendered code) are alive at any moment, so
+memory stays flat no matter how many files are generated.
+
+Rendering can be done by a pool of threads or of (forked) processes. Writing is always done by the calling thread.
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+
+from cygenja.layered_context import LayeredContext
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+
+class RenderingError(RuntimeError):
+    """
+    Error raised when the rendering of a job failed in a worker.
+
+    """
+    pass
+
+
+class GenerationJob(object):
+    """
+    One rendering of one template.
+
+    Attributes:
+        template_filename (str): **Absolute** filename of the template.
+        context (dict): Rendering context.
+        generated_filenames (list): **Absolute** filenames of the files to write.
+        filename_ends (list): For multi-output templates, the ends of filename corresponding to the
+            ``generated_filenames``. ``None`` for a single output.
+        render_time (float): Time (in seconds) taken by the rendering, once rendered.
+    """
+    def __init__(self, template_filename, context, generated_filenames, filename_ends=None):
+        super(GenerationJob, self).__init__()
+        self.template_filename = template_filename
+        self.context = context
+        self.generated_filenames = generated_filenames
+        self.filename_ends = filename_ends
+        self.render_time = None
+
+    def is_multi_output(self):
+        return self.filename_ends is not None
+
+    def history_key(self):
+        """
+        Return the key of the job in the :class:`RenderHistory`.
+
+        """
+        return self.template_filename if self.is_multi_output() else self.generated_filenames[0]
+
+
+class RunStatistics(object):
+    """
+    Figures about one run.
+
+    Attributes:
+        jobs (int): Number of rendered jobs.
+        written_files (int): Number of written files.
+        max_in_flight (int): Maximum number of jobs rendered or waiting to be written at the same time.
+        max_code_size (int): Size (in characters) of the biggest rendered code.
+        render_time (float): Sum of the render times of the jobs in seconds.
+        peak_rss_kb (int): Peak resident memory (in kilobytes) of the process at the end of the run, ``None`` if
+            unknown. With process workers, the peak of the biggest worker is taken into account.
+        rss_increase_kb (int): Increase of the peak resident memory during the run (``0`` means the run didn't need more
+            memory than what the process already used), ``None`` if unknown.
+        duration (float): Duration of the run in seconds.
+    """
+    def __init__(self):
+        super(RunStatistics, self).__init__()
+        self.jobs = 0
+        self.written_files = 0
+        self.max_in_flight = 0
+        self.max_code_size = 0
+        self.render_time = 0.0
+        self.peak_rss_kb = None
+        self.rss_increase_kb = None
+        self.duration = 0.0
+
+        self.__start_time = None
+        self.__start_peak_rss_kb = None
+
+    def start(self):
+        """
+        Record the start of the run.
+
+        """
+        self.__start_time = time.time()
+        self.__start_peak_rss_kb = peak_rss_kb()
+
+    def stop(self):
+        """
+        Record the end of the run.
+
+        """
+        self.duration = time.time() - self.__start_time
+        self.peak_rss_kb = peak_rss_kb()
+        if self.peak_rss_kb is not None and self.__start_peak_rss_kb is not None:
+            self.rss_increase_kb = self.peak_rss_kb - self.__start_peak_rss_kb
+
+    def to_dict(self):
+        """
+        Return the figures as a ``dict``.
+
+        """
+        return {'jobs': self.jobs,
+                'written_files': self.written_files,
+                'max_in_flight': self.max_in_flight,
+                'max_code_size': self.max_code_size,
+                'render_time': self.render_time,
+                'peak_rss_kb': self.peak_rss_kb,
+                'rss_increase_kb': self.rss_increase_kb,
+                'duration': self.duration}
+
+
+def peak_rss_kb():
+    """
+    Return the peak resident memory in kilobytes of the process and its (terminated) children or ``None`` if unknown.
+
+    """
+    if resource is None:
+        return None
+
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # bytes under Mac OS X, kilobytes elsewhere
+    if sys.platform == 'darwin':
+        peak //= 1024
+
+    return peak
+
+
+# template of the job rendered by each thread
+_rendering = threading.local()
+
+
+def rendered_template_filename():
+    """
+    Return the **absolute** filename of the template of the job rendered by the calling thread or ``None``.
+
+    """
+    return getattr(_rendering, 'template_filename', None)
+
+
+def render_job(environment, job):
+    """
+    Render the template of a job.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+        job (GenerationJob): Job to render.
+    """
+    context = job.context
+    if isinstance(context, LayeredContext):
+        # Jinja2 copies the context anyway: copy the layers at once
+        context = context.flatten()
+
+    _rendering.template_filename = job.template_filename
+    try:
+        return environment.get_template(job.template_filename).render(context)
+    finally:
+        _rendering.template_filename = None
+
+
+# environment of the worker processes, inherited when they are forked
+_worker_environment = None
+
+
+def _render_in_worker(job):
+    """
+    Render a job in a worker and catch any exception.
+
+    Returns:
+        A ``(True, rendered_code, render_time)`` triple or a ``(False, error_message, render_time)`` triple.
+    """
+    start_time = time.time()
+    try:
+        return True, render_job(_worker_environment, job), time.time() - start_time
+    except Exception:
+        import traceback
+        return False, traceback.format_exc(), time.time() - start_time
+
+
+def _render_pickled_in_worker(pickled_job):
+    """
+    Same as :func:`_render_in_worker` for a job pickled by :func:`submit_job`.
+
+    """
+    import pickle
+
+    return _render_in_worker(pickle.loads(pickled_job))
+
+
+def submit_job(pool, job, callback):
+    """
+    Submit a job to a pool of workers.
+
+    ``callback`` is **always** called, even if the job can not be sent to its worker (i.e. its context doesn't pickle):
+    otherwise, the job would never come back.
+
+    Args:
+        pool: ``multiprocessing`` pool (see :func:`create_pool`).
+        job (GenerationJob): Job to render.
+        callback: Function called with the ``(success, rendered_code_or_error_message, render_time)`` triple of the job.
+    """
+    def error_callback(exception):
+        callback((False, repr(exception), 0.0))
+
+    if sys.version_info[0] >= 3:
+        pool.apply_async(_render_in_worker, (job,), callback=callback, error_callback=error_callback)
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    if isinstance(pool, ThreadPool):
+        pool.apply_async(_render_in_worker, (job,), callback=callback)
+        return
+
+    # Python 2 has no error_callback: the job is pickled here, where a failure can be reported
+    import pickle
+
+    try:
+        pickled_job = pickle.dumps(job, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        error_callback(e)
+        return
+    pool.apply_async(_render_pickled_in_worker, (pickled_job,), callback=callback)
+
+
+def longest_jobs_first(jobs, job_cost, window):
+    """
+    Reorder a stream of jobs to yield the most costly jobs first, within a bounded window.
+
+    Up to ``window`` jobs are pulled from the stream: the most costly of them is yielded each time a new job is pulled.
+    Jobs of the same cost keep their order.
+
+    Args:
+        jobs: Iterable of :class:`GenerationJob` objects.
+        job_cost: Function returning the (estimated) cost of a job.
+        window (int): Maximum number of jobs kept to be reordered.
+    """
+    heap = list()
+    counter = itertools.count()
+
+    for job in jobs:
+        heapq.heappush(heap, (-job_cost(job), next(counter), job))
+        if len(heap) >= window:
+            yield heapq.heappop(heap)[2]
+
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def create_pool(environment, workers, use_processes=False):
+    """
+    Create a pool of workers to render jobs.
+
+    Args:
+        environment: :program:`Jinja2` environment used by the workers.
+        workers (int): Number of workers.
+        use_processes (bool): Use processes instead of threads. Processes are **forked** and inherit the environment
+            (filters included): they are only available where ``fork`` is.
+
+    Returns:
+        A ``multiprocessing`` pool.
+
+    Raises:
+        RuntimeError: If processes are asked but ``fork`` is not available.
+    """
+    global _worker_environment
+    _worker_environment = environment
+
+    if not use_processes:
+        from multiprocessing.pool import ThreadPool
+        return ThreadPool(workers)
+
+    import multiprocessing
+    if hasattr(multiprocessing, 'get_context'):
+        try:
+            return multiprocessing.get_context('fork').Pool(workers)
+        except ValueError:
+            raise RuntimeError('Process workers need the fork start method')
+    if sys.platform.startswith('win'):
+        raise RuntimeError('Process workers need the fork start method')
+    return multiprocessing.Pool(workers)
+
+
+def run_jobs(jobs, environment, write_job, workers=1, max_in_flight=None, use_processes=False, statistics=None, pool=None,
+             job_cost=None, lookahead=None):
+    """
+    Render and write a stream of jobs.
+
+    With one worker, each job is rendered and written before the next job is pulled from the stream. With several
+    workers, at most ``max_in_flight`` jobs are submitted to the pool and not yet written: the stream is only pulled when
+    a rendered job has been written. Jobs are written in order of completion.
+
+    If a ``job_cost`` is given, jobs are submitted longest first within a window of ``lookahead`` jobs (see
+    :func:`longest_jobs_first`) so that big jobs don't start last and keep the run going while the other workers are
+    idle.
+
+    Args:
+        jobs: Iterable of :class:`GenerationJob` objects. With several workers, contexts of the jobs must not be modified
+            once the jobs are pulled.
+        environment: :program:`Jinja2` environment.
+        write_job: Callback ``write_job(job, rendered_code)`` called by the calling thread.
+        workers (int): Number of workers.
+        max_in_flight (int): Maximum number of jobs in flight. By default, twice the number of workers.
+        use_processes (bool): See :func:`create_pool`.
+        statistics (RunStatistics): Figures to update.
+        pool: Existing pool to use instead of creating (and closing) one.
+        job_cost: Function returning the estimated render time of a job. Only used with several workers.
+        lookahead (int): Maximum number of jobs pulled from the stream to be reordered. By default, four times
+            ``max_in_flight``.
+
+    Raises:
+        RenderingError: If the rendering of a job failed in a worker.
+    """
+    if statistics is None:
+        statistics = RunStatistics()
+
+    if workers <= 1 and pool is None:
+        for job in jobs:
+            start_time = time.time()
+            code = render_job(environment, job)
+            job.render_time = time.time() - start_time
+            statistics.jobs += 1
+            statistics.render_time += job.render_time
+            statistics.max_in_flight = max(statistics.max_in_flight, 1)
+            statistics.max_code_size = max(statistics.max_code_size, len(code))
+            write_job(job, code)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    max_in_flight = max(max_in_flight, 1)
+
+    if job_cost is not None:
+        if lookahead is None:
+            lookahead = 4 * max_in_flight
+        jobs = longest_jobs_first(jobs, job_cost, max(lookahead, 1))
+
+    try:
+        import queue
+    except ImportError:
+        import Queue as queue
+
+    own_pool = pool is None
+    if own_pool:
+        pool = create_pool(environment, workers, use_processes)
+
+    results = queue.Queue()
+    in_flight = dict()
+    job_number = 0
+
+    def wait_for_one_job():
+        number, (success, value, render_time) = results.get()
+        job = in_flight.pop(number)
+        if not success:
+            raise RenderingError("Rendering of template '%s' failed:\n%s" % (job.template_filename, value))
+        job.render_time = render_time
+        statistics.jobs += 1
+        statistics.render_time += render_time
+        statistics.max_code_size = max(statistics.max_code_size, len(value))
+        write_job(job, value)
+
+    try:
+        for job in jobs:
+            in_flight[job_number] = job
+            submit_job(pool, job, lambda result, number=job_number: results.put((number, result)))
+            job_number += 1
+            statistics.max_in_flight = max(statistics.max_in_flight, len(in_flight))
+
+            while len(in_flight) >= max_in_flight:
+                wait_for_one_job()
+
+        while in_flight:
+            wait_for_one_job()
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
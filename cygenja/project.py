@@ -0,0 +1,551 @@
+"""
+Declarative :program:`cygenja` projects.
+
+A project file (INI format) describes what a ``generate_code.py`` script wires by hand:
+
+    [cygenja]
+    # everything is relative to the directory of the project file
+    root = .
+    # directories added to sys.path to import the filter and action modules
+    python_path = .
+    # filters given by reference and modules whose public functions are all filters
+    filters = my_module:generic_to_c_type
+    filter_modules = my_filters
+    # filters whose results only depend on their arguments: memoized
+    pure_filters = generic_to_c_type
+    common_type_filters = no
+    # regenerate files whose templates use context values that changed
+    check_contexts = no
+    # how outdated files are found: mtime, git or hash (see cygenja.template_hashes)
+    change_detection = mtime
+
+    [environment]
+    # any option of Generator.create_jinja2_environment()
+    cache_size = -1
+    auto_reload = no
+
+    [extensions]
+    .cpy = .py
+    .cpx = .pyx
+
+    [matrix]
+    # axes of the type matrix: every context contains the list of each axis (i.e. index_list)
+    index = INT32 INT64
+    type = FLOAT32 FLOAT64
+
+    [action:config]
+    directory = config
+    pattern = *.*
+
+    [action:basic]
+    directory = src
+    pattern = basic.*
+    # one output per combination of the axes: basic_INT32_FLOAT32.pyx, ... The context contains index and type.
+    axes = index type
+    filename_end = _{index}_{type}
+
+    [action:custom]
+    # 'src/**' would register the action on src and all its sub-directories
+    directory = src
+    pattern = custom.*
+    function = my_module:my_action_function
+    multi_output = no
+
+    [default_action]
+    pattern = *.*
+    function = my_module:my_default_action_function
+
+Actions are registered in the order of their sections. The resolved registry (extensions and :class:`TreeMap` of the
+actions with their compiled patterns) is pickled in the state directory of the :class:`Generator`. It is reused as
+long as the project file and the modules of the action functions don't change.
+"""
+import hashlib
+import itertools
+import os
+import pickle
+import sys
+
+try:
+    from configparser import RawConfigParser
+except ImportError:
+    from ConfigParser import RawConfigParser
+
+from cygenja import __version__
+from cygenja.generator import CHANGE_DETECTIONS, Generator
+
+DEFAULT_PROJECT_FILENAME = 'cygenja.cfg'
+REGISTRY_CACHE_FILENAME = 'registry.pickle'
+
+MAIN_SECTION = 'cygenja'
+ENVIRONMENT_SECTION = 'environment'
+EXTENSIONS_SECTION = 'extensions'
+MATRIX_SECTION = 'matrix'
+ACTION_SECTION_PREFIX = 'action:'
+DEFAULT_ACTION_SECTION = 'default_action'
+
+TRUE_STRINGS = ('1', 'yes', 'true', 'on')
+FALSE_STRINGS = ('0', 'no', 'false', 'off')
+
+
+def parse_boolean(value):
+    """
+    Convert a string from the project file to a boolean.
+
+    Raises:
+        ValueError: If the string is not a boolean.
+    """
+    if value.lower() in TRUE_STRINGS:
+        return True
+    if value.lower() in FALSE_STRINGS:
+        return False
+    raise ValueError("'%s' is not a boolean" % value)
+
+
+def parse_value(value):
+    """
+    Convert a string from the project file to an ``int``, a boolean or keep it as a string.
+
+    """
+    try:
+        return int(value)
+    except ValueError:
+        pass
+
+    try:
+        return parse_boolean(value)
+    except ValueError:
+        return value
+
+
+def import_reference(reference):
+    """
+    Return the object given by a ``module:name`` reference.
+
+    Args:
+        reference (str): The reference.
+
+    Raises:
+        ValueError: If the reference is not well formed or can not be imported.
+    """
+    import importlib
+
+    module_name, _, name = reference.partition(':')
+    if not module_name or not name:
+        raise ValueError("'%s' is not a 'module:name' reference" % reference)
+
+    try:
+        return getattr(importlib.import_module(module_name), name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError("Can not import '%s': %s" % (reference, e))
+
+
+def module_filters(module_name):
+    """
+    Return the public functions defined in a module as a ``(filter_name, function)`` dictionary.
+
+    Args:
+        module_name (str): Name of the module.
+    """
+    import importlib
+    import inspect
+
+    module = importlib.import_module(module_name)
+
+    return dict((name, function) for name, function in inspect.getmembers(module, inspect.isfunction)
+                if not name.startswith('_') and function.__module__ == module.__name__)
+
+
+class MatrixAction(object):
+    """
+    Action function generating one output per combination of some axes of the type matrix.
+
+    Each context contains the list of values of **every** axis of the matrix (as ``<axis>_list``) and the value of each
+    axis of the action (as ``<axis>``). Unlike functions defined in a module, these actions can be pickled. Contexts
+    are :class:`LayeredContext` objects: the lists are shared by all the contexts of the action.
+    """
+    def __init__(self, name, matrix, axes, filename_end=None):
+        """
+        Constructor.
+
+        Args:
+            name (str): Name of the action (used as function name).
+            matrix (dict): ``(axis, values)`` dictionary of **all** the axes.
+            axes (list): Axes of the action.
+            filename_end (str): ``str.format`` pattern of the end of filename with the values of the axes. By default,
+                ``'_{axis_1}_{axis_2}...'``.
+        """
+        super(MatrixAction, self).__init__()
+        self.__name__ = name
+        self.__matrix = matrix
+        self.__axes = axes
+        if filename_end is None:
+            filename_end = ''.join('_{%s}' % axis for axis in axes)
+        self.__filename_end = filename_end
+
+    def __call__(self):
+        from cygenja.layered_context import LayeredContext
+
+        lists = LayeredContext(dict((axis + '_list', list(values)) for axis, values in self.__matrix.items()))
+
+        for values in itertools.product(*[self.__matrix[axis] for axis in self.__axes]):
+            axis_values = dict(zip(self.__axes, values))
+            yield self.__filename_end.format(**axis_values), lists.layer(**axis_values)
+
+
+class Project(object):
+    """
+    :program:`cygenja` project described by a project file.
+
+    """
+    def __init__(self, project_filename=DEFAULT_PROJECT_FILENAME):
+        """
+        Constructor: read the project file.
+
+        Args:
+            project_filename (str): Filename of the project file.
+
+        Raises:
+            ValueError: If the project file can not be read.
+        """
+        super(Project, self).__init__()
+        self.__project_filename = os.path.abspath(project_filename)
+        self.__project_directory = os.path.dirname(self.__project_filename)
+
+        try:
+            with open(self.__project_filename, 'rb') as f:
+                self.__content = f.read()
+        except (IOError, OSError) as e:
+            raise ValueError("Can not read project file '%s': %s" % (project_filename, e))
+
+        self.__config = RawConfigParser()
+        # keep the case of the axes and extensions
+        self.__config.optionxform = str
+        self.__config.read(self.__project_filename)
+
+        if not self.__config.has_section(MAIN_SECTION):
+            raise ValueError("Project file '%s' has no [%s] section" % (project_filename, MAIN_SECTION))
+
+        # files the generator depends on, completed when the filters and actions are registered
+        self.__source_files = [self.__project_filename]
+
+    def __option(self, section, option, default=None):
+        if self.__config.has_option(section, option):
+            return self.__config.get(section, option).strip()
+        return default
+
+    def __path(self, path):
+        return os.path.normpath(os.path.join(self.__project_directory, path))
+
+    def project_filename(self):
+        return self.__project_filename
+
+    def root_directory(self):
+        """
+        Return the **absolute** root directory of the project.
+
+        """
+        return self.__path(self.__option(MAIN_SECTION, 'root', '.'))
+
+    def state_directory(self):
+        """
+        Return the **absolute** state directory or ``None`` for the default one.
+
+        """
+        state_directory = self.__option(MAIN_SECTION, 'state_directory')
+        if state_directory is None:
+            return None
+        return self.__path(state_directory)
+
+    def change_detection(self):
+        """
+        Return how the generator finds the outdated files: ``'mtime'``, ``'git'`` or ``'hash'``.
+
+        Raises:
+            ValueError: If the option is not recognized.
+        """
+        change_detection = self.__option(MAIN_SECTION, 'change_detection', 'mtime').lower()
+        if change_detection not in CHANGE_DETECTIONS:
+            raise ValueError("Change detection '%s' is not recognized (use %s)" %
+                             (change_detection, ', '.join(CHANGE_DETECTIONS)))
+        return change_detection
+
+    def extend_python_path(self):
+        """
+        Add the ``python_path`` directories to ``sys.path``.
+
+        """
+        for directory in self.__option(MAIN_SECTION, 'python_path', '').split():
+            directory = self.__path(directory)
+            if directory not in sys.path:
+                sys.path.insert(0, directory)
+
+    def environment_options(self):
+        """
+        Return the options of the :program:`Jinja2` environment.
+
+        """
+        if not self.__config.has_section(ENVIRONMENT_SECTION):
+            return dict()
+        return dict((option, parse_value(value.strip())) for option, value in self.__config.items(ENVIRONMENT_SECTION))
+
+    def matrix(self):
+        """
+        Return the ``(axis, values)`` dictionary of the type matrix.
+
+        """
+        if not self.__config.has_section(MATRIX_SECTION):
+            return dict()
+        return dict((axis, values.split()) for axis, values in self.__config.items(MATRIX_SECTION))
+
+    def registry_key(self):
+        """
+        Return the key of the registry: it changes with the project file, the root directory and the versions.
+
+        """
+        key = hashlib.sha1(self.__content)
+        key.update(('%s|%s|%s' % (__version__, sys.version, self.root_directory())).encode('utf-8'))
+        return key.hexdigest()
+
+    def __action_function(self, section):
+        """
+        Return the action function of an action section.
+
+        """
+        function_reference = self.__option(section, 'function')
+        axes = self.__option(section, 'axes', '').split()
+
+        if function_reference is not None:
+            if axes:
+                raise ValueError("[%s]: 'function' and 'axes' can not be used together" % section)
+            return import_reference(function_reference)
+
+        matrix = self.matrix()
+        for axis in axes:
+            if axis not in matrix:
+                raise ValueError("[%s]: axis '%s' is not defined in [%s]" % (section, axis, MATRIX_SECTION))
+
+        return MatrixAction(section.replace(ACTION_SECTION_PREFIX, '', 1), matrix, axes, self.__option(section, 'filename_end'))
+
+    def register_filters(self, generator):
+        """
+        Register the filters of the project.
+
+        Args:
+            generator: The :class:`Generator` (or :class:`BatchGenerator`).
+        """
+        if parse_boolean(self.__option(MAIN_SECTION, 'common_type_filters', 'no')):
+            generator.register_common_type_filters()
+
+        pure_filter_names = set(self.__option(MAIN_SECTION, 'pure_filters', '').split())
+
+        for module_name in self.__option(MAIN_SECTION, 'filter_modules', '').split():
+            filters = module_filters(module_name)
+            for filter_name, filter_ref in filters.items():
+                generator.register_filter(filter_name, filter_ref, pure=filter_name in pure_filter_names)
+            self.__add_source_files(self.__function_source_files(filters.values()))
+
+        for reference in self.__option(MAIN_SECTION, 'filters', '').split():
+            filter_ref = import_reference(reference)
+            filter_name = reference.partition(':')[2]
+            generator.register_filter(filter_name, filter_ref, pure=filter_name in pure_filter_names)
+            self.__add_source_files(self.__function_source_files([filter_ref]))
+
+    def register_extensions_and_actions(self, generator):
+        """
+        Register the extensions and the actions of the project.
+
+        Args:
+            generator (Generator): The generator.
+
+        Returns:
+            The list of the registered action functions.
+        """
+        action_functions = list()
+
+        if self.__config.has_section(EXTENSIONS_SECTION):
+            for ext_in, ext_out in self.__config.items(EXTENSIONS_SECTION):
+                generator.register_extension(ext_in, ext_out.strip())
+
+        for section in self.__config.sections():
+            if not section.startswith(ACTION_SECTION_PREFIX):
+                continue
+            directory = self.__option(section, 'directory')
+            if directory is None:
+                raise ValueError("[%s]: 'directory' is missing" % section)
+            action_function = self.__action_function(section)
+            generator.register_action(directory,
+                                      self.__option(section, 'pattern', '*'),
+                                      action_function,
+                                      parse_boolean(self.__option(section, 'multi_output', 'no')))
+            action_functions.append(action_function)
+
+        if self.__config.has_section(DEFAULT_ACTION_SECTION):
+            action_function = self.__action_function(DEFAULT_ACTION_SECTION)
+            generator.register_default_action(self.__option(DEFAULT_ACTION_SECTION, 'pattern', '*'),
+                                              action_function,
+                                              parse_boolean(self.__option(DEFAULT_ACTION_SECTION, 'multi_output', 'no')))
+            action_functions.append(action_function)
+
+        return action_functions
+
+    def __registry_source_files(self, action_functions):
+        """
+        Return the files the registry depends on: the project file and the modules of the action functions.
+
+        """
+        source_files = [self.__project_filename]
+        for source_file in self.__function_source_files(action_functions):
+            if source_file not in source_files:
+                source_files.append(source_file)
+        return source_files
+
+    @staticmethod
+    def __function_source_files(functions):
+        """
+        Return the **absolute** filenames of the modules defining some functions.
+
+        """
+        import inspect
+
+        source_files = list()
+
+        for function in functions:
+            try:
+                source_file = inspect.getsourcefile(function)
+            except TypeError:
+                # i.e. a MatrixAction: only depends on the project file
+                continue
+            if source_file is not None:
+                source_file = os.path.abspath(source_file)
+                if source_file not in source_files:
+                    source_files.append(source_file)
+
+        return source_files
+
+    def __add_source_files(self, source_files):
+        for source_file in source_files:
+            if source_file not in self.__source_files:
+                self.__source_files.append(source_file)
+
+    def source_files(self):
+        """
+        Return the **absolute** filenames of the files the generator created by :meth:`create_generator` depends on: the
+        project file and the modules of the filters and of the action functions.
+
+        """
+        return list(self.__source_files)
+
+    def __load_registry(self, cache_filename):
+        """
+        Return the cached registry or ``None`` if there is no valid cached registry.
+
+        """
+        from cygenja.helpers.filesystem_snapshot import stat_mtime_ns
+
+        try:
+            with open(cache_filename, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception:
+            return None
+
+        if cache.get('key') != self.registry_key():
+            return None
+
+        for source_file, mtime in cache['sources'].items():
+            try:
+                if stat_mtime_ns(os.stat(source_file)) != mtime:
+                    return None
+            except OSError:
+                return None
+
+        try:
+            # imports the modules of the action functions
+            registry = pickle.loads(cache['registry'])
+        except Exception:
+            return None
+
+        self.__add_source_files(cache['sources'].keys())
+
+        return registry
+
+    def __save_registry(self, generator, action_functions, cache_filename):
+        """
+        Pickle the registry of a generator. Nothing is saved if the registry can not be pickled.
+
+        """
+        from cygenja.helpers.filesystem_snapshot import stat_mtime_ns
+
+        try:
+            cache = {'key': self.registry_key(),
+                     'sources': dict((source_file, stat_mtime_ns(os.stat(source_file)))
+                                     for source_file in self.__registry_source_files(action_functions)),
+                     'registry': pickle.dumps(generator.export_registry(), pickle.HIGHEST_PROTOCOL)}
+            temporary_filename = cache_filename + '.tmp'
+            with open(temporary_filename, 'wb') as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temporary_filename, cache_filename)
+        except (pickle.PicklingError, TypeError, AttributeError, IOError, OSError) as e:
+            generator.log_info('Registry not cached: %s', e)
+            return False
+
+        return True
+
+    def create_generator(self, logger=None, use_cache=True, log_details=False, jinja2_environment=None,
+                         register_filters=True, profile_filters=False):
+        """
+        Create the :class:`Generator` of the project with its filters, extensions and actions.
+
+        Args:
+            logger: A logger or ``None``.
+            use_cache (bool): Reuse (and save) the cached registry.
+            log_details (bool): Log every file. See :class:`Generator`.
+            jinja2_environment: :program:`Jinja2` environment (or callable returning one) to use instead of an
+                environment created with the options of the project, i.e. an environment shared by several projects.
+            register_filters (bool): Register the filters of the project in the generator. Set it to ``False`` if the
+                filters are registered elsewhere (see :meth:`register_filters`).
+            profile_filters (bool): Count and time the calls to the filters. See :class:`Generator`.
+
+        Returns:
+            The :class:`Generator`.
+
+        Raises:
+            ValueError: If the project file is not valid.
+        """
+        self.extend_python_path()
+
+        shared_jinja2_environment = jinja2_environment is not None
+        if jinja2_environment is None:
+            environment_options = self.environment_options()
+
+            def jinja2_environment():
+                return Generator.create_jinja2_environment(**environment_options)
+
+        generator = Generator(self.root_directory(),
+                              jinja2_environment,
+                              logger=logger,
+                              state_directory=self.state_directory(),
+                              log_details=log_details,
+                              check_contexts=parse_boolean(self.__option(MAIN_SECTION, 'check_contexts', 'no')),
+                              change_detection=self.change_detection(),
+                              profile_filters=profile_filters,
+                              shared_jinja2_environment=shared_jinja2_environment)
+
+        if register_filters:
+            self.register_filters(generator)
+
+        cache_filename = os.path.join(generator.state_directory(), REGISTRY_CACHE_FILENAME)
+        registry = self.__load_registry(cache_filename) if use_cache else None
+        if registry is not None:
+            generator.import_registry(registry)
+            generator.log_info('Registry loaded from cache')
+            return generator
+
+        action_functions = self.register_extensions_and_actions(generator)
+        self.__add_source_files(self.__registry_source_files(action_functions))
+
+        if use_cache:
+            if not os.path.isdir(generator.state_directory()):
+                os.makedirs(generator.state_directory())
+            self.__save_registry(generator, action_functions, cache_filename)
+
+        return generator
@@ -0,0 +1,101 @@
+"""
+History of the render times of the jobs.
+
+The :class:`Generator` records how long each job took to render in a JSON file in its state directory. The next runs
+use these times to submit the longest jobs first to the workers (a big template started last would keep the run going
+while the other workers are idle) and dry runs use them to estimate the duration of a run.
+
+A job is identified by its first generated file or, for a multi-output template, by its template (see
+:meth:`GenerationJob.history_key`).
+"""
+import heapq
+
+from cygenja.helpers.file_helpers import read_json_file, write_json_file
+
+
+class RenderHistory(object):
+    """
+    Render times (in seconds) of the jobs of previous runs.
+
+    """
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the history.
+        """
+        super(RenderHistory, self).__init__()
+        self.__filename = filename
+        self.__render_times = read_json_file(filename)
+        self.__modified = False
+        self.__mean_render_time = None
+
+    def render_time(self, key):
+        """
+        Return the last render time of a job or ``None`` if the job was never rendered.
+
+        """
+        return self.__render_times.get(key)
+
+    def estimated_render_time(self, key):
+        """
+        Return the last render time of a job or, if unknown, the mean render time of all the known jobs.
+
+        """
+        render_time = self.__render_times.get(key)
+        if render_time is not None:
+            return render_time
+
+        if self.__mean_render_time is None:
+            self.__mean_render_time = (sum(self.__render_times.values()) / len(self.__render_times)
+                                       if self.__render_times else 0.0)
+        return self.__mean_render_time
+
+    def record(self, key, render_time):
+        """
+        Record the render time of a job.
+
+        """
+        self.__render_times[key] = render_time
+        self.__modified = True
+        self.__mean_render_time = None
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write.
+
+        """
+        return self.__modified
+
+    def save(self):
+        """
+        Write the history if it was modified.
+
+        """
+        if self.__modified:
+            write_json_file(self.__filename, self.__render_times)
+            self.__modified = False
+
+
+def estimate_makespan(render_times, workers=1):
+    """
+    Estimate the duration of the rendering of jobs scheduled longest first on some workers.
+
+    Each job is given to the least loaded worker, from the longest to the shortest job.
+
+    Args:
+        render_times (list): Estimated render times of the jobs.
+        workers (int): Number of workers.
+
+    Returns:
+        The estimated duration in seconds.
+    """
+    if workers <= 1:
+        return sum(render_times)
+
+    loads = [0.0] * workers
+    for render_time in sorted(render_times, reverse=True):
+        heapq.heapreplace(loads, loads[0] + render_time)
+
+    return max(loads)
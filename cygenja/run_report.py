@@ -0,0 +1,108 @@
+"""
+Per-run aggregation of the generation events.
+
+Each time a template is rendered or copied, or a file is written, found up to date, removed or listed, the :class:`Generator`
+records an event in the :class:`RunReport` of the run. Events are only counted (per directory and per outcome): nothing
+is formatted nor logged per file unless a listener is attached (see :meth:`Generator.add_event_listener`). At the end
+of the run, the generator logs one summary line per directory.
+"""
+import os
+
+# outcomes of the events
+RENDERED = 'rendered'
+COPIED = 'copied'
+WRITTEN = 'written'
+UP_TO_DATE = 'up_to_date'
+REMOVED = 'removed'
+LISTED = 'listed'
+
+OUTCOMES = (RENDERED, COPIED, WRITTEN, UP_TO_DATE, REMOVED, LISTED)
+
+# labels used in the summaries
+OUTCOME_LABELS = {RENDERED: 'rendered',
+                  COPIED: 'copied',
+                  WRITTEN: 'written',
+                  UP_TO_DATE: 'up to date',
+                  REMOVED: 'removed',
+                  LISTED: 'listed'}
+
+
+class RunReport(object):
+    """
+    Counts of the events of one run, per directory and per outcome.
+
+    """
+    def __init__(self, root_directory, listeners=None):
+        """
+        Constructor.
+
+        Args:
+            root_directory (str): **Absolute** root directory of the :class:`Generator`. Directories of the summaries are
+                relative to it.
+            listeners (list): Callables ``listener(outcome, filename)`` called for each event.
+        """
+        super(RunReport, self).__init__()
+        self.__root_directory = root_directory
+        self.__listeners = list(listeners) if listeners else list()
+        # absolute directory -> (outcome -> count)
+        self.__directory_counts = dict()
+
+    def record(self, outcome, filename):
+        """
+        Record one event.
+
+        Args:
+            outcome (str): One of the :data:`OUTCOMES`.
+            filename (str): **Absolute** filename of the template (``RENDERED`` and ``COPIED``) or of the generated
+                file.
+        """
+        directory = os.path.dirname(filename)
+        counts = self.__directory_counts.get(directory)
+        if counts is None:
+            counts = self.__directory_counts[directory] = dict.fromkeys(OUTCOMES, 0)
+        counts[outcome] += 1
+
+        for listener in self.__listeners:
+            listener(outcome, filename)
+
+    def counts(self):
+        """
+        Return the ``(outcome, count)`` dictionary of the whole run.
+
+        """
+        total_counts = dict.fromkeys(OUTCOMES, 0)
+        for counts in self.__directory_counts.values():
+            for outcome, count in counts.items():
+                total_counts[outcome] += count
+        return total_counts
+
+    def directory_counts(self):
+        """
+        Return the ``(relative_directory, (outcome, count))`` dictionary of the run.
+
+        """
+        return dict((self.__relative_directory(directory), dict(counts))
+                    for directory, counts in self.__directory_counts.items())
+
+    def __relative_directory(self, directory):
+        relative_directory = os.path.relpath(directory, self.__root_directory)
+        return '' if relative_directory == os.curdir else relative_directory
+
+    @staticmethod
+    def format_counts(counts):
+        """
+        Return counts as a string, i.e. ``'4 rendered, 4 written'``. Outcomes without event are left out.
+
+        Args:
+            counts (dict): ``(outcome, count)`` dictionary.
+        """
+        return ', '.join('%d %s' % (counts[outcome], OUTCOME_LABELS[outcome])
+                         for outcome in OUTCOMES if counts.get(outcome))
+
+    def summary_lines(self):
+        """
+        Return one summary line per directory, sorted by directory.
+
+        """
+        return ['%s: %s' % (directory or '.', self.format_counts(counts))
+                for directory, counts in sorted(self.directory_counts().items())]
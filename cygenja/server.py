@@ -0,0 +1,402 @@
+"""
+Long-lived generation server.
+
+Creating a :class:`Generator` from a project (importing :program:`Jinja2`, the filter and action modules, loading the
+registry...) and warming its :program:`Jinja2` environment cost more than a small incremental run. A
+:class:`GenerationServer` keeps the generator of a project warm and serves the requests of local clients on a Unix
+domain socket:
+
+    cygenja serve &
+    cygenja --server generate src '*.cpx'
+    cygenja --server dry-run
+    cygenja --server clean
+
+The protocol is made of JSON lines. A client sends one request:
+
+    {"command": "generate", "dir_pattern": "src", "file_pattern": "*.cpx", "recursively": true, "force": false}
+
+``command`` is one of ``generate``, ``plan`` (dry run), ``clean``, ``ping`` or ``shutdown``. A ``generate`` request can
+give ``targets`` (filenames to generate, see :meth:`Generator.generate_targets`) instead of patterns, ``workers`` and
+``resume``. The server streams one line per event (``{"event": "written", "file": "/abs/src/a.pyx"}``) and ends with a
+status line: ``{"status": "ok", "counts": {...}, "duration": 0.12}`` or ``{"status": "error", "message": "..."}``.
+
+Before each request, the server checks the project file and the modules of the filters and actions: if one of them
+changed, the changed modules are reloaded and the generator is created again. Templates are checked at each run (the
+environment of the server always auto reloads its templates).
+"""
+import json
+import os
+import socket
+import sys
+import time
+
+from cygenja.project import DEFAULT_PROJECT_FILENAME, Project
+
+SOCKET_FILENAME = 'server.sock'
+
+COMMAND_ACTIONS = {'generate': 'g',
+                   'plan': 'd',
+                   'clean': 'c'}
+
+
+def default_socket_path(project_filename=DEFAULT_PROJECT_FILENAME):
+    """
+    Return the default socket of the server of a project: in the state directory of its generator.
+
+    Args:
+        project_filename (str): The project file.
+    """
+    from cygenja.generator import STATE_DIRECTORY_NAME
+
+    project = Project(project_filename)
+    state_directory = project.state_directory()
+    if state_directory is None:
+        state_directory = os.path.join(project.root_directory(), STATE_DIRECTORY_NAME)
+    return os.path.join(state_directory, SOCKET_FILENAME)
+
+
+def _encode_message(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+def _decode_message(line):
+    return json.loads(line.decode('utf-8'))
+
+
+def _reload_module(module):
+    try:
+        from importlib import reload
+    except ImportError:
+        # Python 2: builtin
+        from __builtin__ import reload
+    reload(module)
+
+
+def _module_source_file(module):
+    """
+    Return the **absolute** filename of the source of a module or ``None``.
+
+    """
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+    root, extension = os.path.splitext(os.path.abspath(filename))
+    if extension in ('.pyc', '.pyo'):
+        return root + '.py'
+    return root + extension
+
+
+class GenerationServer(object):
+    """
+    Server keeping the :class:`Generator` of a project warm between requests.
+
+    Requests are served one after the other: the generator is never used by two requests at the same time.
+    """
+    def __init__(self, project_filename=DEFAULT_PROJECT_FILENAME, socket_path=None, logger=None, use_cache=True):
+        """
+        Constructor.
+
+        Args:
+            project_filename (str): The project file. See :mod:`cygenja.project`.
+            socket_path (str): Filename of the Unix domain socket. By default, ``server.sock`` in the state directory
+                of the generator.
+            logger: A logger (from the standard ``logging``) or ``None`` is no logging is wanted.
+            use_cache (bool): Reuse (and save) the cached registry of the project.
+
+        Raises:
+            ValueError: If the project file is not valid.
+        """
+        super(GenerationServer, self).__init__()
+        self.__project_filename = os.path.abspath(project_filename)
+        self.__logger = logger
+        self.__use_cache = use_cache
+
+        self.__socket_path = socket_path if socket_path is not None else default_socket_path(project_filename)
+        self.__socket = None
+        self.__running = False
+
+        # connection the events of the current request are streamed to
+        self.__event_connection = None
+
+        self.__generator = None
+        # (source_file, mtime) of the files the generator depends on
+        self.__source_mtimes = dict()
+        self.__create_generator()
+
+    ###########################################################################
+    # LOGGING
+    ###########################################################################
+    def log_info(self, msg, *args):
+        """
+        Log an information message. Arguments are only formatted if the message is logged.
+
+        """
+        if self.__logger is not None:
+            self.__logger.info(msg, *args)
+
+    def log_error(self, msg):
+        """
+        Log an error and raise a ``RuntimeError``.
+
+        """
+        if self.__logger is not None:
+            self.__logger.error(msg)
+        raise RuntimeError(msg)
+
+    ###########################################################################
+    # GENERATOR
+    ###########################################################################
+    def socket_path(self):
+        return self.__socket_path
+
+    def generator(self):
+        """
+        Return the current :class:`Generator` of the server.
+
+        """
+        return self.__generator
+
+    def __create_generator(self):
+        """
+        Create the generator of the project (again) and record the modification times of its source files.
+
+        """
+        from cygenja.generator import Generator
+
+        project = Project(self.__project_filename)
+
+        environment_options = project.environment_options()
+        # templates might change between two requests
+        environment_options['auto_reload'] = True
+
+        def jinja2_environment():
+            return Generator.create_jinja2_environment(**environment_options)
+
+        generator = project.create_generator(logger=self.__logger,
+                                             use_cache=self.__use_cache,
+                                             jinja2_environment=jinja2_environment)
+        generator.add_event_listener(self.__send_event)
+        generator.use_compiled_templates()
+
+        self.__generator = generator
+        self.__source_mtimes = dict((source_file, self.__mtime(source_file)) for source_file in project.source_files())
+
+    @staticmethod
+    def __mtime(filename):
+        try:
+            return os.stat(filename).st_mtime
+        except OSError:
+            return None
+
+    def __changed_source_files(self):
+        return [source_file for source_file, mtime in self.__source_mtimes.items()
+                if self.__mtime(source_file) != mtime]
+
+    def refresh(self):
+        """
+        Create the generator again if the project file or a module of its filters or actions changed.
+
+        The changed modules are reloaded first.
+
+        Returns:
+            ``True`` if the generator was created again.
+        """
+        changed_source_files = set(self.__changed_source_files())
+        if not changed_source_files:
+            return False
+
+        for module in list(sys.modules.values()):
+            if module is not None and _module_source_file(module) in changed_source_files:
+                self.log_info("Reloading module '%s'", module.__name__)
+                _reload_module(module)
+
+        self.log_info('%d file(s) of the project changed: creating the generator again', len(changed_source_files))
+        self.__create_generator()
+
+        return True
+
+    ###########################################################################
+    # REQUESTS
+    ###########################################################################
+    def __send_event(self, outcome, filename):
+        """
+        Stream one event to the client of the current request.
+
+        """
+        if self.__event_connection is None:
+            return
+        try:
+            self.__event_connection.sendall(_encode_message({'event': outcome, 'file': filename}))
+        except socket.error:
+            # client gone: the request is still served
+            self.__event_connection = None
+
+    def handle_request(self, request):
+        """
+        Serve one request.
+
+        Args:
+            request (dict): The request. See :mod:`cygenja.server`.
+
+        Returns:
+            The status message.
+        """
+        if not isinstance(request, dict):
+            return {'status': 'error', 'message': 'Request is not a JSON object'}
+
+        command = request.get('command')
+        if command == 'ping':
+            return {'status': 'ok'}
+        if command == 'shutdown':
+            self.__running = False
+            return {'status': 'ok'}
+        if command not in COMMAND_ACTIONS:
+            return {'status': 'error', 'message': "Command '%s' is not recognized" % command}
+
+        start = time.time()
+        try:
+            self.refresh()
+            generator = self.__generator
+            targets = request.get('targets')
+            if targets and command == 'generate':
+                generator.generate_targets(targets,
+                                           force=request.get('force', False),
+                                           workers=request.get('workers', 1),
+                                           resume=request.get('resume', False))
+            else:
+                generator.generate(request.get('dir_pattern', '.'),
+                                   request.get('file_pattern', '*'),
+                                   action_ch=COMMAND_ACTIONS[command],
+                                   recursively=request.get('recursively', True),
+                                   force=request.get('force', False),
+                                   workers=request.get('workers', 1),
+                                   resume=request.get('resume', False))
+        except (ValueError, RuntimeError, ImportError, SyntaxError) as e:
+            return {'status': 'error', 'message': str(e)}
+        except Exception as e:
+            # i.e. a template or a filter failing: the server keeps serving
+            return {'status': 'error', 'message': '%s: %s' % (e.__class__.__name__, e)}
+
+        return {'status': 'ok',
+                'counts': self.__generator.last_run_report().counts(),
+                'duration': time.time() - start}
+
+    def __serve_connection(self, connection):
+        """
+        Read the request of a connection, serve it and send its status.
+
+        """
+        request_file = connection.makefile('rb')
+        try:
+            line = request_file.readline()
+        finally:
+            request_file.close()
+        if not line:
+            return
+
+        try:
+            request = _decode_message(line)
+        except ValueError:
+            status = {'status': 'error', 'message': 'Request is not valid JSON'}
+        else:
+            self.__event_connection = connection
+            try:
+                status = self.handle_request(request)
+            finally:
+                self.__event_connection = None
+
+        try:
+            connection.sendall(_encode_message(status))
+        except socket.error:
+            pass
+
+    ###########################################################################
+    # SOCKET
+    ###########################################################################
+    def __bind(self):
+        """
+        Bind the socket, removing the socket of a dead server if needed.
+
+        """
+        if os.path.exists(self.__socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.__socket_path)
+            except socket.error:
+                # stale socket of a dead server
+                os.remove(self.__socket_path)
+            else:
+                self.log_error("A server already listens on '%s'" % self.__socket_path)
+            finally:
+                probe.close()
+
+        socket_directory = os.path.dirname(os.path.abspath(self.__socket_path))
+        if not os.path.isdir(socket_directory):
+            os.makedirs(socket_directory)
+
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__socket.bind(self.__socket_path)
+        self.__socket.listen(5)
+
+    def serve_forever(self):
+        """
+        Serve requests until a ``shutdown`` request (or an interruption).
+
+        """
+        self.__bind()
+        self.__running = True
+        self.log_info("Server listening on '%s'", self.__socket_path)
+        try:
+            while self.__running:
+                connection, _ = self.__socket.accept()
+                try:
+                    self.__serve_connection(connection)
+                finally:
+                    connection.close()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """
+        Close and remove the socket.
+
+        """
+        self.__running = False
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+            if os.path.exists(self.__socket_path):
+                os.remove(self.__socket_path)
+            self.log_info('Server stopped')
+
+
+def send_request(socket_path, request):
+    """
+    Send a request to a :class:`GenerationServer` and yield its answer, line after line.
+
+    Args:
+        socket_path (str): Filename of the Unix domain socket of the server.
+        request (dict): The request. See :mod:`cygenja.server`.
+
+    Yields:
+        The events (``{'event': ..., 'file': ...}``) and, last, the status (``{'status': ...}``) of the request.
+
+    Raises:
+        RuntimeError: If no server listens on the socket.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(socket_path)
+        except socket.error as e:
+            raise RuntimeError("No server listens on '%s' (%s)" % (socket_path, e))
+
+        client.sendall(_encode_message(request))
+        answer_file = client.makefile('rb')
+        try:
+            for line in answer_file:
+                yield _decode_message(line)
+        finally:
+            answer_file.close()
+    finally:
+        client.close()
@@ -0,0 +1,115 @@
+"""
+:program:`setuptools` integration.
+
+:func:`make_build_ext` returns a ``build_ext`` command that generates, just before building each extension, **only** the
+sources this extension needs. Each source is mapped back to its template and context through the actions registered in
+the :class:`Generator` and only outdated sources are rendered. The sources are then handed to :program:`Cython`, which only
+recompiles modules whose sources changed.
+
+In ``setup.py``:
+
+    from cygenja.setuptools_command import make_build_ext
+
+    def create_engine():
+        engine = Generator(...)
+        # register filters, extensions and actions
+        ...
+        return engine
+
+    setup(...,
+          cmdclass={'build_ext': make_build_ext(create_engine)},
+          ext_modules=ext)
+
+The :program:`Cython` and :program:`setuptools` modules are only imported when the command is created or run.
+"""
+import os
+
+
+def make_build_ext(generator_factory, base_class=None, cythonize_sources=True, cythonize_options=None, force=False):
+    """
+    Create a ``build_ext`` command class generating the sources of each extension lazily.
+
+    Args:
+        generator_factory: Callable without argument returning a fully configured :class:`Generator` (filters,
+            extensions and actions registered). It is called once, the first time an extension is built.
+        base_class: ``build_ext`` class to extend. By default, the ``build_ext`` of :program:`setuptools`.
+        cythonize_sources (bool): If ``True``, the :program:`Cython` sources of each extension are cythonized by the
+            command. Set to ``False`` if ``base_class`` already deals with :program:`Cython` sources (i.e.
+            ``Cython.Distutils.build_ext``).
+        cythonize_options (dict): Keyword arguments given to ``Cython.Build.cythonize``.
+        force (bool): Force the generation of the sources no matter what.
+
+    Returns:
+        A ``build_ext`` command class.
+    """
+    if base_class is None:
+        from setuptools.command.build_ext import build_ext as base_class
+
+    if cythonize_options is None:
+        cythonize_options = dict()
+
+    class cygenja_build_ext(base_class):
+        """
+        ``build_ext`` command generating the sources of each extension with :program:`cygenja` before building it.
+
+        """
+        _cygenja_generator = None
+
+        def cygenja_generator(self):
+            """
+            Return the :class:`Generator`, created on first use.
+
+            """
+            if cygenja_build_ext._cygenja_generator is None:
+                cygenja_build_ext._cygenja_generator = generator_factory()
+            return cygenja_build_ext._cygenja_generator
+
+        def generate_extension_sources(self, ext):
+            """
+            Generate the sources of one extension if needed.
+
+            Sources and dependencies of the extension (relative to the root directory of the :class:`Generator`) are
+            mapped back to their templates and contexts and **only** these files are rendered. Companion files with the
+            same base name (i.e. the ``.pxd`` of a ``.pyx``) are also generated if a template produces them.
+
+            Sources are not parsed: a generated file with another base name (i.e. a ``.pxd`` that a source cimports)
+            is **not** generated unless it is listed in the ``depends`` of the extension.
+
+            Args:
+                ext: The ``Extension`` object.
+
+            Returns:
+                The list of the **absolute** filenames of the written files.
+            """
+            generator = self.cygenja_generator()
+            root_directory = generator.root_directory()
+
+            generated_exts = set(generator.registered_extensions_dict().values())
+
+            candidates = list()
+            for source in list(ext.sources) + list(getattr(ext, 'depends', [])):
+                source = os.path.normpath(os.path.join(root_directory, source))
+                source_without_ext = os.path.splitext(source)[0]
+                candidates.append(source)
+                candidates.extend(source_without_ext + ext_out for ext_out in generated_exts)
+
+            output_index = generator.build_output_index_for(candidates)
+            targets = [candidate for candidate in candidates if candidate in output_index]
+
+            written_files = generator.generate_targets(targets, force=force, output_index=output_index)
+
+            return written_files
+
+        def build_extension(self, ext):
+            written_files = self.generate_extension_sources(ext)
+            if written_files:
+                self.announce('cygenja: generated %d file(s) for %s' % (len(written_files), ext.name), level=2)
+
+            if cythonize_sources and [source for source in ext.sources if source.endswith(('.pyx', '.py'))]:
+                from Cython.Build import cythonize
+                cythonized_ext = cythonize([ext], **cythonize_options)[0]
+                ext.sources = cythonized_ext.sources
+
+            return base_class.build_extension(self, ext)
+
+    return cygenja_build_ext
@@ -0,0 +1,169 @@
+"""
+Detection of static templates.
+
+A template without any :program:`Jinja2` construct (no variable, block, comment nor line statement) renders to its own
+source, whatever the context. Its outputs are simply copied: :program:`Jinja2` is not even loaded. The only changes
+made by a rendering are reproduced: the trailing newline is removed (unless ``keep_trailing_newline`` is set) and
+templates with other line endings than ``newline_sequence`` are never considered static.
+
+The detection is cached per template content hash in a JSON file of the state directory of the :class:`Generator`,
+along with the syntax of the environment it was made with.
+"""
+import hashlib
+
+from cygenja.helpers.file_helpers import read_json_file, write_json_file
+
+
+def template_syntax(environment):
+    """
+    Return what the detection of static templates depends on in an environment, as a list.
+
+    Args:
+        environment: :program:`Jinja2` environment.
+    """
+    return [environment.variable_start_string,
+            environment.block_start_string,
+            environment.comment_start_string,
+            environment.line_statement_prefix,
+            environment.line_comment_prefix,
+            environment.keep_trailing_newline,
+            environment.newline_sequence]
+
+
+def static_output_length(source, syntax):
+    """
+    Return the length (in bytes) of the rendering of a static template or ``None`` if the template is not static.
+
+    The rendering of a static template is the beginning of its source.
+
+    Args:
+        source (bytes): Source of the template.
+        syntax (list): See :func:`template_syntax`.
+    """
+    (variable_start, block_start, comment_start, line_statement_prefix, line_comment_prefix,
+     keep_trailing_newline, newline_sequence) = syntax
+
+    try:
+        text = source.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    for delimiter in (variable_start, block_start, comment_start, line_statement_prefix, line_comment_prefix):
+        if delimiter and delimiter in text:
+            return None
+
+    # line endings are normalized by Jinja2
+    if '\r' in text or newline_sequence != '\n':
+        return None
+
+    if not keep_trailing_newline and source.endswith(b'\n'):
+        return len(source) - 1
+
+    return len(source)
+
+
+class StaticTemplates(object):
+    """
+    Cache of the detection of static templates.
+
+    """
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the cache.
+        """
+        super(StaticTemplates, self).__init__()
+        self.__filename = filename
+        content = read_json_file(filename)
+        self.__syntax = content.get('syntax')
+        # template filename -> {'hash', 'length'}
+        self.__entries = content.get('templates', dict())
+        self.__modified = False
+        # template filename -> (mtime_ns, length), for the current run
+        self.__run_lengths = dict()
+
+    def start_run(self):
+        """
+        Forget the lengths found during the previous run: templates might have changed since.
+
+        """
+        self.__run_lengths = dict()
+
+    def set_syntax(self, syntax):
+        """
+        Set the syntax of the environment. The cache is emptied if it was made with another syntax.
+
+        Args:
+            syntax (list): See :func:`template_syntax`.
+        """
+        if self.__syntax != syntax:
+            self.__syntax = syntax
+            self.__entries = dict()
+            self.__run_lengths = dict()
+            self.__modified = True
+
+    def output_length(self, template_filename, syntax_factory, mtime_ns=None):
+        """
+        Return the length (in bytes) of the rendering of a static template or ``None`` if the template is not static.
+
+        Args:
+            template_filename (str): **Absolute** filename of the template.
+            syntax_factory: Callable returning the syntax of the environment (see :func:`template_syntax`). Only
+                called if the template changed and the syntax is not known yet.
+            mtime_ns (int): Modification time of the template, if known. A template with several outputs is then only
+                read and hashed once per run.
+        """
+        if mtime_ns is not None:
+            run_length = self.__run_lengths.get(template_filename)
+            if run_length is not None and run_length[0] == mtime_ns:
+                return run_length[1]
+
+        length = self.__output_length(template_filename, syntax_factory)
+
+        if mtime_ns is not None:
+            self.__run_lengths[template_filename] = (mtime_ns, length)
+
+        return length
+
+    def __output_length(self, template_filename, syntax_factory):
+        """
+        Return the length of the rendering of a static template from the cache, checked against the hash of its source.
+
+        """
+        try:
+            with open(template_filename, 'rb') as f:
+                source = f.read()
+        except (IOError, OSError):
+            return None
+
+        source_hash = hashlib.sha1(source).hexdigest()
+        entry = self.__entries.get(template_filename)
+        if entry is not None and entry['hash'] == source_hash:
+            return entry['length']
+
+        if self.__syntax is None:
+            self.set_syntax(syntax_factory())
+
+        length = static_output_length(source, self.__syntax)
+        self.__entries[template_filename] = {'hash': source_hash, 'length': length}
+        self.__modified = True
+
+        return length
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write.
+
+        """
+        return self.__modified
+
+    def save(self):
+        """
+        Write the cache if it was modified.
+
+        """
+        if self.__modified:
+            write_json_file(self.__filename, {'syntax': self.__syntax, 'templates': self.__entries})
+            self.__modified = False
@@ -0,0 +1,257 @@
+"""
+Content based change detection.
+
+In a fresh checkout (i.e. on a CI server), all the files get the modification time of the checkout: comparing the
+modification times of the templates and of the generated files regenerates everything or nothing at random. With
+``change_detection='git'``, the :class:`Generator` records, for every generated file, the hash of the template it was
+generated from. A generated file is outdated when the current hash of its template differs from the recorded one,
+whatever the modification times.
+
+Hashes are the blob hashes of :program:`git`. They are read from the index (``git ls-files -s``): only the templates
+modified in the working tree (``git diff``) are hashed again (``git hash-object``) and the untracked templates are
+hashed by :program:`cygenja`. Without :program:`git` (or outside of a repository), all the templates are hashed.
+``change_detection='hash'`` always hashes the templates.
+
+    {"commit": "9f1c...", "hashes": {"src/basic_INT32_FLOAT32.pyx": "e69d..."}}
+
+Generated files without recorded hash (i.e. generated before) are tested with their modification times and the hash of
+their template is recorded. Filenames are relative to the root directory: the state directory can be cached between CI
+jobs or committed along with the generated files.
+"""
+import hashlib
+import os
+import subprocess
+
+from cygenja.helpers.file_helpers import read_json_file, write_json_file
+
+# regular files in the index (symbolic links and submodules are hashed by cygenja)
+GIT_FILE_MODES = (b'100644', b'100755')
+
+
+def git_blob_hash(filename):
+    """
+    Return the :program:`git` blob hash of the content of a file.
+
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    header = ('blob %d\0' % len(data)).encode('ascii')
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def _native_path(path):
+    """
+    Return a path read from the output of :program:`git` as a native string.
+
+    """
+    if bytes is str:
+        return path
+    return os.fsdecode(path)
+
+
+def _run_git(directory, arguments, input_data=None):
+    """
+    Return the output of a :program:`git` command or ``None`` if :program:`git` is not available or the command failed.
+
+    Args:
+        directory (str): Directory the command is run in.
+        arguments (list): Arguments of the command.
+        input_data (bytes): Standard input of the command.
+    """
+    try:
+        process = subprocess.Popen(['git'] + list(arguments),
+                                   cwd=directory,
+                                   stdin=subprocess.PIPE if input_data is not None else None,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError:
+        # git is not installed
+        return None
+
+    output, _ = process.communicate(input_data)
+    if process.returncode != 0:
+        return None
+    return output
+
+
+def git_head_commit(directory):
+    """
+    Return the commit checked out in the repository of a directory or ``None``.
+
+    """
+    output = _run_git(directory, ['rev-parse', '--verify', '-q', 'HEAD'])
+    if not output:
+        return None
+    return output.strip().decode('ascii')
+
+
+def git_blob_hashes(directory):
+    """
+    Return the blob hashes of the files of a directory (and of its sub-directories) tracked by :program:`git`.
+
+    Files modified in the working tree are hashed again. Files with conflicts, deleted files, symbolic links and
+    submodules are left out.
+
+    Args:
+        directory (str): **Absolute** directory inside a repository.
+
+    Returns:
+        The ``(filename, blob_hash)`` dictionary of the **absolute** filenames or ``None`` if :program:`git` is not
+        available or ``directory`` is not inside a repository.
+    """
+    output = _run_git(directory, ['ls-files', '-s', '-z'])
+    if output is None:
+        return None
+
+    hashes = dict()
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        info, path = entry.split(b'\t', 1)
+        mode, blob_hash, stage = info.split(b' ')
+        if mode not in GIT_FILE_MODES or stage != b'0':
+            continue
+        hashes[os.path.join(directory, os.path.normpath(_native_path(path)))] = blob_hash.decode('ascii')
+
+    # paths are relative to the directory
+    output = _run_git(directory, ['diff', '--name-only', '-z', '--relative'])
+    if output is None:
+        return None
+
+    modified_filenames = list()
+    for path in output.split(b'\0'):
+        if not path:
+            continue
+        filename = os.path.join(directory, os.path.normpath(_native_path(path)))
+        hashes.pop(filename, None)
+        # '--stdin-paths' reads one path per line
+        if b'\n' not in path and os.path.isfile(filename):
+            modified_filenames.append((filename, path))
+
+    if modified_filenames:
+        # hashed like git does (i.e. with its end of line conversions)
+        output = _run_git(directory, ['hash-object', '--stdin-paths'],
+                          b''.join(path + b'\n' for _, path in modified_filenames))
+        if output is not None:
+            blob_hashes = output.split()
+            if len(blob_hashes) == len(modified_filenames):
+                for (filename, _), blob_hash in zip(modified_filenames, blob_hashes):
+                    hashes[filename] = blob_hash.decode('ascii')
+
+    return hashes
+
+
+class TemplateHashes(object):
+    """
+    Hashes of the templates the generated files were generated from, kept in the state directory.
+
+    """
+    def __init__(self, filename, root_directory):
+        """
+        Constructor.
+
+        Args:
+            filename (str): JSON file of the hashes.
+            root_directory (str): **Absolute** directory the filenames are relative to.
+        """
+        super(TemplateHashes, self).__init__()
+        self.__filename = filename
+        self.__root_directory = root_directory
+
+        state = read_json_file(filename)
+        # commit checked out by the last run that recorded hashes
+        self.__commit = state.get('commit')
+        # generated filename (relative) -> hash of its template when it was generated
+        self.__recorded_hashes = state.get('hashes', dict())
+        self.__modified = False
+
+        # template filename -> current hash, for the current run
+        self.__current_hashes = dict()
+        # hashes read from git for the current run, None if they are not used
+        self.__git_hashes = None
+        self.__head_commit = None
+
+    def __key(self, generated_filename):
+        return os.path.relpath(generated_filename, self.__root_directory)
+
+    def commit(self):
+        """
+        Return the commit checked out by the last run that recorded hashes or ``None``.
+
+        """
+        return self.__commit
+
+    def start_run(self):
+        """
+        Forget the current hashes of the templates: they might have changed since the last run.
+
+        """
+        self.__current_hashes = dict()
+        self.__git_hashes = None
+        self.__head_commit = None
+
+    def read_git_hashes(self):
+        """
+        Read the blob hashes of the templates from :program:`git` for the current run.
+
+        Returns:
+            ``True`` if :program:`git` could be used, ``False`` if all the templates have to be hashed.
+        """
+        self.__git_hashes = git_blob_hashes(self.__root_directory)
+        if self.__git_hashes is None:
+            return False
+        self.__head_commit = git_head_commit(self.__root_directory)
+        return True
+
+    def template_hash(self, template_filename):
+        """
+        Return the current hash of a template.
+
+        Args:
+            template_filename (str): **Absolute** filename of a template file.
+        """
+        template_hash = self.__current_hashes.get(template_filename)
+        if template_hash is None:
+            if self.__git_hashes is not None:
+                template_hash = self.__git_hashes.get(template_filename)
+            if template_hash is None:
+                # untracked template or git not used
+                template_hash = git_blob_hash(template_filename)
+            self.__current_hashes[template_filename] = template_hash
+        return template_hash
+
+    def recorded_hash(self, generated_filename):
+        """
+        Return the hash of the template a file was generated from or ``None`` if it is unknown.
+
+        Args:
+            generated_filename (str): **Absolute** filename of the generated file.
+        """
+        return self.__recorded_hashes.get(self.__key(generated_filename))
+
+    def set_recorded_hash(self, generated_filename, template_hash):
+        key = self.__key(generated_filename)
+        if self.__recorded_hashes.get(key) != template_hash:
+            self.__recorded_hashes[key] = template_hash
+            self.__modified = True
+
+    def remove_recorded_hash(self, generated_filename):
+        if self.__recorded_hashes.pop(self.__key(generated_filename), None) is not None:
+            self.__modified = True
+
+    def is_modified(self):
+        """
+        Test if :meth:`save` has something to write: the hashes were modified or another commit is checked out.
+
+        """
+        return self.__modified or (self.__head_commit is not None and self.__head_commit != self.__commit)
+
+    def save(self):
+        """
+        Write the hashes if they were modified.
+
+        """
+        if self.is_modified():
+            self.__commit = self.__head_commit or self.__commit
+            write_json_file(self.__filename, {'commit': self.__commit, 'hashes': self.__recorded_hashes})
+            self.__modified = False
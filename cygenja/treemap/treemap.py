@@ -10,11 +10,19 @@ class TreeMap(object):
     path to the node.
     
     Linking nodes are created on the fly if needed.
+
+    In *copy-on-write* mode, the tree can be shared between threads: nodes are never modified once published. A
+    writer copies the nodes along the path it modifies (the rest of the tree is shared), under a lock, and publishes
+    the new version by replacing the root node. Readers don't take any lock: :meth:`snapshot` gives a frozen view of
+    the current version that stays the same no matter what is written afterwards. As a node can be shared by several
+    versions, the nodes of a copy-on-write tree have no parent link (see :meth:`TreeMapNode.get_parent`).
     """
-    def __init__(self):
+    def __init__(self, copy_on_write=False):
         """
         Constructor.
 
+        Args:
+            copy_on_write (bool): Enable the copy-on-write mode.
         """
         super(TreeMap, self).__init__()
         # dummy root node
@@ -22,14 +30,109 @@ class TreeMap(object):
 
         self._nbr_of_nodes = 0
 
+        self._copy_on_write = copy_on_write
+        self._frozen = False
+        # incremented each time a new version is published
+        self._version = 0
+        self._writer_lock = None
+        if copy_on_write:
+            import threading
+            self._writer_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # locks can not be pickled
+        state['_writer_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # trees pickled before the copy-on-write mode existed
+        self.__dict__.setdefault('_copy_on_write', False)
+        self.__dict__.setdefault('_frozen', False)
+        self.__dict__.setdefault('_version', 0)
+        if self._copy_on_write:
+            import threading
+            self._writer_lock = threading.Lock()
+        else:
+            self._writer_lock = None
+
     def clear(self):
         """
         Clear the structure but without deleting anything.
         
         Some nodes/elements might be used somewhere else. We simply detach node references from the dummy root node.
+        In copy-on-write mode, an empty tree is published instead.
         """
+        self._check_writable()
+
+        if self._copy_on_write:
+            with self._writer_lock:
+                self._publish(RootTreeMapNode(), 0)
+            return
+
         self._root_node.detach_children()
         self._nbr_of_nodes = 0
+        self._version += 1
+
+    ####################################################################################################################
+    # Copy-on-write
+    ####################################################################################################################
+    def is_copy_on_write(self):
+        """
+        Test if the tree is in copy-on-write mode.
+
+        """
+        return self._copy_on_write
+
+    def is_frozen(self):
+        """
+        Test if the tree is a frozen view (see :meth:`snapshot`).
+
+        """
+        return self._frozen
+
+    def version(self):
+        """
+        Return the version of the tree, incremented each time an entry is created or modified.
+
+        """
+        return self._version
+
+    def snapshot(self):
+        """
+        Return a frozen view of the current version of the tree.
+
+        The view shares the nodes of the tree and can be read by any number of threads without lock. It can not be
+        modified.
+
+        Raises:
+            RuntimeError: If the tree is not in copy-on-write mode: its nodes could be modified under the view.
+        """
+        if not self._copy_on_write:
+            raise RuntimeError("Snapshots are only available in copy-on-write mode")
+
+        view = TreeMap()
+        with self._writer_lock:
+            view._root_node = self._root_node
+            view._nbr_of_nodes = self._nbr_of_nodes
+            view._version = self._version
+        view._frozen = True
+
+        return view
+
+    def _check_writable(self):
+        if self._frozen:
+            raise RuntimeError("A TreeMap snapshot can not be modified")
+
+    def _publish(self, root_node, nbr_of_nodes):
+        """
+        Publish a new version of the tree. Must be called with the writer lock.
+
+        """
+        self._root_node = root_node
+        self._nbr_of_nodes = nbr_of_nodes
+        self._version += 1
 
     ####################################################################################################################
     # Basic info about the tree
@@ -129,6 +232,12 @@ class TreeMap(object):
         Note:
             Non existing linking node (i.e. non leaf nodes) are created on the fly.
         """
+        self._check_writable()
+
+        if self._copy_on_write:
+            with self._writer_lock:
+                return self._create_entry_by_path_copying(location, element, unique)
+
         loc_descriptor = self._get_location_descriptor(location)
 
         # find parent node
@@ -152,6 +261,47 @@ class TreeMap(object):
                 child_node.delete_element()
             child_node.set_element(element)
 
+        self._version += 1
+
+        return child_node
+
+    def _create_entry_by_path_copying(self, location, element, unique=True):
+        """
+        Same as :meth:`_create_entry` in copy-on-write mode: the nodes along the path are copied and the new version is
+        published. Must be called with the writer lock.
+
+        Note:
+            Elements are replaced, never deleted: they might still be used by a snapshot.
+        """
+        loc_descriptor = self._get_location_descriptor(location)
+        nbr_of_nodes = self._nbr_of_nodes
+
+        root_node = self._root_node.copy()
+        parent_node = root_node
+        for sub_location in loc_descriptor.generate_all_but_last_sub_locations():
+            child_node = parent_node.get_child_node_or_default(sub_location, None)
+            if child_node is None:
+                child_node = TreeMapNode(None)
+                nbr_of_nodes += 1
+            else:
+                child_node = child_node.copy()
+            parent_node.set_shared_child_node(sub_location, child_node)
+            parent_node = child_node
+
+        last_location = loc_descriptor.last_sub_location()
+        child_node = parent_node.get_child_node_or_default(last_location, None)
+        if child_node is None:
+            child_node = TreeMapNode(element)
+            nbr_of_nodes += 1
+        else:
+            if unique:
+                raise RuntimeError("Node corresponding to the location '%s' already exist!" % loc_descriptor.to_string())
+            child_node = child_node.copy()
+            child_node.set_element(element)
+        parent_node.set_shared_child_node(last_location, child_node)
+
+        self._publish(root_node, nbr_of_nodes)
+
         return child_node
 
     def _get_dummy_root(self):
@@ -221,6 +371,34 @@ class TreeMap(object):
         """
         return self._create_entry(location, element, unique=False, delete_element=delete_elem)
 
+    def update_element(self, location, update):
+        """
+        Replace the element located at ``location`` by an element computed from the current one.
+
+        Args:
+            location: String or :class:`LocationDescriptor` to describe a "separator location" (i.e. dir1/dir2/dir3 for
+                instance).
+            update: Callable ``update(element)`` returning the element to store. ``element`` is the current element or
+                ``None``.
+
+        Returns:
+            The node with the new element.
+
+        Notes:
+            In copy-on-write mode, the current element is read and replaced under the writer lock: concurrent updates
+            of a location are never lost. ``update`` must then return a new element instead of modifying the current
+            one, which might be used by a snapshot.
+        """
+        self._check_writable()
+
+        if self._copy_on_write:
+            with self._writer_lock:
+                element = self.retrieve_element_or_default(location, None)
+                return self._create_entry_by_path_copying(location, update(element), unique=False)
+
+        element = self.retrieve_element_or_default(location, None)
+        return self._create_entry(location, update(element), unique=False)
+
     def retrieve_element(self, location):
         """
         
@@ -253,6 +431,27 @@ class TreeMap(object):
 
         return node.get_element()
 
+    def generate_elements_along(self, location):
+        """
+        Generate the elements of the nodes along a location, from the first sub location to the last one.
+
+        Args:
+            location: String or :class:`LocationDescriptor` to describe a "separator location" (i.e. dir1/dir2/dir3 for
+                instance).
+
+        Yields:
+            The elements of the existing nodes, if any. The walk stops at the first missing node: it costs O(depth).
+        """
+        loc_descriptor = self._get_location_descriptor(location)
+
+        node = self._root_node
+        for sub_location in loc_descriptor.generate_all_sub_locations():
+            node = node.get_child_node_or_default(sub_location, None)
+            if node is None:
+                return
+            if node.has_element():
+                yield node.get_element()
+
     ####################################################################################################################
     # DEBUG
     ####################################################################################################################
@@ -67,6 +67,20 @@ class TreeMapNode(object):
         self._nodes[name] = node
         node.set_parent(self)
 
+    def set_shared_child_node(self, name, node):
+        """
+        Add one child node to this node without linking the child to its parent.
+
+        Used in copy-on-write mode: a node can be shared by several versions of the tree, i.e. by several parents.
+
+        Args:
+            name (str): Name of the child.
+            node (TreeMapNode): Node to add.
+        """
+        assert isinstance(node, TreeMapNode)
+        self._nodes[name] = node
+        node._depth = self._depth + 1
+
     def set_unique_child_node(self, name, node):
         """
         Add one child node to this node.
@@ -186,6 +200,26 @@ class TreeMapNode(object):
         """
         return self._depth
 
+    def get_parent(self):
+        """
+        Return the parent node or ``None`` if the node is detached (or in a copy-on-write tree).
+
+        """
+        return self._parent
+
+    def copy(self):
+        """
+        Return a shallow copy of the node: the element and the child nodes are shared, not copied.
+
+        Note:
+            The copy has no parent: the original node and its copy can both be attached to (different versions of)
+            their parent. The child nodes are shared: their parent links are left as they are.
+        """
+        node = self.__class__(self._element)
+        node._nodes = dict(self._nodes)
+        node._depth = self._depth
+        return node
+
     ####################################################################################################################
     # Element methods
     ####################################################################################################################
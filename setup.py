@@ -50,4 +50,5 @@ setup(name='cygenja',
       install_requires=['jinja2'],
       package_dir={"cygenja": "cygenja"},
       packages=packages_list,
+      entry_points={'console_scripts': ['cygenja = cygenja.cli:main']},
       )
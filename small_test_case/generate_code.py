@@ -2,7 +2,8 @@
 ###############################################################################
 # This script generates all templated code for this small test case.
 # It this the single one script to use before Cythonizing this library.
-# This script is NOT automatically called by setup.py
+# This script is NOT automatically called by setup.py but setup.py generates
+# the sources of the extensions it builds with the same cygenja engine.
 #
 # We use our internal library cygenja, using itself the Jinja2 template engine:
 # http://jinja.pocoo.org/docs/dev/
@@ -13,7 +14,6 @@ import shutil
 import argparse
 import logging
 import ConfigParser
-from jinja2 import Environment, FileSystemLoader
 
 from cygenja.generator import Generator
 
@@ -40,6 +40,18 @@ def make_parser():
                         action='store_true', required=False)
     parser.add_argument("-f", "--force", help="Force generation no matter what",
                         action='store_true', required=False)
+    parser.add_argument("--depfile", help="Write the dependencies of the generated files in this file",
+                        required=False)
+    parser.add_argument("--depfile-format", help="Format of the depfile",
+                        choices=['make', 'ninja'], default='make', required=False)
+    parser.add_argument("-j", "--workers", help="Number of workers rendering the templates",
+                        type=int, default=1, required=False)
+    parser.add_argument("--processes", help="Render with processes instead of threads",
+                        action='store_true', required=False)
+    parser.add_argument("-v", "--verbose", help="Log every file (by default, only a summary per directory)",
+                        action='store_true', required=False)
+    parser.add_argument("--compile", help="Compile the templates ahead of time (used by the next runs)",
+                        action='store_true', required=False)
     parser.add_argument('dir_pattern', nargs='?', default='.',
                         help='Glob pattern')
     parser.add_argument('file_pattern', nargs='?', default='*.*',
@@ -86,13 +98,16 @@ def generic_to_c_type(generic_type):
 
 
 # JINJA 2 environment
-GENERAL_ENVIRONMENT = Environment(
-    autoescape=False,
-    loader=FileSystemLoader('/'),  # we use absolute filenames
-    trim_blocks=True,
-    lstrip_blocks=True,
-    variable_start_string='@',
-    variable_end_string='@')
+# One-shot run: keep all compiled templates and don't check if they are up-to-date
+# The environment is only created if templates are rendered (not for dry runs nor cleanings)
+def create_general_environment():
+    return Generator.create_jinja2_environment(
+        cache_size=-1,
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        variable_start_string='@',
+        variable_end_string='@')
 
 
 # LOGGER
@@ -147,24 +162,20 @@ def create_logger(config):
     return logger
 
 
-if __name__ == "__main__":
-
-    # command line arguments
-    parser = make_parser()
-    arg_options = parser.parse_args()
-
-    # read config file
-    config = ConfigParser.SafeConfigParser()
-    config.read('site.cfg')
+def create_cygenja_engine(logger=None, log_details=False):
+    """
+    Create the cygenja engine with all filters, extensions and actions registered.
 
-    # create logger
-    logger = create_logger(config)
+    Also used by setup.py to generate the sources of each extension lazily.
 
-    # cygenja engine
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    cygenja_engine = Generator(current_directory,
-                               GENERAL_ENVIRONMENT,
-                               logger=logger)
+    Args:
+        logger: A logger or ``None``.
+        log_details (bool): Log every file.
+    """
+    cygenja_engine = Generator(PATH,
+                               create_general_environment,
+                               logger=logger,
+                               log_details=log_details)
 
     # register filter
     cygenja_engine.register_filter('generic_to_c_type',
@@ -183,13 +194,42 @@ if __name__ == "__main__":
     cygenja_engine.register_action('small_test_case/src', 'basic.*',
                                    generate_following_index_and_element)
 
+    return cygenja_engine
+
+
+if __name__ == "__main__":
+
+    # command line arguments
+    parser = make_parser()
+    arg_options = parser.parse_args()
+
+    # read config file
+    config = ConfigParser.SafeConfigParser()
+    config.read('site.cfg')
+
+    # create logger
+    logger = create_logger(config)
+
+    # cygenja engine
+    cygenja_engine = create_cygenja_engine(logger=logger, log_details=arg_options.verbose)
+
+    # Compilation of the templates
+    if arg_options.compile:
+        cygenja_engine.compile_templates(arg_options.dir_pattern,
+                                         arg_options.file_pattern,
+                                         recursively=True)
+        sys.exit(0)
+
     # Generation
     if arg_options.dry_run:
         cygenja_engine.generate(arg_options.dir_pattern,
                                 arg_options.file_pattern,
                                 action_ch='d',
                                 recursively=True,
-                                force=arg_options.force)
+                                force=arg_options.force,
+                                depfile=arg_options.depfile,
+                                depfile_format=arg_options.depfile_format,
+                                workers=arg_options.workers)
     elif arg_options.clean:
         cygenja_engine.generate(arg_options.dir_pattern,
                                 arg_options.file_pattern,
@@ -197,10 +237,15 @@ if __name__ == "__main__":
                                 recursively=True,
                                 force=arg_options.force)
     else:
+        cygenja_engine.use_compiled_templates()
         cygenja_engine.generate(arg_options.dir_pattern,
                                 arg_options.file_pattern,
                                 action_ch='g',
                                 recursively=True,
-                                force=arg_options.force)
+                                force=arg_options.force,
+                                depfile=arg_options.depfile,
+                                depfile_format=arg_options.depfile_format,
+                                workers=arg_options.workers,
+                                use_processes=arg_options.processes)
         # special case for the setup.py file
         shutil.copy2(os.path.join('config', 'setup.py'), '.')
@@ -9,6 +9,9 @@ from distutils.extension import Extension
 from Cython.Distutils import build_ext
 from Cython.Build import cythonize
 
+from cygenja.setuptools_command import make_build_ext
+from generate_code import create_cygenja_engine
+
 import numpy as np
 
 import ConfigParser
@@ -93,7 +96,10 @@ setup(name='small_test_case',
       license='LGPL',
       classifiers=filter(None, CLASSIFIERS.split('\n')),
       install_requires=['numpy', 'Cython'],
-      cmdclass = {'build_ext': build_ext},
+      # sources of each extension are generated (if needed) just before it is built
+      cmdclass = {'build_ext': make_build_ext(create_cygenja_engine,
+                                              base_class=build_ext,
+                                              cythonize_sources=False)},
       ext_modules = ext,
       package_dir = {"small_test_case": "small_test_case"},
       packages=packages_list,
@@ -0,0 +1,122 @@
+"""
+Base class of the tests working on a temporary tree of templates.
+
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# the generator writes encoded code and uses basestring: files are only generated with Python 2
+requires_python2 = unittest.skipIf(sys.version_info[0] > 2, 'cygenja generates files with Python 2 only')
+
+
+def single_output(context=None):
+    """
+    Return an action yielding **one** output without suffix.
+
+    """
+    def single_generation():
+        yield '', dict(context or {})
+
+    return single_generation
+
+
+def type_outputs(types, **context):
+    """
+    Return an action yielding one output per type (``_INT32``, ...) with ``type`` in its context.
+
+    """
+    def type_generation():
+        for type_name in types:
+            type_context = dict(context)
+            type_context['type'] = type_name
+            yield '_%s' % type_name, type_context
+
+    return type_generation
+
+
+class RecordingHandler(logging.Handler):
+    """
+    Logging handler keeping the formatted messages.
+
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = list()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class GeneratorTestCase(unittest.TestCase):
+    """
+    Test case with a temporary root directory, removed after each test.
+
+    """
+    def setUp(self):
+        self.root_directory = os.path.realpath(tempfile.mkdtemp(prefix='cygenja-test-'))
+        self.addCleanup(shutil.rmtree, self.root_directory, True)
+
+    def path(self, *names):
+        """
+        Return the **absolute** filename of a file of the temporary tree.
+
+        """
+        return os.path.join(self.root_directory, *names)
+
+    def write_file(self, relative_filename, content, mtime=None):
+        """
+        Write a file of the temporary tree, creating its directory if needed.
+
+        Args:
+            relative_filename (str): Filename relative to the root directory.
+            content (str): Content of the file.
+            mtime (float): If given, modification (and access) time of the file.
+
+        Returns:
+            The **absolute** filename.
+        """
+        filename = self.path(relative_filename)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(filename, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+        return filename
+
+    def read_file(self, relative_filename):
+        with open(self.path(relative_filename), 'r') as f:
+            return f.read()
+
+    def set_mtime(self, relative_filename, mtime):
+        os.utime(self.path(relative_filename), (mtime, mtime))
+
+    def create_logger(self):
+        """
+        Return a logger of information messages, only for this test, and the list of its messages.
+
+        """
+        handler = RecordingHandler()
+        logger = logging.getLogger('cygenja.tests.%s' % self.id())
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger, handler.messages
+
+    def create_generator(self, **options):
+        """
+        Return a :class:`Generator` of the temporary tree translating ``.cpx`` templates into ``.pyx`` files.
+
+        """
+        from cygenja.generator import Generator
+
+        options.setdefault('raise_exception_on_warning', True)
+        generator = Generator(self.root_directory, **options)
+        generator.register_extension('.cpx', '.pyx')
+        return generator
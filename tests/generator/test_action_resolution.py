@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2
+
+
+def named_action(name):
+    """
+    Return an action yielding one output whose context contains the name of the action.
+
+    """
+    def action():
+        yield '', {'action': name}
+
+    action.__name__ = name
+    return action
+
+
+@requires_python2
+class ActionResolutionTest(GeneratorTestCase):
+    def setUp(self):
+        super(ActionResolutionTest, self).setUp()
+        for directory in ('src', 'src/sub', 'src/sub/deep', 'other'):
+            self.write_file(os.path.join(directory, 'a.cpx'), '@action@')
+        self.generator = self.create_generator()
+
+    def actions(self):
+        output_index = self.generator.build_output_index()
+        return dict((os.path.dirname(os.path.relpath(entry.generated_filename, self.root_directory)),
+                     entry.context['action'])
+                    for entry in (output_index.get_entry(filename)
+                                  for filename in output_index.generated_filenames_list()))
+
+    def test_subtree_action(self):
+        self.generator.register_action('src/**', '*.cpx', named_action('subtree'))
+
+        self.assertEqual(self.actions(), {'src': 'subtree', 'src/sub': 'subtree', 'src/sub/deep': 'subtree'})
+
+    def test_whole_tree_action(self):
+        self.generator.register_action('**', '*.cpx', named_action('tree'))
+
+        self.assertEqual(set(self.actions().values()), set(['tree']))
+        self.assertEqual(len(self.actions()), 4)
+
+    def test_nearest_action_first(self):
+        self.generator.register_action('**', '*.cpx', named_action('tree'))
+        self.generator.register_action('src/**', '*.cpx', named_action('src_subtree'))
+        self.generator.register_action('src/sub/**', '*.cpx', named_action('sub_subtree'))
+        self.generator.register_action('src/sub/deep', '*.cpx', named_action('deep'))
+
+        self.assertEqual(self.actions(), {'other': 'tree', 'src': 'src_subtree', 'src/sub': 'sub_subtree',
+                                          'src/sub/deep': 'deep'})
+
+    def test_incompatible_pattern_falls_back(self):
+        self.generator.register_action('src/**', '*.cpx', named_action('subtree'))
+        self.generator.register_action('src/sub', '*.cpy', named_action('python'))
+        self.generator.register_default_action('*.cpx', named_action('default'))
+
+        self.assertEqual(self.actions(), {'src': 'subtree', 'src/sub': 'subtree', 'src/sub/deep': 'subtree',
+                                          'other': 'default'})
+
+    def test_actions_registered_between_runs(self):
+        self.generator.register_action('src/**', '*.cpx', named_action('subtree'))
+        self.assertEqual(self.actions()['src/sub'], 'subtree')
+
+        self.generator.register_action('src/sub', '*.cpx', named_action('sub'))
+        self.assertEqual(self.actions()['src/sub'], 'sub')
+
+    def test_missing_directory(self):
+        self.assertRaises(RuntimeError, self.generator.register_action, 'missing/**', '*.cpx', named_action('missing'))
+
+    def test_concurrent_registrations(self):
+        names = ['a_%d_%d' % (thread_index, index) for thread_index in range(4) for index in range(25)]
+        for name in names:
+            self.write_file(os.path.join('src', 'sub', name + '.cpx'), '@action@')
+
+        def register_actions(thread_index):
+            for name in names[thread_index * 25:(thread_index + 1) * 25]:
+                self.generator.register_action('src/sub', name + '.cpx', named_action(name))
+
+        threads = [threading.Thread(target=register_actions, args=(thread_index,)) for thread_index in range(4)]
+        check_interval = sys.getcheckinterval()
+        # switch threads as often as possible
+        sys.setcheckinterval(1)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(check_interval)
+
+        output_index = self.generator.build_output_index('src/sub', 'a_*.cpx', recursively=False)
+        self.assertEqual(sorted(output_index.get_entry(filename).context['action']
+                                for filename in output_index.generated_filenames_list()), sorted(names))
@@ -0,0 +1,97 @@
+import os
+
+from cygenja.batch import BatchGenerator
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+
+def shout(value):
+    return value.upper()
+
+
+def whisper(value):
+    return value.lower()
+
+
+@requires_python2
+class BatchGeneratorTest(GeneratorTestCase):
+    def setUp(self):
+        super(BatchGeneratorTest, self).setUp()
+        for root in ('a', 'b'):
+            self.write_file(os.path.join(root, 'src', 't.cpx'), '%s @type|shout@' % root)
+        self.logger, self.messages = self.create_logger()
+
+    def create_batch(self, **options):
+        batch = BatchGenerator(logger=self.logger, **options)
+        self.addCleanup(batch.close)
+        for root in ('a', 'b'):
+            generator = batch.add_root(self.path(root))
+            generator.register_extension('.cpx', '.pyx')
+            generator.register_action('src', '*.cpx', type_outputs(['int32', 'int64']))
+        return batch
+
+    def test_all_roots_generated(self):
+        batch = self.create_batch(raise_exception_on_warning=True)
+        batch.register_filter('shout', shout)
+        batch.generate('.', '*.cpx', recursively=True, workers=3)
+
+        self.assertEqual(self.read_file('a/src/t_int32.pyx'), 'a INT32')
+        self.assertEqual(self.read_file('b/src/t_int64.pyx'), 'b INT64')
+        self.assertEqual(batch.last_run_statistics().jobs, 4)
+        # every generator uses the environment of the batch
+        self.assertEqual(set(id(generator.jinja2_environment()) for generator in batch.generators()),
+                         set([id(batch.jinja2_environment())]))
+
+        batch.generate('.', '*.cpx', action_ch='c', recursively=True)
+        self.assertFalse(os.path.exists(self.path('a', 'src', 't_int32.pyx')))
+
+    def test_filter_registered_after_environment_creation(self):
+        batch = self.create_batch(raise_exception_on_warning=True)
+        batch.jinja2_environment()
+        batch.register_filter('shout', shout)
+        batch.generate('.', '*.cpx', recursively=True)
+
+        self.assertEqual(self.read_file('b/src/t_int32.pyx'), 'b INT32')
+
+    def test_batch_filter_conflicting_with_root_filter(self):
+        batch = self.create_batch()
+        batch.generators()[0].register_filter('shout', whisper)
+        batch.generators()[0].jinja2_environment()
+
+        self.assertRaises(RuntimeError, batch.register_filter, 'shout', shout)
+        self.assertIn('Filter shout of a root conflicts with the filter of the batch.', self.messages)
+
+    def test_root_filter_conflicting_with_batch_filter(self):
+        batch = self.create_batch()
+        batch.register_filter('shout', shout)
+        generator = batch.generators()[0]
+        generator.register_filter('shout', whisper)
+
+        # checked when the environment is installed in the generator
+        self.assertRaises(RuntimeError, generator.jinja2_environment)
+
+        # checked immediately once the environment is installed, even for a forced filter
+        generator = batch.generators()[1]
+        generator.jinja2_environment()
+        self.assertRaises(RuntimeError, generator.register_filter, 'shout', whisper, force=True)
+        # the same filter is not a conflict
+        generator.register_filter('shout', shout)
+
+    def test_conflicting_batch_filters(self):
+        batch = self.create_batch()
+        batch.register_filter('shout', shout)
+        batch.register_filter('shout', shout)
+
+        self.assertRaises(RuntimeError, batch.register_filter, 'shout', whisper)
+        batch.register_filter('shout', whisper, force=True)
+        self.assertIs(batch.jinja2_environment().filters['shout'], whisper)
+
+    def test_root_filter(self):
+        batch = self.create_batch(raise_exception_on_warning=True)
+        batch.register_filter('shout', shout)
+        batch.generators()[1].register_filter('whisper', whisper)
+        self.write_file('b/src/t.cpx', 'b @type|whisper@')
+        batch.generate('.', '*.cpx', recursively=True)
+
+        self.assertEqual(self.read_file('a/src/t_int32.pyx'), 'a INT32')
+        self.assertEqual(self.read_file('b/src/t_int32.pyx'), 'b int32')
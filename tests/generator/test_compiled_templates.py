@@ -0,0 +1,80 @@
+import json
+import os
+
+from cygenja.compiled_templates import CompiledTemplateLoader, read_manifest, template_hash
+from cygenja.generator import COMPILED_TEMPLATES_ARCHIVE, COMPILED_TEMPLATES_MANIFEST
+from cygenja.jinja2_environment import create_environment
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output
+
+
+@requires_python2
+class CompiledTemplatesTest(GeneratorTestCase):
+    def setUp(self):
+        super(CompiledTemplatesTest, self).setUp()
+        self.write_file('src/a.cpx', '{% include "include/b.cpx" %} @name@', mtime=1000000000)
+        self.write_file('include/b.cpx', 'b', mtime=1000000000)
+
+    def create_generator(self, **options):
+        generator = super(CompiledTemplatesTest, self).create_generator(**options)
+        generator.register_action('src', '*.cpx', single_output({'name': 'a'}))
+        return generator
+
+    def manifest_filename(self):
+        return os.path.join(self.root_directory, '.cygenja', COMPILED_TEMPLATES_MANIFEST)
+
+    def test_compile_and_use(self):
+        self.assertEqual(self.create_generator().compile_templates(), 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.root_directory, '.cygenja', COMPILED_TEMPLATES_ARCHIVE)))
+        self.assertEqual(read_manifest(self.manifest_filename()),
+                         {self.path('src', 'a.cpx'): template_hash(u'{% include "include/b.cpx" %} @name@'),
+                          'include/b.cpx': template_hash(u'b')})
+
+        generator = self.create_generator()
+        self.assertTrue(generator.use_compiled_templates())
+        generator.generate('src', '*.cpx')
+
+        self.assertEqual(self.read_file('src/a.pyx'), 'b a')
+        loader = generator.jinja2_environment().loader
+        self.assertIsInstance(loader, CompiledTemplateLoader)
+        self.assertEqual(loader.stale_template_names(), [])
+
+    def test_loader_installed_when_environment_created(self):
+        self.create_generator().compile_templates()
+        created = list()
+
+        def jinja2_environment():
+            created.append(True)
+            return create_environment()
+
+        generator = self.create_generator(jinja2_environment=jinja2_environment)
+        self.assertTrue(generator.use_compiled_templates())
+        self.assertEqual(created, [])
+
+        self.assertIsInstance(generator.jinja2_environment().loader, CompiledTemplateLoader)
+        self.assertEqual(created, [True])
+
+    def test_changed_template_recompiled(self):
+        self.create_generator().compile_templates()
+        self.write_file('include/b.cpx', 'changed b', mtime=1000000000)
+
+        generator = self.create_generator()
+        generator.use_compiled_templates()
+        generator.generate('src', '*.cpx')
+
+        self.assertEqual(self.read_file('src/a.pyx'), 'changed b a')
+        # the archive is rebuilt at the end of the run
+        self.assertEqual(read_manifest(self.manifest_filename())['include/b.cpx'], template_hash(u'changed b'))
+
+    def test_no_archive(self):
+        self.assertFalse(self.create_generator().use_compiled_templates())
+
+    def test_archive_of_other_versions_ignored(self):
+        self.create_generator().compile_templates()
+        with open(self.manifest_filename(), 'r') as f:
+            manifest = json.load(f)
+        manifest['versions']['jinja2'] = '0.0'
+        with open(self.manifest_filename(), 'w') as f:
+            json.dump(manifest, f)
+
+        self.assertFalse(self.create_generator().use_compiled_templates())
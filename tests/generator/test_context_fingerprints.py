@@ -0,0 +1,129 @@
+import os
+import unittest
+
+from cygenja.context_fingerprints import ContextFingerprints, TemplateVariablesCache, context_fingerprint
+from cygenja.jinja2_environment import create_environment
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output, type_outputs
+
+
+class ContextFingerprintTest(unittest.TestCase):
+    def test_only_used_keys(self):
+        fingerprint = context_fingerprint({'type': 'INT32', 'unused': 1}, ['type', 'missing'])
+
+        self.assertEqual(context_fingerprint({'type': 'INT32', 'unused': 2}, ['type', 'missing']), fingerprint)
+        self.assertNotEqual(context_fingerprint({'type': 'INT64', 'unused': 1}, ['type', 'missing']), fingerprint)
+
+    def test_stable_representations(self):
+        context = {'function': os.path.join, 'types': set(['INT64', 'INT32'])}
+
+        self.assertEqual(context_fingerprint(context, ['function', 'types']),
+                         context_fingerprint(dict(context), ['types', 'function']))
+
+    def test_unstable_representations(self):
+        class Type(object):
+            pass
+
+        with self.assertRaises(TypeError) as raised:
+            context_fingerprint({'type': Type(), 'name': 'a'}, ['name', 'type'])
+        self.assertIn("Key 'type' of the context can't be fingerprinted", str(raised.exception))
+        self.assertRaises(TypeError, context_fingerprint, {'types': set([Type()])}, ['types'])
+
+
+class TemplateVariablesCacheTest(GeneratorTestCase):
+    def setUp(self):
+        super(TemplateVariablesCacheTest, self).setUp()
+        self.template_filename = self.write_file('src/a.cpx', '@name@{% include "include/b.cpx" %}')
+        self.write_file('include/b.cpx', '{% set local = 1 %}@type@@local@')
+        self.parsed = list()
+
+    def environment_factory(self):
+        self.parsed.append(True)
+        return create_environment()
+
+    def create_cache(self):
+        return TemplateVariablesCache(self.path('variables.json'), [self.root_directory])
+
+    def test_variables_of_included_templates(self):
+        cache = self.create_cache()
+
+        self.assertEqual(cache.variables(self.environment_factory, self.template_filename),
+                         frozenset(['name', 'type']))
+
+    def test_parsed_once_per_content(self):
+        cache = self.create_cache()
+        cache.variables(self.environment_factory, self.template_filename)
+        cache.save()
+        self.assertEqual(len(self.parsed), 2)
+
+        cache = self.create_cache()
+        cache.variables(self.environment_factory, self.template_filename)
+        self.assertEqual(len(self.parsed), 2)
+
+        self.write_file('include/b.cpx', '@size@')
+        cache.start_run()
+        self.assertEqual(cache.variables(self.environment_factory, self.template_filename),
+                         frozenset(['name', 'size']))
+        self.assertEqual(len(self.parsed), 3)
+
+
+class ContextFingerprintsTest(GeneratorTestCase):
+    def test_saved_fingerprints(self):
+        fingerprints = ContextFingerprints(self.path('fingerprints.json'))
+        fingerprints.set_fingerprint('/a.pyx', 'abc')
+        fingerprints.set_fingerprint('/b.pyx', 'def')
+        fingerprints.remove_fingerprint('/b.pyx')
+        fingerprints.save()
+
+        fingerprints = ContextFingerprints(self.path('fingerprints.json'))
+        self.assertEqual(fingerprints.get_fingerprint('/a.pyx'), 'abc')
+        self.assertIsNone(fingerprints.get_fingerprint('/b.pyx'))
+
+
+@requires_python2
+class CheckContextsTest(GeneratorTestCase):
+    def setUp(self):
+        super(CheckContextsTest, self).setUp()
+        self.write_file('src/a.cpx', 'a @type@', mtime=1000000000)
+        self.context = {'type': 'INT32', 'unused': 1}
+
+    def generate(self, check_contexts=True):
+        generator = self.create_generator(check_contexts=check_contexts)
+        generator.register_action('src', 'a.cpx', single_output(self.context))
+        generator.generate('src', '*.cpx')
+        return generator.written_files()
+
+    def test_regenerated_if_used_variable_changed(self):
+        self.assertEqual(self.generate(), [self.path('src', 'a.pyx')])
+
+        self.context['unused'] = 2
+        self.assertEqual(self.generate(), [])
+
+        self.context['type'] = 'INT64'
+        self.assertEqual(self.generate(), [self.path('src', 'a.pyx')])
+        self.assertEqual(self.read_file('src/a.pyx'), 'a INT64')
+
+    def test_contexts_not_checked_by_default(self):
+        self.generate(check_contexts=False)
+        self.context['type'] = 'INT64'
+
+        self.assertEqual(self.generate(check_contexts=False), [])
+
+    def test_object_without_stable_representation(self):
+        self.write_file('src/b.cpx', 'b @type@ @value is none@', mtime=1000000000)
+
+        def generate():
+            logger, messages = self.create_logger()
+            generator = self.create_generator(check_contexts=True, raise_exception_on_warning=False, logger=logger)
+            generator.register_action('src', 'b.cpx', type_outputs(['INT32', 'INT64'], value=object()))
+            generator.generate('src', '*.cpx')
+            return generator.written_files(), messages
+
+        written_files, messages = generate()
+        self.assertEqual(len(written_files), 2)
+        self.assertEqual(messages.count("Context of template '%s' not checked: Key 'value' of the context can't be "
+                                        "fingerprinted: Object of type object has no stable representation"
+                                        % self.path('src', 'b.cpx')), 1)
+
+        # only the modification times are tested
+        self.assertEqual(generate()[0], [])
@@ -0,0 +1,110 @@
+import os
+import unittest
+
+from cygenja.helpers.dependency_helpers import DependencyGraph
+from cygenja.helpers.template_analysis import find_template_dependencies
+from cygenja.jinja2_environment import create_environment
+
+from tests.generator import generator_test_case
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output, type_outputs
+
+# module of the action functions of the tests
+ACTION_MODULE = os.path.splitext(os.path.abspath(generator_test_case.__file__))[0] + '.py'
+
+
+class DependencyGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph('/root')
+        self.graph.add_output('/root/src/a_1.pyx', '/root/src/a.cpx', ['/root/include/part.cpx'])
+        self.graph.add_output('/root/src/a_2.pyx', '/root/src/a.cpx', ['/root/include/part.cpx', '/root/actions.py'])
+        self.graph.add_output('/root/my dir/b.pyx', '/root/my dir/b.cpx', [])
+
+    def test_entries(self):
+        self.assertEqual(list(self.graph.generate_entries()),
+                         [('/root/src/a.cpx', ['/root/src/a_1.pyx', '/root/src/a_2.pyx'],
+                           ['/root/include/part.cpx', '/root/actions.py']),
+                          ('/root/my dir/b.cpx', ['/root/my dir/b.pyx'], [])])
+        self.assertFalse(self.graph.is_empty())
+        self.assertTrue(DependencyGraph('/root').is_empty())
+
+    def test_make_depfile(self):
+        self.assertEqual(self.graph.to_make_depfile(),
+                         '/root/src/a_1.pyx: /root/src/a.cpx /root/include/part.cpx /root/actions.py\n'
+                         '/root/src/a_2.pyx: /root/src/a.cpx /root/include/part.cpx /root/actions.py\n'
+                         '/root/my\\ dir/b.pyx: /root/my\\ dir/b.cpx\n')
+
+    def test_ninja(self):
+        lines = self.graph.to_ninja().splitlines()
+
+        self.assertIn('rule cygenja', lines)
+        self.assertIn('build /root/src/a_1.pyx /root/src/a_2.pyx: cygenja /root/src/a.cpx | '
+                      '/root/include/part.cpx /root/actions.py', lines)
+        self.assertIn('build /root/my$ dir/b.pyx: cygenja /root/my$ dir/b.cpx', lines)
+        self.assertIn('  dir_pattern = src', lines)
+        self.assertIn('  file_pattern = a.cpx', lines)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, self.graph.write, os.devnull, 'scons')
+
+    def test_special_characters(self):
+        graph = DependencyGraph('/root')
+        graph.add_output('/root/a:b/c$d.pyx', '/root/a:b/c$d e.cpx', ['/root/#part.cpx'])
+
+        self.assertEqual(graph.to_make_depfile(), '/root/a\\:b/c$$d.pyx: /root/a\\:b/c$$d\\ e.cpx /root/\\#part.cpx\n')
+        lines = graph.to_ninja().splitlines()
+        self.assertIn('build /root/a$:b/c$$d.pyx: cygenja /root/a$:b/c$$d$ e.cpx | /root/#part.cpx', lines)
+        # quoted for the shell, escaped for Ninja
+        self.assertIn("  dir_pattern = a$:b", lines)
+        self.assertIn("  file_pattern = 'c$$d$ e.cpx'", lines)
+
+
+class TemplateDependenciesTest(GeneratorTestCase):
+    def test_recursive_dependencies(self):
+        template_filename = self.write_file('src/a.cpx', '{% include "include/b.cpx" %}{% include name %}')
+        self.write_file('include/b.cpx', '{% extends "include/c.cpx" %}')
+        self.write_file('include/c.cpx', 'c')
+
+        environment = create_environment()
+        cache = dict()
+        dependencies = find_template_dependencies(environment, template_filename, self.root_directory, cache)
+
+        # dynamic names are ignored
+        self.assertEqual(dependencies, [self.path('include', 'b.cpx'), self.path('include', 'c.cpx')])
+        self.assertIs(cache[template_filename], dependencies)
+
+
+@requires_python2
+class DepfileTest(GeneratorTestCase):
+    def setUp(self):
+        super(DepfileTest, self).setUp()
+        self.write_file('src/a.cpx', '{% include "include/b.cpx" %}')
+        self.write_file('include/b.cpx', 'b')
+
+    def test_make_depfile(self):
+        generator = self.create_generator()
+        generator.register_action('src', 'a.cpx', type_outputs(['INT32', 'INT64']))
+        depfile = self.path('cygenja.d')
+        generator.generate('src', '*.cpx', depfile=depfile)
+
+        prerequisites = '%s %s %s' % (self.path('src', 'a.cpx'), self.path('include', 'b.cpx'), ACTION_MODULE)
+        self.assertEqual(self.read_file('cygenja.d'),
+                         '%s: %s\n%s: %s\n' % (self.path('src', 'a_INT32.pyx'), prerequisites,
+                                               self.path('src', 'a_INT64.pyx'), prerequisites))
+
+    def test_dry_run_depfile_in_ninja_format(self):
+        generator = self.create_generator()
+        generator.register_action('src', 'a.cpx', single_output())
+        depfile = self.path('cygenja.ninja')
+        generator.generate('src', '*.cpx', action_ch='d', depfile=depfile, depfile_format='ninja')
+
+        self.assertFalse(os.path.exists(self.path('src', 'a.pyx')))
+        self.assertIn('build %s: cygenja %s | %s' % (self.path('src', 'a.pyx'), self.path('src', 'a.cpx'),
+                                                     self.path('include', 'b.cpx')),
+                      self.read_file('cygenja.ninja'))
+
+    def test_unknown_format(self):
+        generator = self.create_generator()
+        generator.register_action('src', 'a.cpx', single_output())
+
+        self.assertRaises(RuntimeError, generator.generate, 'src', '*.cpx', depfile=self.path('deps'),
+                          depfile_format='scons')
@@ -0,0 +1,223 @@
+import os
+import sys
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from cygenja.generator import LISTINGS_FILENAME, STATE_DIRECTORY_NAME
+from cygenja.helpers.filesystem_snapshot import DirectoryListingCache, FileSystemSnapshot
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output
+
+
+class FileSystemSnapshotTest(GeneratorTestCase):
+    def setUp(self):
+        super(FileSystemSnapshotTest, self).setUp()
+        self.write_file('a.cpx', 'a')
+        self.write_file('b.txt', 'b')
+        self.write_file('sub/c.cpx', 'c')
+        self.write_file('sub/deeper/d.cpx', 'd')
+
+    def test_find_files(self):
+        snapshot = FileSystemSnapshot()
+
+        self.assertEqual(sorted(snapshot.find_files(self.root_directory, '*.cpx')),
+                         [(self.root_directory, 'a.cpx'),
+                          (self.path('sub'), 'c.cpx'),
+                          (self.path('sub', 'deeper'), 'd.cpx')])
+        self.assertEqual(list(snapshot.find_files(self.root_directory, '*.cpx', recursively=False)),
+                         [(self.root_directory, 'a.cpx')])
+
+    def test_symbolic_links_to_directories_not_followed(self):
+        os.symlink(self.path('sub'), self.path('link'))
+        snapshot = FileSystemSnapshot()
+
+        self.assertTrue(snapshot.is_dir(self.path('link')))
+        self.assertEqual(len(list(snapshot.find_files(self.root_directory, 'c.cpx'))), 1)
+
+    def test_existence(self):
+        snapshot = FileSystemSnapshot()
+
+        self.assertTrue(snapshot.is_file(self.path('a.cpx')))
+        self.assertFalse(snapshot.is_file(self.path('sub')))
+        self.assertTrue(snapshot.is_dir(self.path('sub')))
+        self.assertFalse(snapshot.is_dir(self.path('missing')))
+        self.assertFalse(snapshot.is_file(self.path('missing', 'e.cpx')))
+        self.assertEqual(snapshot.list_directory(self.path('sub')), (['deeper'], ['c.cpx']))
+        self.assertIsNone(snapshot.list_directory(self.path('a.cpx')))
+
+    def test_changes_not_seen_after_first_look(self):
+        snapshot = FileSystemSnapshot()
+        self.assertFalse(snapshot.is_file(self.path('e.cpx')))
+        mtime_ns = snapshot.mtime_ns(self.path('a.cpx'))
+
+        self.write_file('e.cpx', 'e')
+        self.write_file('a.cpx', 'changed', mtime=1000000000)
+
+        self.assertFalse(snapshot.is_file(self.path('e.cpx')))
+        self.assertEqual(snapshot.mtime_ns(self.path('a.cpx')), mtime_ns)
+        self.assertEqual(FileSystemSnapshot().mtime_ns(self.path('a.cpx')), 1000000000 * 1000000000)
+
+    def test_record_written_and_removed_files(self):
+        snapshot = FileSystemSnapshot()
+        self.assertIsNone(snapshot.stat(self.path('a.pyx')))
+
+        self.write_file('a.pyx', 'a')
+        snapshot.record_written_file(self.path('a.pyx'))
+        self.assertTrue(snapshot.is_file(self.path('a.pyx')))
+        self.assertIsNotNone(snapshot.stat(self.path('a.pyx')))
+
+        os.remove(self.path('a.pyx'))
+        snapshot.record_removed_file(self.path('a.pyx'))
+        self.assertFalse(snapshot.is_file(self.path('a.pyx')))
+        self.assertIsNone(snapshot.stat(self.path('a.pyx')))
+
+
+class DirectoryListingCacheTest(GeneratorTestCase):
+    def setUp(self):
+        super(DirectoryListingCacheTest, self).setUp()
+        self.write_file('sub/a.cpx', 'a')
+        self.write_file('sub/deeper/b.cpx', 'b')
+        self.cache_filename = self.path('listings.json')
+        # listings of directories changed in the last seconds are not cached
+        for directory in ('sub', 'sub/deeper'):
+            self.set_mtime(directory, 1000000000)
+
+    def list_directory(self, relative_directory):
+        """
+        List a directory with a new cache loaded from the cache file and save the cache.
+
+        Returns:
+            The listing and the cache.
+        """
+        cache = DirectoryListingCache(self.cache_filename, self.path('sub'))
+        listing = FileSystemSnapshot(cache).list_directory(self.path(relative_directory))
+        cache.save()
+        return listing, cache
+
+    def test_covers(self):
+        cache = DirectoryListingCache(self.cache_filename, self.path('sub'))
+
+        self.assertTrue(cache.covers(self.path('sub')))
+        self.assertTrue(cache.covers(self.path('sub', 'deeper')))
+        self.assertFalse(cache.covers(self.path('subdirectory')))
+        self.assertFalse(cache.covers(self.root_directory))
+
+    def test_listing_reused(self):
+        listing, cache = self.list_directory('sub')
+        self.assertEqual(listing, (['deeper'], ['a.cpx']))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        listing, cache = self.list_directory('sub')
+        self.assertEqual(listing, (['deeper'], ['a.cpx']))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_listing_invalidated_by_directory_change(self):
+        self.list_directory('sub')
+        self.write_file('sub/c.cpx', 'c')
+        self.set_mtime('sub', 1000000100)
+
+        listing, cache = self.list_directory('sub')
+        self.assertEqual(sorted(listing[1]), ['a.cpx', 'c.cpx'])
+        self.assertEqual(cache.misses, 1)
+
+    def test_recently_changed_directory_not_cached(self):
+        self.write_file('sub/c.cpx', 'c')
+        self.list_directory('sub')
+
+        _, cache = self.list_directory('sub')
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_removed_directory_forgotten(self):
+        self.list_directory('sub/deeper')
+        os.remove(self.path('sub', 'deeper', 'b.cpx'))
+        os.rmdir(self.path('sub', 'deeper'))
+
+        listing, _ = self.list_directory('sub/deeper')
+        self.assertIsNone(listing)
+        self.assertEqual(self.list_directory('sub/deeper')[1].misses, 0)
+
+    def test_directories_outside_root_not_cached(self):
+        self.write_file('other/d.cpx', 'd')
+        self.set_mtime('other', 1000000000)
+        self.list_directory('other')
+
+        self.assertFalse(os.path.exists(self.cache_filename))
+
+
+@requires_python2
+class GeneratorListingCacheTest(GeneratorTestCase):
+    def setUp(self):
+        super(GeneratorListingCacheTest, self).setUp()
+        self.write_file('src/a.cpx', 'a', mtime=1000000000)
+        # old enough for their listings to be cached
+        self.set_mtime('src', 1000000000)
+        self.set_mtime('.', 1000000000)
+
+    def generate(self, action_ch):
+        generator = self.create_generator()
+        generator.register_action('src', '*.cpx', single_output())
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            generator.generate('src', '*.cpx', action_ch=action_ch)
+        finally:
+            sys.stdout = stdout
+
+    def tree(self):
+        """
+        Return the sorted list of the ``(relative_path, mtime)`` of the directories and files of the temporary tree.
+
+        """
+        tree = list()
+        for directory, dirnames, filenames in os.walk(self.root_directory):
+            for name in dirnames + filenames:
+                path = os.path.join(directory, name)
+                tree.append((os.path.relpath(path, self.root_directory), os.path.getmtime(path)))
+        return sorted(tree)
+
+    def test_listings_saved_by_generation(self):
+        self.generate('g')
+
+        self.assertTrue(os.path.isfile(self.path(STATE_DIRECTORY_NAME, LISTINGS_FILENAME)))
+
+    def test_dry_run_leaves_tree_unchanged(self):
+        tree = self.tree()
+        self.generate('d')
+
+        self.assertEqual(self.tree(), tree)
+
+    def test_clean_run_writes_no_state(self):
+        self.generate('c')
+
+        self.assertFalse(os.path.exists(self.path(STATE_DIRECTORY_NAME)))
+
+
+@requires_python2
+class UpToDateTest(GeneratorTestCase):
+    def test_only_outdated_files_generated(self):
+        self.write_file('a.cpx', 'a', mtime=1000000000)
+        self.write_file('b.cpx', 'b', mtime=1000000000)
+
+        generator = self.create_generator()
+        generator.register_default_action('*.cpx', single_output())
+        generator.generate('.', '*.cpx')
+        self.assertEqual(sorted(generator.written_files()), [self.path('a.pyx'), self.path('b.pyx')])
+
+        generator.generate('.', '*.cpx')
+        self.assertEqual(generator.written_files(), [])
+
+        # within the tolerance of one second, the generated file is up to date
+        self.set_mtime('a.pyx', 1000000000)
+        self.set_mtime('b.pyx', 1000000000)
+        self.write_file('a.cpx', 'a2', mtime=1000000002)
+        self.write_file('b.cpx', 'b2', mtime=1000000001)
+        generator.generate('.', '*.cpx')
+        self.assertEqual(generator.written_files(), [self.path('a.pyx')])
+        self.assertEqual(self.read_file('a.pyx'), 'a2')
+
+        generator.generate('.', '*.cpx', force=True)
+        self.assertEqual(len(generator.written_files()), 2)
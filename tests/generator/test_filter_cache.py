@@ -0,0 +1,67 @@
+import unittest
+
+from cygenja.filter_cache import _lru_cache, memoize_filter, prime_filter
+
+
+class LRUCacheTestMixin(object):
+    """
+    Tests of a memoized filter, created by :meth:`memoize`.
+
+    """
+    def setUp(self):
+        self.calls = list()
+
+    def shout(self, value, suffix=''):
+        self.calls.append(value)
+        return value.upper() + suffix
+
+    def test_results_cached(self):
+        memoized_filter = self.memoize(self.shout, 4)
+
+        self.assertEqual([memoized_filter(value) for value in 'abab'], ['A', 'B', 'A', 'B'])
+        self.assertEqual(memoized_filter('a', suffix='!'), 'A!')
+        self.assertEqual(self.calls, ['a', 'b', 'a'])
+        self.assertEqual(tuple(memoized_filter.cache_info()), (2, 3, 4, 3))
+
+        memoized_filter.cache_clear()
+        self.assertEqual(tuple(memoized_filter.cache_info()), (0, 0, 4, 0))
+
+    def test_least_recently_used_evicted(self):
+        memoized_filter = self.memoize(self.shout, 2)
+        memoized_filter('a')
+        memoized_filter('b')
+        # 'a' is used again: 'b' is the least recently used entry
+        memoized_filter('a')
+        memoized_filter('c')
+        del self.calls[:]
+
+        memoized_filter('a')
+        self.assertEqual(self.calls, [])
+        memoized_filter('b')
+        self.assertEqual(self.calls, ['b'])
+
+    def test_prime(self):
+        memoized_filter = self.memoize(self.shout, 8)
+        prime_filter(memoized_filter, ['a', ['unhashable'], 'b'])
+        del self.calls[:]
+
+        self.assertEqual(memoized_filter('b'), 'B')
+        self.assertEqual(self.calls, [])
+
+
+class MemoizeFilterTest(LRUCacheTestMixin, unittest.TestCase):
+    @staticmethod
+    def memoize(filter_ref, maxsize):
+        return memoize_filter(filter_ref, maxsize)
+
+
+class FallbackLRUCacheTest(LRUCacheTestMixin, unittest.TestCase):
+    @staticmethod
+    def memoize(filter_ref, maxsize):
+        return _lru_cache(filter_ref, maxsize)
+
+    def test_wrapper(self):
+        memoized_filter = self.memoize(self.shout, 2)
+
+        self.assertEqual(memoized_filter.__wrapped__, self.shout)
+        self.assertEqual(memoized_filter.__name__, 'shout')
@@ -0,0 +1,70 @@
+from cygenja.filter_profile import FilterProfile
+from cygenja.jinja2_environment import create_environment
+from cygenja.pipeline import GenerationJob, rendered_template_filename, run_jobs
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+
+def shout(value):
+    """Shout a value."""
+    return value.upper()
+
+
+class FilterProfileTest(GeneratorTestCase):
+    def setUp(self):
+        super(FilterProfileTest, self).setUp()
+        self.profile = FilterProfile()
+        self.environment = create_environment()
+        self.environment.loader.add_search_directory(self.root_directory)
+        self.environment.filters['shout'] = self.profile.wrap('shout', shout)
+
+    def render(self, template_filenames, workers=1):
+        jobs = [GenerationJob(template_filename, {'name': 'a'}, [template_filename + '.pyx'])
+                for template_filename in template_filenames]
+        run_jobs(jobs, self.environment, lambda job, code: None, workers=workers)
+
+    def test_wrapped_filter(self):
+        profiled_filter = self.environment.filters['shout']
+
+        self.assertEqual(profiled_filter('a'), 'A')
+        self.assertIs(profiled_filter.__wrapped__, shout)
+        self.assertEqual((profiled_filter.__name__, profiled_filter.__doc__), ('shout', 'Shout a value.'))
+        # outside any rendering
+        self.assertIsNone(rendered_template_filename())
+        self.assertEqual(self.profile.template_counts()['shout'][None][0], 1)
+
+        self.profile.reset()
+        self.assertEqual(self.profile.counts(), {})
+
+    def test_calls_per_template(self):
+        main_filename = self.write_file('main.cpx', '@name|shout@{% include "part.cpx" %}')
+        part_filename = self.write_file('part.cpx', '@name|shout@@name|shout@')
+        self.render([main_filename, part_filename, main_filename], workers=2)
+
+        template_counts = self.profile.template_counts()['shout']
+        # calls made by included templates are counted for the template of the job
+        self.assertEqual(template_counts[main_filename][0], 6)
+        self.assertEqual(template_counts[part_filename][0], 2)
+        self.assertEqual(self.profile.counts()['shout'][0], 8)
+
+        lines = self.profile.summary_lines(self.root_directory)
+        self.assertTrue(lines[0].startswith('shout: 8 calls, '))
+        self.assertEqual(sorted(line.split(':')[0] for line in lines[1:]), ['   main.cpx', '   part.cpx'])
+        self.assertIsNone(rendered_template_filename())
+
+
+@requires_python2
+class GeneratorFilterProfileTest(GeneratorTestCase):
+    def test_profiled_generation(self):
+        self.write_file('src/a.cpx', '@type|shout@')
+        generator = self.create_generator(profile_filters=True)
+        generator.register_filter('shout', shout)
+        generator.register_action('src', 'a.cpx', type_outputs(['int32', 'int64']))
+        generator.generate('src', '*.cpx')
+
+        self.assertEqual(self.read_file('src/a_int32.pyx'), 'INT32')
+        self.assertEqual(generator.filter_profile().template_counts()['shout'][self.path('src', 'a.cpx')][0], 2)
+
+        # the profile is reset for each run
+        generator.generate('src', '*.cpx', force=True)
+        self.assertEqual(generator.filter_profile().counts()['shout'][0], 2)
@@ -0,0 +1,79 @@
+import jinja2
+
+from cygenja.helpers.filesystem_snapshot import FileSystemSnapshot
+from cygenja.jinja2_environment import AbsolutePathLoader, create_environment
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output
+
+
+class AbsolutePathLoaderTest(GeneratorTestCase):
+    def test_absolute_and_relative_names(self):
+        template_filename = self.write_file('src/main.cpx', '{% include "include/part.cpx" %}/@name@')
+        self.write_file('include/part.cpx', 'part')
+
+        environment = create_environment()
+        environment.loader.add_search_directory(self.root_directory)
+
+        self.assertEqual(environment.get_template(template_filename).render(name='main'), 'part/main')
+        self.assertRaises(jinja2.TemplateNotFound, environment.get_template, 'include/missing.cpx')
+        self.assertRaises(jinja2.TemplateNotFound, environment.get_template, self.path('missing.cpx'))
+
+    def test_uptodate_uses_snapshot(self):
+        template_filename = self.write_file('main.cpx', 'first', mtime=1000000000)
+
+        loader = AbsolutePathLoader()
+        environment = jinja2.Environment(loader=loader, auto_reload=True)
+
+        loader.set_file_system_snapshot(FileSystemSnapshot())
+        self.assertEqual(environment.get_template(template_filename).render(), 'first')
+
+        # the snapshot of the run already stated the template: the change is not seen during the run
+        self.write_file('main.cpx', 'second', mtime=1000000100)
+        self.assertEqual(environment.get_template(template_filename).render(), 'first')
+
+        # but it is seen by the next run
+        loader.set_file_system_snapshot(FileSystemSnapshot())
+        self.assertEqual(environment.get_template(template_filename).render(), 'second')
+
+
+class GeneratorEnvironmentTest(GeneratorTestCase):
+    def test_environment_created_lazily(self):
+        created = list()
+
+        def jinja2_environment():
+            created.append(True)
+            return create_environment()
+
+        generator = self.create_generator(jinja2_environment=jinja2_environment)
+        self.assertEqual(created, [])
+
+        environment = generator.jinja2_environment()
+        self.assertEqual(created, [True])
+        self.assertIs(generator.jinja2_environment(), environment)
+        self.assertIsInstance(environment.loader, AbsolutePathLoader)
+
+    def test_filters_installed_on_creation(self):
+        generator = self.create_generator()
+        generator.register_filter('double', lambda value: value * 2)
+
+        self.assertEqual(generator.jinja2_environment().filters['double'](2), 4)
+
+    def test_type_filters_reachable_from_generator_module(self):
+        import cygenja.generator
+
+        self.assertEqual(cygenja.generator.type2enum('INT32_t'), 'INT32_T')
+        self.assertRaises(AttributeError, getattr, cygenja.generator, 'no_such_filter')
+
+    @requires_python2
+    def test_template_changed_between_runs(self):
+        self.write_file('main.cpx', 'first', mtime=1000000000)
+
+        generator = self.create_generator()
+        generator.register_default_action('*.cpx', single_output())
+        generator.generate('.', '*.cpx')
+        self.assertEqual(self.read_file('main.pyx'), 'first')
+
+        self.set_mtime('main.pyx', 1000000000)
+        self.write_file('main.cpx', 'second', mtime=1000000100)
+        generator.generate('.', '*.cpx')
+        self.assertEqual(self.read_file('main.pyx'), 'second')
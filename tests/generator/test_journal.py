@@ -0,0 +1,116 @@
+import os
+import stat
+
+from cygenja.generator import JOURNAL_FILENAME
+from cygenja.journal import GenerationJournal
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+
+class GenerationJournalTest(GeneratorTestCase):
+    def setUp(self):
+        super(GenerationJournalTest, self).setUp()
+        self.journal_filename = self.path('journal.jsonl')
+
+    def interrupted_run(self):
+        journal = GenerationJournal(self.journal_filename)
+        journal.start()
+        journal.record('/a.pyx', 'abc')
+        journal.record('/b.pyx')
+        journal.stop(completed=False)
+
+    def test_resume(self):
+        self.interrupted_run()
+        journal = GenerationJournal(self.journal_filename)
+
+        self.assertEqual(journal.start(resume=True), 2)
+        self.assertTrue(journal.is_completed('/b.pyx'))
+        self.assertFalse(journal.is_completed('/c.pyx'))
+        self.assertEqual(journal.fingerprint('/a.pyx'), 'abc')
+
+        journal.record('/c.pyx')
+        journal.stop(completed=True)
+        self.assertFalse(os.path.exists(self.journal_filename))
+
+    def test_partial_last_line_ignored(self):
+        self.interrupted_run()
+        with open(self.journal_filename, 'a') as f:
+            f.write('{"file": "/c.p')
+
+        self.assertEqual(GenerationJournal(self.journal_filename).start(resume=True), 2)
+
+    def test_journal_discarded_without_resume(self):
+        self.interrupted_run()
+        journal = GenerationJournal(self.journal_filename)
+
+        self.assertEqual(journal.start(), 0)
+        self.assertFalse(journal.is_completed('/a.pyx'))
+
+    def test_journal_created_by_first_record(self):
+        journal = GenerationJournal(self.journal_filename)
+        journal.start()
+        self.assertFalse(os.path.exists(self.journal_filename))
+
+        journal.record('/a.pyx')
+        self.assertTrue(os.path.exists(self.journal_filename))
+        journal.stop(completed=False)
+
+        # an interrupted run writing nothing keeps the journal to be resumed
+        journal.start(resume=True)
+        journal.stop(completed=False)
+        self.assertEqual(GenerationJournal(self.journal_filename).start(resume=True), 1)
+
+
+def check_type(type_name, failing_types):
+    if type_name in failing_types:
+        raise ValueError('%s is failing' % type_name)
+    return type_name
+
+
+@requires_python2
+class ResumeTest(GeneratorTestCase):
+    def setUp(self):
+        super(ResumeTest, self).setUp()
+        self.write_file('src/a.cpx', '@type|check@', mtime=1000000000)
+        self.failing_types = set(['INT64'])
+
+    def generate(self, **options):
+        generator = self.create_generator()
+        generator.register_filter('check', lambda type_name: check_type(type_name, self.failing_types))
+        generator.register_action('src', 'a.cpx', type_outputs(['INT32', 'INT64', 'FLOAT64']))
+        generator.generate('src', '*.cpx', force=True, **options)
+        return generator.written_files()
+
+    def interrupt_generation(self):
+        self.assertRaises(ValueError, self.generate)
+        self.assertTrue(os.path.isfile(self.path('.cygenja', JOURNAL_FILENAME)))
+        self.failing_types.clear()
+
+    def test_resumed_files_not_generated_again(self):
+        self.interrupt_generation()
+
+        self.assertEqual(self.generate(resume=True), [self.path('src', 'a_INT64.pyx'), self.path('src', 'a_FLOAT64.pyx')])
+        self.assertEqual(self.read_file('src/a_INT64.pyx'), 'INT64')
+        self.assertFalse(os.path.exists(self.path('.cygenja', JOURNAL_FILENAME)))
+
+    def test_generation_not_resumed(self):
+        self.interrupt_generation()
+
+        self.assertEqual(len(self.generate()), 3)
+
+    def test_changed_template_generated_again(self):
+        self.interrupt_generation()
+        # edited after the interrupted run
+        self.set_mtime('src/a_INT32.pyx', 1000000000)
+        self.write_file('src/a.cpx', 'new @type|check@', mtime=1000000100)
+
+        self.assertEqual(len(self.generate(resume=True)), 3)
+        self.assertEqual(self.read_file('src/a_INT32.pyx'), 'new INT32')
+
+    def test_mode_of_regenerated_files_kept(self):
+        self.failing_types.clear()
+        self.generate()
+        os.chmod(self.path('src', 'a_INT32.pyx'), 0o755)
+
+        self.generate()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path('src', 'a_INT32.pyx')).st_mode), 0o755)
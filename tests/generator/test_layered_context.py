@@ -0,0 +1,112 @@
+import pickle
+import sys
+import unittest
+
+from cygenja.jinja2_environment import create_environment
+from cygenja.layered_context import MAX_CACHED_BASE_LAYERS, LayeredContext, _pickled_base_layers, \
+    _restored_base_layers, shallow_copy_context
+from cygenja.pipeline import GenerationJob, run_jobs
+
+from tests.generator.generator_test_case import GeneratorTestCase
+
+# process workers are forked
+requires_fork = unittest.skipIf(sys.platform.startswith('win'), 'process workers need fork')
+
+
+class CountedPickles(object):
+    """
+    Value counting how many times it is pickled.
+
+    """
+    pickles = 0
+
+    def __reduce__(self):
+        CountedPickles.pickles += 1
+        return CountedPickles, ()
+
+
+class LayeredContextTest(unittest.TestCase):
+    def setUp(self):
+        self.base_mapping = {'type_list': ['INT32', 'INT64'], 'type': 'base'}
+        self.base = LayeredContext(self.base_mapping)
+
+    def test_layers(self):
+        context = self.base.layer(type='INT32', index=0)
+
+        self.assertEqual(context['type'], 'INT32')
+        self.assertEqual(context['type_list'], ['INT32', 'INT64'])
+        self.assertNotIn('missing', context)
+        self.assertEqual(len(context), 3)
+        self.assertEqual(sorted(context), ['index', 'type', 'type_list'])
+        self.assertEqual(context.flatten(), {'type_list': ['INT32', 'INT64'], 'type': 'INT32', 'index': 0})
+        self.assertEqual(self.base['type'], 'base')
+
+    def test_base_copied_once(self):
+        self.base_mapping['added'] = True
+
+        self.assertNotIn('added', self.base)
+        self.assertIs(self.base.layer(index=1).base(), self.base.base())
+
+    def test_only_overlay_modified(self):
+        context = self.base.layer(type='INT32')
+        context['index'] = 2
+        del context['type']
+
+        self.assertEqual(context['type'], 'base')
+        self.assertEqual(context.overlay(), {'index': 2})
+        self.assertRaises(KeyError, context.__delitem__, 'type_list')
+        self.assertRaises(KeyError, context.__delitem__, 'missing')
+        self.assertNotIn('index', self.base)
+
+    def test_copies(self):
+        context = self.base.layer(type='INT32')
+        context_copy = shallow_copy_context(context)
+        context_copy['type'] = 'INT64'
+
+        self.assertEqual(context['type'], 'INT32')
+        self.assertIs(context_copy.base(), context.base())
+
+        flat_context = {'type': 'INT32'}
+        self.assertEqual(shallow_copy_context(flat_context), flat_context)
+        self.assertIsNot(shallow_copy_context(flat_context), flat_context)
+
+    def test_base_pickled_once(self):
+        base = LayeredContext({'value': CountedPickles()})
+        CountedPickles.pickles = 0
+        pickled_contexts = [pickle.dumps(base.layer(index=index), pickle.HIGHEST_PROTOCOL) for index in range(3)]
+
+        self.assertEqual(CountedPickles.pickles, 1)
+        contexts = [pickle.loads(pickled_context) for pickled_context in pickled_contexts]
+        # unpickled once per process
+        self.assertIs(contexts[0].base(), contexts[2].base())
+        self.assertEqual([context['index'] for context in contexts], [0, 1, 2])
+
+    def test_cached_bases_bounded(self):
+        bases = [LayeredContext({'value': index}) for index in range(MAX_CACHED_BASE_LAYERS + 4)]
+        first_context = pickle.loads(pickle.dumps(bases[0].layer(index=0)))
+        for base in bases:
+            pickle.loads(pickle.dumps(base.layer(index=1)))
+
+        self.assertEqual(len(_pickled_base_layers), MAX_CACHED_BASE_LAYERS)
+        self.assertEqual(len(_restored_base_layers), MAX_CACHED_BASE_LAYERS)
+        # the least recently used bases were dropped: they are unpickled again, with the same values
+        context = pickle.loads(pickle.dumps(bases[0].layer(index=2)))
+        self.assertIsNot(context.base(), first_context.base())
+        self.assertEqual(context.flatten(), {'value': 0, 'index': 2})
+
+
+class LayeredContextRenderingTest(GeneratorTestCase):
+    @requires_fork
+    def test_process_workers(self):
+        template_filename = self.write_file('a.cpx', '@type@ in @type_list|join(",")@')
+        base = LayeredContext({'type_list': ['INT32', 'INT64']})
+        jobs = [GenerationJob(template_filename, base.layer(type=type_name), [self.path('a_%s.pyx' % type_name)])
+                for type_name in ('INT32', 'INT64')]
+        written = dict()
+
+        def write_job(job, code):
+            written[job.generated_filenames[0]] = code
+
+        run_jobs(jobs, create_environment(), write_job, workers=2, use_processes=True)
+
+        self.assertEqual(written[self.path('a_INT64.pyx')], 'INT64 in INT32,INT64')
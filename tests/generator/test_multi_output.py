@@ -0,0 +1,67 @@
+import unittest
+
+from cygenja.helpers.multi_output_helpers import output_marker, split_outputs
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+MULTI_OUTPUT_TEMPLATE = """# header
+{% for filename_end, context in cygenja_outputs %}
+@cygenja_output(filename_end)@
+type = @context.type@
+{% endfor %}
+"""
+
+
+class SplitOutputsTest(unittest.TestCase):
+    def test_split(self):
+        rendered_code = u'preamble\n%s\nfirst\n%s\nsecond\n' % (output_marker('_a'), output_marker('_b'))
+
+        self.assertEqual(split_outputs(rendered_code), (u'preamble\n', [(u'_a', u'first\n'), (u'_b', u'second\n')]))
+
+    def test_no_region(self):
+        self.assertEqual(split_outputs(u'only preamble'), (u'only preamble', []))
+
+
+@requires_python2
+class MultiOutputTest(GeneratorTestCase):
+    def test_rendered_once_for_all_outputs(self):
+        self.write_file('src/basic.cpx', MULTI_OUTPUT_TEMPLATE, mtime=1000000000)
+
+        generator = self.create_generator()
+        generator.register_action('src', 'basic.cpx', type_outputs(['INT32', 'INT64']), multi_output=True)
+        generator.generate('src', '*.cpx')
+
+        self.assertEqual(generator.last_run_statistics().jobs, 1)
+        self.assertEqual(self.read_file('src/basic_INT32.pyx'), '# header\ntype = INT32\n')
+        self.assertEqual(self.read_file('src/basic_INT64.pyx'), '# header\ntype = INT64\n')
+
+    def test_only_outdated_outputs_written(self):
+        self.write_file('src/basic.cpx', MULTI_OUTPUT_TEMPLATE, mtime=1000000000)
+
+        generator = self.create_generator()
+        generator.register_action('src', 'basic.cpx', type_outputs(['INT32', 'INT64']), multi_output=True)
+        generator.generate('src', '*.cpx')
+
+        self.write_file('src/basic_INT64.pyx', 'old', mtime=999999000)
+        generator.generate('src', '*.cpx')
+
+        self.assertEqual(generator.written_files(), [self.path('src', 'basic_INT64.pyx')])
+        self.assertEqual(self.read_file('src/basic_INT64.pyx'), '# header\ntype = INT64\n')
+
+    def test_unknown_output(self):
+        self.write_file('src/basic.cpx', '@cygenja_output("_UNKNOWN")@\ncode\n')
+
+        generator = self.create_generator()
+        generator.register_action('src', 'basic.cpx', type_outputs(['INT32']), multi_output=True)
+
+        self.assertRaises(RuntimeError, generator.generate, 'src', '*.cpx')
+
+    def test_missing_output(self):
+        self.write_file('src/basic.cpx', '@cygenja_output("_INT32")@\ncode\n')
+
+        generator = self.create_generator()
+        generator.register_action('src', 'basic.cpx', type_outputs(['INT32', 'INT64']), multi_output=True)
+
+        # warnings raise exceptions in the tests
+        self.assertRaises(RuntimeError, generator.generate, 'src', '*.cpx')
+        self.assertEqual(self.read_file('src/basic_INT32.pyx'), 'code')
@@ -0,0 +1,67 @@
+import os
+import unittest
+
+from cygenja.output_index import OutputIndex, OutputIndexEntry
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output, type_outputs
+
+
+class OutputIndexTest(unittest.TestCase):
+    def test_entries(self):
+        output_index = OutputIndex()
+        output_index.add_entry(OutputIndexEntry('/a_1.pyx', '/a.cpx', None, '_1', {}))
+        output_index.add_entry(OutputIndexEntry('/a_2.pyx', '/a.cpx', None, '_2', {}))
+        output_index.add_entry(OutputIndexEntry('/b.pyx', '/b.cpx', None, '', {}))
+
+        self.assertEqual(len(output_index), 3)
+        self.assertIn('/a_2.pyx', output_index)
+        self.assertNotIn('/c.pyx', output_index)
+        self.assertEqual(output_index.templates_list(), ['/a.cpx', '/b.cpx'])
+        self.assertEqual([entry.filename_end for entry in output_index.template_entries('/a.cpx')], ['_1', '_2'])
+        self.assertEqual(output_index.get_entry('/c.pyx', 'default'), 'default')
+
+    def test_replaced_entry(self):
+        output_index = OutputIndex()
+        output_index.add_entry(OutputIndexEntry('/a.pyx', '/a.cpx', None, '', {}))
+        output_index.add_entry(OutputIndexEntry('/a.pyx', '/a.cpy', None, '', {}))
+
+        self.assertEqual(len(output_index), 1)
+        self.assertEqual(output_index.get_entry('/a.pyx').template_filename, '/a.cpy')
+        self.assertEqual(output_index.template_entries('/a.cpx'), [])
+
+
+@requires_python2
+class GenerateTargetsTest(GeneratorTestCase):
+    def setUp(self):
+        super(GenerateTargetsTest, self).setUp()
+        self.write_file('src/basic.cpx', 'basic @type@')
+        self.write_file('src/other.cpx', 'other')
+        self.generator = self.create_generator()
+        self.generator.register_action('src', 'basic.cpx', type_outputs(['INT32', 'INT64'], constant=1))
+        self.generator.register_action('src', 'other.cpx', single_output())
+
+    def test_build_output_index(self):
+        output_index = self.generator.build_output_index()
+
+        self.assertEqual(sorted(output_index.generated_filenames_list()),
+                         [self.path('src', name) for name in ('basic_INT32.pyx', 'basic_INT64.pyx', 'other.pyx')])
+        entry = output_index.get_entry(self.path('src', 'basic_INT64.pyx'))
+        self.assertEqual(entry.template_filename, self.path('src', 'basic.cpx'))
+        self.assertEqual(entry.filename_end, '_INT64')
+        self.assertEqual(entry.context, {'type': 'INT64', 'constant': 1})
+
+    def test_find_templates(self):
+        self.assertEqual(self.generator.find_templates(['src/basic_INT32.pyx', 'src/missing.pyx']),
+                         {self.path('src', 'basic_INT32.pyx'): self.path('src', 'basic.cpx')})
+
+    def test_only_targets_generated(self):
+        written_files = self.generator.generate_targets(['src/basic_INT64.pyx'])
+
+        self.assertEqual(written_files, [self.path('src', 'basic_INT64.pyx')])
+        self.assertEqual(self.read_file('src/basic_INT64.pyx'), 'basic INT64')
+        self.assertFalse(os.path.exists(self.path('src', 'basic_INT32.pyx')))
+        self.assertFalse(os.path.exists(self.path('src', 'other.pyx')))
+
+    def test_unknown_target(self):
+        # warnings raise exceptions in the tests
+        self.assertRaises(RuntimeError, self.generator.generate_targets, ['src/missing.pyx'])
@@ -0,0 +1,87 @@
+import sys
+import unittest
+
+from cygenja.jinja2_environment import create_environment
+from cygenja.pipeline import GenerationJob, RenderingError, RunStatistics, longest_jobs_first, run_jobs
+
+from tests.generator.generator_test_case import GeneratorTestCase
+
+# process workers are forked
+requires_fork = unittest.skipIf(sys.platform.startswith('win'), 'process workers need fork')
+
+
+class LongestJobsFirstTest(unittest.TestCase):
+    def test_order_within_window(self):
+        costs = {'a': 1, 'b': 5, 'c': 3, 'd': 5, 'e': 9}
+
+        self.assertEqual(list(longest_jobs_first('abcde', costs.get, 10)), ['e', 'b', 'd', 'c', 'a'])
+        # only 2 jobs are kept to be reordered
+        self.assertEqual(list(longest_jobs_first('abcde', costs.get, 2)), ['b', 'c', 'd', 'e', 'a'])
+
+
+class RunJobsTest(GeneratorTestCase):
+    def setUp(self):
+        super(RunJobsTest, self).setUp()
+        self.template_filename = self.write_file('basic.cpx', 'code of @index@')
+        self.environment = create_environment()
+
+    def create_jobs(self, count=20, **context):
+        for index in range(count):
+            job_context = dict(context)
+            job_context['index'] = index
+            yield GenerationJob(self.template_filename, job_context, [self.path('basic_%d.pyx' % index)])
+
+    def run_all_jobs(self, jobs, **options):
+        written = dict()
+
+        def write_job(job, code):
+            written[job.generated_filenames[0]] = code
+
+        statistics = RunStatistics()
+        run_jobs(jobs, self.environment, write_job, statistics=statistics, **options)
+        return written, statistics
+
+    def test_single_worker(self):
+        written, statistics = self.run_all_jobs(self.create_jobs())
+
+        self.assertEqual(len(written), 20)
+        self.assertEqual(written[self.path('basic_7.pyx')], 'code of 7')
+        self.assertEqual(statistics.jobs, 20)
+        self.assertEqual(statistics.max_in_flight, 1)
+
+    def test_thread_workers_same_as_single_worker(self):
+        expected, _ = self.run_all_jobs(self.create_jobs())
+        written, statistics = self.run_all_jobs(self.create_jobs(), workers=4, max_in_flight=3)
+
+        self.assertEqual(written, expected)
+        self.assertEqual(statistics.jobs, 20)
+        self.assertTrue(1 <= statistics.max_in_flight <= 3)
+
+    def test_cost_aware_scheduling_same_as_single_worker(self):
+        expected, _ = self.run_all_jobs(self.create_jobs())
+        written, _ = self.run_all_jobs(self.create_jobs(), workers=3,
+                                       job_cost=lambda job: job.context['index'] % 4)
+
+        self.assertEqual(written, expected)
+
+    @requires_fork
+    def test_process_workers_same_as_single_worker(self):
+        expected, _ = self.run_all_jobs(self.create_jobs())
+        written, statistics = self.run_all_jobs(self.create_jobs(), workers=2, use_processes=True)
+
+        self.assertEqual(written, expected)
+        self.assertEqual(statistics.jobs, 20)
+
+    def test_rendering_error(self):
+        self.write_file('broken.cpx', '@ 1 / 0 @')
+        jobs = [GenerationJob(self.path('broken.cpx'), {}, [self.path('broken.pyx')])]
+
+        self.assertRaises(ZeroDivisionError, self.run_all_jobs, list(jobs))
+        self.assertRaises(RenderingError, self.run_all_jobs, list(jobs), workers=2)
+
+    @requires_fork
+    def test_job_not_sent_to_its_worker(self):
+        # a context that doesn't pickle must fail the run, not hang it
+        jobs = self.create_jobs(count=3, unpicklable=lambda: None)
+
+        self.assertRaises(RenderingError, self.run_all_jobs, jobs, workers=2, use_processes=True)
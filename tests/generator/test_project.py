@@ -0,0 +1,133 @@
+import os
+import sys
+import unittest
+
+from cygenja.cli import main
+from cygenja.project import MatrixAction, Project, REGISTRY_CACHE_FILENAME, import_reference, parse_boolean, \
+    parse_value
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2
+
+PROJECT_FILE = """
+[cygenja]
+python_path = .
+filter_modules = cygenja_test_filters
+change_detection = %(change_detection)s
+
+[environment]
+cache_size = -1
+
+[extensions]
+.cpx = .pyx
+
+[matrix]
+index = INT32 INT64
+type = FLOAT32 FLOAT64
+
+[action:basic]
+directory = src
+pattern = basic.*
+axes = index
+"""
+
+FILTER_MODULE = """
+def shout(value):
+    return value.upper()
+"""
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_boolean(self):
+        self.assertTrue(parse_boolean('Yes'))
+        self.assertFalse(parse_boolean('off'))
+        self.assertRaises(ValueError, parse_boolean, 'maybe')
+
+    def test_parse_value(self):
+        self.assertEqual(parse_value('-1'), -1)
+        self.assertIs(parse_value('no'), False)
+        self.assertEqual(parse_value('latin-1'), 'latin-1')
+
+    def test_import_reference(self):
+        self.assertIs(import_reference('os.path:join'), os.path.join)
+        self.assertRaises(ValueError, import_reference, 'os.path')
+        self.assertRaises(ValueError, import_reference, 'os.path:no_such_function')
+
+
+class MatrixActionTest(unittest.TestCase):
+    def test_outputs(self):
+        action = MatrixAction('basic', {'index': ['INT32', 'INT64'], 'type': ['FLOAT64']}, ['index', 'type'])
+        outputs = [(filename_end, dict(context)) for filename_end, context in action()]
+
+        self.assertEqual(action.__name__, 'basic')
+        self.assertEqual([filename_end for filename_end, _ in outputs], ['_INT32_FLOAT64', '_INT64_FLOAT64'])
+        self.assertEqual(outputs[1][1], {'index': 'INT64', 'type': 'FLOAT64',
+                                         'index_list': ['INT32', 'INT64'], 'type_list': ['FLOAT64']})
+
+
+class ProjectTest(GeneratorTestCase):
+    def setUp(self):
+        super(ProjectTest, self).setUp()
+        self.write_file('src/basic.cpx', '@index|shout@ in @index_list|join(",")@')
+        self.write_file('cygenja_test_filters.py', FILTER_MODULE)
+        self.addCleanup(sys.modules.pop, 'cygenja_test_filters', None)
+        self.addCleanup(self.restore_python_path, list(sys.path))
+
+    @staticmethod
+    def restore_python_path(python_path):
+        sys.path[:] = python_path
+
+    def write_project(self, change_detection='mtime'):
+        return self.write_file('cygenja.cfg', PROJECT_FILE % {'change_detection': change_detection})
+
+    def test_options(self):
+        project = Project(self.write_project(change_detection='Hash'))
+
+        self.assertEqual(project.root_directory(), self.root_directory)
+        self.assertIsNone(project.state_directory())
+        self.assertEqual(project.change_detection(), 'hash')
+        self.assertEqual(project.environment_options(), {'cache_size': -1})
+        self.assertEqual(project.matrix(), {'index': ['INT32', 'INT64'], 'type': ['FLOAT32', 'FLOAT64']})
+
+    def test_invalid_project_files(self):
+        self.assertRaises(ValueError, Project, self.path('missing.cfg'))
+        self.assertRaises(ValueError, Project, self.write_file('empty.cfg', '[environment]\n'))
+        self.assertRaises(ValueError, Project(self.write_project(change_detection='size')).change_detection)
+
+    @requires_python2
+    def test_registry_cached(self):
+        project_filename = self.write_project()
+
+        logger, messages = self.create_logger()
+        Project(project_filename).create_generator(logger=logger)
+        self.assertNotIn('Registry loaded from cache', messages)
+        self.assertTrue(os.path.isfile(self.path('.cygenja', REGISTRY_CACHE_FILENAME)))
+
+        logger, messages = self.create_logger()
+        project = Project(project_filename)
+        project.create_generator(logger=logger).generate('src', '*.cpx')
+        self.assertIn('Registry loaded from cache', messages)
+        self.assertEqual(self.read_file('src/basic_INT64.pyx'), 'INT64 in INT32,INT64')
+        self.assertIn(self.path('cygenja_test_filters.py'), project.source_files())
+
+        # a changed project file invalidates the cache
+        with open(project_filename, 'a') as f:
+            f.write('\n[action:other]\ndirectory = src\npattern = other.*\n')
+        logger, messages = self.create_logger()
+        Project(project_filename).create_generator(logger=logger)
+        self.assertNotIn('Registry loaded from cache', messages)
+
+    @requires_python2
+    def test_command(self):
+        project_filename = self.write_project()
+
+        self.assertEqual(main(['-p', project_filename, 'dry-run']), 0)
+        self.assertFalse(os.path.exists(self.path('src', 'basic_INT32.pyx')))
+
+        self.assertEqual(main(['-p', project_filename, 'generate', 'src', '-j', '2']), 0)
+        self.assertEqual(self.read_file('src/basic_INT32.pyx'), 'INT32 in INT32,INT64')
+
+        self.assertEqual(main(['-p', project_filename, 'clean']), 0)
+        self.assertFalse(os.path.exists(self.path('src', 'basic_INT32.pyx')))
+
+    def test_command_error(self):
+        self.assertEqual(main(['-p', self.path('missing.cfg'), 'generate']), 1)
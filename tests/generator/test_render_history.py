@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import sys
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from cygenja.generator import RENDER_HISTORY_FILENAME
+from cygenja.render_history import RenderHistory, estimate_makespan
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+
+class EstimateMakespanTest(unittest.TestCase):
+    def test_longest_first_on_least_loaded_worker(self):
+        render_times = [3.0, 5.0, 3.0, 4.0, 3.0]
+
+        self.assertEqual(estimate_makespan(render_times), 18.0)
+        # 5 + 3 on one worker, 4 + 3 + 3 on the other
+        self.assertEqual(estimate_makespan(render_times, workers=2), 10.0)
+        self.assertEqual(estimate_makespan(render_times, workers=8), 5.0)
+
+
+class RenderHistoryTest(GeneratorTestCase):
+    def test_estimated_render_times(self):
+        history = RenderHistory(self.path('render_times.json'))
+        self.assertEqual(history.estimated_render_time('/a.pyx'), 0.0)
+
+        history.record('/a.pyx', 1.0)
+        history.record('/b.pyx', 3.0)
+        self.assertEqual(history.render_time('/a.pyx'), 1.0)
+        self.assertIsNone(history.render_time('/c.pyx'))
+        # the mean of the known jobs
+        self.assertEqual(history.estimated_render_time('/c.pyx'), 2.0)
+
+    def test_saved_history(self):
+        history = RenderHistory(self.path('render_times.json'))
+        history.record('/a.pyx', 1.5)
+        history.save()
+
+        self.assertEqual(RenderHistory(self.path('render_times.json')).render_time('/a.pyx'), 1.5)
+
+    def test_modified(self):
+        history = RenderHistory(self.path('render_times.json'))
+        self.assertFalse(history.is_modified())
+
+        history.record('/a.pyx', 1.5)
+        self.assertTrue(history.is_modified())
+        history.save()
+        self.assertFalse(history.is_modified())
+
+
+@requires_python2
+class GeneratorRenderHistoryTest(GeneratorTestCase):
+    def setUp(self):
+        super(GeneratorRenderHistoryTest, self).setUp()
+        self.write_file('src/a.cpx', 'a @type@')
+
+    def generate(self, action_ch='g', workers=1, **options):
+        generator = self.create_generator(**options)
+        generator.register_action('src', 'a.cpx', type_outputs(['INT32', 'INT64']))
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            generator.generate('src', '*.cpx', action_ch=action_ch, workers=workers)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_render_times_recorded(self):
+        self.generate(workers=2)
+
+        with open(self.path('.cygenja', RENDER_HISTORY_FILENAME), 'r') as f:
+            render_times = json.load(f)
+        self.assertEqual(sorted(render_times), [self.path('src', 'a_INT32.pyx'), self.path('src', 'a_INT64.pyx')])
+
+    def test_dry_run_estimate(self):
+        self.assertIn('Estimated rendering time: unknown', self.generate(action_ch='d'))
+
+        self.generate()
+        self.assertIn('with 2 workers (2 of 2 jobs rendered before)', self.generate(action_ch='d', workers=2))
+
+    def test_state_written_only_when_modified(self):
+        self.generate()
+        self.set_mtime('.cygenja/%s' % RENDER_HISTORY_FILENAME, 1000000000)
+
+        # nothing rendered: nothing to record
+        self.generate()
+        self.assertEqual(os.path.getmtime(self.path('.cygenja', RENDER_HISTORY_FILENAME)), 1000000000)
+
+        shutil.rmtree(self.path('.cygenja'))
+        self.generate(cache_listings=False)
+        self.assertFalse(os.path.exists(self.path('.cygenja')))
@@ -0,0 +1,66 @@
+import unittest
+
+from cygenja.run_report import LISTED, REMOVED, RENDERED, RunReport, UP_TO_DATE, WRITTEN
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+
+class RunReportTest(unittest.TestCase):
+    def test_counts(self):
+        events = list()
+        report = RunReport('/root', [lambda outcome, filename: events.append((outcome, filename))])
+        report.record(RENDERED, '/root/src/a.cpx')
+        report.record(WRITTEN, '/root/src/a.pyx')
+        report.record(WRITTEN, '/root/b.pyx')
+
+        self.assertEqual(events[0], (RENDERED, '/root/src/a.cpx'))
+        self.assertEqual(report.counts()[WRITTEN], 2)
+        self.assertEqual(report.directory_counts()['src'][RENDERED], 1)
+        self.assertEqual(report.summary_lines(), ['.: 1 written', 'src: 1 rendered, 1 written'])
+
+    def test_format_counts(self):
+        self.assertEqual(RunReport.format_counts({UP_TO_DATE: 3, REMOVED: 0, LISTED: 1}), '3 up to date, 1 listed')
+        self.assertEqual(RunReport.format_counts({}), '')
+
+
+@requires_python2
+class GeneratorEventsTest(GeneratorTestCase):
+    def setUp(self):
+        super(GeneratorEventsTest, self).setUp()
+        self.write_file('src/a.cpx', 'a @type@')
+        self.logger, self.messages = self.create_logger()
+        self.generator = self.create_generator(logger=self.logger)
+        self.generator.register_action('src', '*.cpx', type_outputs(['INT32', 'INT64']))
+        self.events = list()
+        self.generator.add_event_listener(lambda outcome, filename: self.events.append((outcome, filename)))
+
+    def run_generator(self, action_ch):
+        del self.events[:]
+        del self.messages[:]
+        self.generator.generate('src', '*.cpx', action_ch=action_ch)
+        return self.generator.last_run_report().counts()
+
+    def test_events_of_the_runs(self):
+        counts = self.run_generator('g')
+        self.assertEqual((counts[RENDERED], counts[WRITTEN]), (2, 2))
+        self.assertEqual(self.events[:2], [(RENDERED, self.path('src', 'a.cpx')),
+                                           (WRITTEN, self.path('src', 'a_INT32.pyx'))])
+
+        self.assertEqual(self.run_generator('g')[UP_TO_DATE], 2)
+        self.assertEqual(self.run_generator('c')[REMOVED], 2)
+        self.assertEqual(self.events, [(REMOVED, self.path('src', 'a_INT32.pyx')),
+                                       (REMOVED, self.path('src', 'a_INT64.pyx'))])
+
+    def test_summary_logged(self):
+        self.run_generator('g')
+
+        self.assertIn('   src: 2 rendered, 2 written', self.messages)
+        # no line per file
+        self.assertFalse([message for message in self.messages if 'a_INT32.pyx' in message])
+
+    def test_details_logged(self):
+        generator = self.create_generator(logger=self.logger, log_details=True)
+        generator.register_action('src', '*.cpx', type_outputs(['INT32']))
+        generator.generate('src', '*.cpx')
+
+        self.assertIn('   Generating file %s' % self.path('src', 'a_INT32.pyx'), self.messages)
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+
+from cygenja.server import GenerationServer, send_request
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2
+
+PROJECT_FILE = """
+[cygenja]
+python_path = .
+filters = cygenja_test_server_filters:divide
+
+[extensions]
+.cpx = .pyx
+
+[matrix]
+index = 1 0
+
+[action:basic]
+directory = src
+pattern = *.cpx
+axes = index
+"""
+
+FILTER_MODULE = """
+def divide(value):
+    return 1 // int(value)
+"""
+
+
+@requires_python2
+class GenerationServerTest(GeneratorTestCase):
+    def setUp(self):
+        super(GenerationServerTest, self).setUp()
+        self.write_file('src/basic.cpx', 'basic @index@')
+        self.write_file('cygenja_test_server_filters.py', FILTER_MODULE)
+        self.addCleanup(sys.modules.pop, 'cygenja_test_server_filters', None)
+        self.addCleanup(self.restore_python_path, list(sys.path))
+        self.server = GenerationServer(self.write_file('cygenja.cfg', PROJECT_FILE), socket_path=self.path('s.sock'))
+
+    @staticmethod
+    def restore_python_path(python_path):
+        sys.path[:] = python_path
+
+    def test_generate(self):
+        status = self.server.handle_request({'command': 'generate', 'dir_pattern': 'src'})
+
+        self.assertEqual(status['status'], 'ok')
+        self.assertEqual(status['counts']['written'], 2)
+        self.assertEqual(self.read_file('src/basic_0.pyx'), 'basic 0')
+
+        status = self.server.handle_request({'command': 'generate', 'targets': ['src/basic_1.pyx'], 'force': True})
+        self.assertEqual(status['counts']['written'], 1)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.server.handle_request({'command': 'ping'}), {'status': 'ok'})
+        self.assertEqual(self.server.handle_request([])['status'], 'error')
+        self.assertEqual(self.server.handle_request({'command': 'build'})['status'], 'error')
+
+    def test_failing_templates(self):
+        self.write_file('src/broken.cpx', '{% if %}')
+        status = self.server.handle_request({'command': 'generate', 'file_pattern': 'broken.cpx'})
+        self.assertEqual(status['status'], 'error')
+        self.assertIn('TemplateSyntaxError', status['message'])
+
+        self.write_file('src/failing.cpx', '@index|divide@')
+        status = self.server.handle_request({'command': 'generate', 'file_pattern': 'failing.cpx'})
+        self.assertEqual(status['status'], 'error')
+        self.assertIn('ZeroDivisionError', status['message'])
+
+        self.assertEqual(self.server.handle_request({'command': 'generate', 'file_pattern': 'basic.cpx'})['status'],
+                         'ok')
+
+    def test_server_survives_failing_requests(self):
+        self.write_file('src/broken.cpx', '{% if %}')
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join, 10)
+
+        def request(message):
+            answers = list(send_request(self.server.socket_path(), message))
+            return answers[-1]['status'], [answer['file'] for answer in answers[:-1]]
+
+        # the server might not listen yet
+        for _ in range(100):
+            if os.path.exists(self.server.socket_path()):
+                break
+            thread.join(0.05)
+        try:
+            self.assertEqual(request({'command': 'generate'})[0], 'error')
+            self.assertEqual(request([1, 2])[0], 'error')
+            status, filenames = request({'command': 'generate', 'file_pattern': 'basic.cpx'})
+            self.assertEqual(status, 'ok')
+            self.assertEqual(sorted(filenames), [self.path('src', 'basic_0.pyx'), self.path('src', 'basic_1.pyx')])
+        finally:
+            request({'command': 'shutdown'})
+        thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.server.socket_path()))
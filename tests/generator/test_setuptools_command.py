@@ -0,0 +1,80 @@
+import os
+
+from cygenja.setuptools_command import make_build_ext
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output, type_outputs
+
+
+class FakeExtension(object):
+    def __init__(self, name, sources, depends=()):
+        self.name = name
+        self.sources = list(sources)
+        self.depends = list(depends)
+
+
+class FakeBuildExt(object):
+    def __init__(self):
+        self.built_extensions = list()
+
+    def announce(self, msg, level=1):
+        pass
+
+    def build_extension(self, ext):
+        self.built_extensions.append(ext.name)
+
+
+@requires_python2
+class BuildExtTest(GeneratorTestCase):
+    def setUp(self):
+        super(BuildExtTest, self).setUp()
+        self.write_file('src/basic.cpx', 'pyx @type@')
+        self.write_file('src/basic.cpd', 'pxd @type@')
+        self.write_file('src/other.cpx', 'other')
+        self.created_generators = list()
+
+    def create_build_ext(self, **options):
+        def generator_factory():
+            generator = self.create_generator()
+            generator.register_extension('.cpd', '.pxd')
+            generator.register_action('src', 'basic.*', type_outputs(['INT32', 'INT64']))
+            generator.register_action('src', 'other.*', single_output())
+            self.created_generators.append(generator)
+            return generator
+
+        return make_build_ext(generator_factory, base_class=FakeBuildExt, cythonize_sources=False, **options)()
+
+    def test_only_sources_of_the_extension_generated(self):
+        build_ext = self.create_build_ext()
+        build_ext.build_extension(FakeExtension('basic_INT32', ['src/basic_INT32.pyx']))
+
+        self.assertEqual(build_ext.built_extensions, ['basic_INT32'])
+        # the companion .pxd is generated too
+        self.assertEqual(self.read_file('src/basic_INT32.pyx'), 'pyx INT32')
+        self.assertEqual(self.read_file('src/basic_INT32.pxd'), 'pxd INT32')
+        self.assertFalse(os.path.exists(self.path('src', 'basic_INT64.pyx')))
+        self.assertFalse(os.path.exists(self.path('src', 'other.pyx')))
+
+    def test_generator_created_once(self):
+        build_ext = self.create_build_ext()
+        build_ext.build_extension(FakeExtension('basic_INT32', ['src/basic_INT32.pyx']))
+        build_ext.build_extension(FakeExtension('other', ['src/other.pyx'], depends=['src/basic_INT64.pxd']))
+
+        self.assertEqual(len(self.created_generators), 1)
+        self.assertEqual(self.read_file('src/other.pyx'), 'other')
+        self.assertEqual(self.read_file('src/basic_INT64.pxd'), 'pxd INT64')
+
+    def test_up_to_date_sources_not_generated(self):
+        build_ext = self.create_build_ext()
+        extension = FakeExtension('basic_INT32', ['src/basic_INT32.pyx'])
+        self.assertEqual(len(build_ext.generate_extension_sources(extension)), 2)
+        self.assertEqual(build_ext.generate_extension_sources(extension), [])
+
+    def test_other_generated_files_listed_in_depends(self):
+        build_ext = self.create_build_ext()
+        build_ext.build_extension(FakeExtension('other', ['src/other.pyx']))
+
+        # other.pyx could cimport basic_INT64.pxd: sources are not parsed
+        self.assertFalse(os.path.exists(self.path('src', 'basic_INT64.pxd')))
+
+        build_ext.build_extension(FakeExtension('other', ['src/other.pyx'], depends=['src/basic_INT64.pxd']))
+        self.assertEqual(self.read_file('src/basic_INT64.pxd'), 'pxd INT64')
@@ -0,0 +1,90 @@
+import unittest
+
+from cygenja.jinja2_environment import create_environment
+from cygenja.run_report import COPIED, RENDERED
+from cygenja.static_templates import StaticTemplates, static_output_length, template_syntax
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, type_outputs
+
+SYNTAX = template_syntax(create_environment())
+
+
+class StaticOutputLengthTest(unittest.TestCase):
+    def test_static_sources(self):
+        self.assertEqual(static_output_length(b'cdef int i\n', SYNTAX), 10)
+        self.assertEqual(static_output_length(b'cdef int i', SYNTAX), 10)
+
+    def test_not_static_sources(self):
+        self.assertIsNone(static_output_length(b'cdef @type@ i\n', SYNTAX))
+        self.assertIsNone(static_output_length(b'{% if x %}{% endif %}', SYNTAX))
+        self.assertIsNone(static_output_length(b'cdef int i\r\n', SYNTAX))
+        self.assertIsNone(static_output_length(b'\xff', SYNTAX))
+
+    def test_trailing_newline_kept(self):
+        syntax = template_syntax(create_environment(keep_trailing_newline=True))
+
+        self.assertEqual(static_output_length(b'cdef int i\n', syntax), 11)
+
+
+class StaticTemplatesTest(GeneratorTestCase):
+    def setUp(self):
+        super(StaticTemplatesTest, self).setUp()
+        self.template_filename = self.write_file('a.cpx', 'static\n')
+        self.syntax_requests = list()
+
+    def syntax_factory(self):
+        self.syntax_requests.append(True)
+        return SYNTAX
+
+    def test_saved_detection(self):
+        static_templates = StaticTemplates(self.path('static.json'))
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory), 6)
+        static_templates.save()
+
+        static_templates = StaticTemplates(self.path('static.json'))
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory), 6)
+        self.write_file('a.cpx', '@not static@')
+        self.assertIsNone(static_templates.output_length(self.template_filename, self.syntax_factory))
+        self.assertEqual(len(self.syntax_requests), 1)
+
+        # another syntax empties the cache
+        static_templates.set_syntax(template_syntax(create_environment(keep_trailing_newline=True)))
+        self.write_file('a.cpx', 'static\n')
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory), 7)
+
+    def test_template_read_once_per_run(self):
+        static_templates = StaticTemplates(self.path('static.json'))
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory, mtime_ns=1), 6)
+
+        # same modification time: the template is not read again during the run
+        self.write_file('a.cpx', 'longer static\n')
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory, mtime_ns=1), 6)
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory, mtime_ns=2), 13)
+
+        self.write_file('a.cpx', 'static\n')
+        static_templates.start_run()
+        self.assertEqual(static_templates.output_length(self.template_filename, self.syntax_factory, mtime_ns=2), 6)
+
+
+@requires_python2
+class CopiedStaticTemplatesTest(GeneratorTestCase):
+    def generate(self, **options):
+        generator = self.create_generator(**options)
+        generator.register_action('src', '*.cpx', type_outputs(['INT32', 'INT64']))
+        generator.generate('src', '*.cpx')
+        return generator.last_run_report().counts()
+
+    def test_static_template_copied(self):
+        self.write_file('src/a.cpx', 'cdef int i\n')
+        counts = self.generate()
+
+        self.assertEqual((counts[COPIED], counts[RENDERED]), (2, 0))
+        self.assertEqual(self.read_file('src/a_INT32.pyx'), 'cdef int i')
+        self.assertEqual(self.read_file('src/a_INT64.pyx'), 'cdef int i')
+
+    def test_copy_disabled(self):
+        self.write_file('src/a.cpx', 'cdef int i\n')
+        counts = self.generate(copy_static_templates=False)
+
+        self.assertEqual((counts[COPIED], counts[RENDERED]), (0, 2))
+        self.assertEqual(self.read_file('src/a_INT32.pyx'), 'cdef int i')
@@ -0,0 +1,202 @@
+import os
+import subprocess
+import unittest
+
+from cygenja.generator import STATE_DIRECTORY_NAME, TEMPLATE_HASHES_FILENAME
+from cygenja.run_report import WRITTEN
+from cygenja.template_hashes import TemplateHashes, git_blob_hash, git_blob_hashes
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2, single_output
+
+
+def git_available():
+    try:
+        return subprocess.call(['git', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0
+    except OSError:
+        return False
+
+
+requires_git = unittest.skipUnless(git_available(), 'git is not installed')
+
+
+class GitTestCase(GeneratorTestCase):
+    def setUp(self):
+        super(GitTestCase, self).setUp()
+        self.write_file('src/a.cpx', 'a @name@', mtime=1000000000)
+        self.write_file('src/b.cpx', 'b @name@', mtime=1000000000)
+
+    def skip_inside_repository(self):
+        # the temporary directory could be inside a repository
+        if git_available() and subprocess.call(['git', 'rev-parse', '--git-dir'], cwd=self.root_directory,
+                                               stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0:
+            self.skipTest('the temporary directory is inside a repository')
+
+    def git(self, *arguments):
+        """
+        Run a :program:`git` command in the temporary tree and return its output.
+
+        """
+        # the commits don't depend on the configuration of the user
+        command = ['git', '-c', 'user.name=cygenja', '-c', 'user.email=cygenja@example.com'] + list(arguments)
+        return subprocess.check_output(command, cwd=self.root_directory, stderr=subprocess.STDOUT).decode('ascii')
+
+    def init_repository(self):
+        self.git('init', '-q')
+        self.git('add', 'src')
+        self.git('commit', '-q', '-m', 'Templates')
+        return self.git('rev-parse', 'HEAD').strip()
+
+
+class GitBlobHashTest(GitTestCase):
+    def test_known_hashes(self):
+        self.assertEqual(git_blob_hash(self.write_file('empty.cpx', '')), 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391')
+        self.assertEqual(git_blob_hash(self.write_file('hello.cpx', 'hello\n')),
+                         'ce013625030ba8dba906f756967f9e9ca394464a')
+
+    def test_outside_of_repository(self):
+        self.skip_inside_repository()
+        self.assertIsNone(git_blob_hashes(self.root_directory))
+
+
+@requires_git
+class GitBlobHashesTest(GitTestCase):
+    def test_tracked_modified_and_untracked_files(self):
+        self.init_repository()
+        self.write_file('src/b.cpx', 'changed b')
+        self.write_file('src/c.cpx', 'untracked c')
+
+        hashes = git_blob_hashes(self.root_directory)
+
+        self.assertEqual(hashes, {self.path('src', 'a.cpx'): self.git('hash-object', 'src/a.cpx').strip(),
+                                  self.path('src', 'b.cpx'): self.git('hash-object', 'src/b.cpx').strip()})
+        self.assertEqual(hashes[self.path('src', 'b.cpx')], git_blob_hash(self.path('src', 'b.cpx')))
+
+    def test_sub_directory(self):
+        self.init_repository()
+
+        self.assertEqual(sorted(git_blob_hashes(self.path('src'))), [self.path('src', 'a.cpx'),
+                                                                     self.path('src', 'b.cpx')])
+
+
+class TemplateHashesTest(GeneratorTestCase):
+    def test_saved_and_reloaded(self):
+        filename = self.path('hashes.json')
+        template_filename = self.write_file('src/a.cpx', 'a')
+        template_hashes = TemplateHashes(filename, self.root_directory)
+        template_hashes.set_recorded_hash(self.path('src', 'a.pyx'), template_hashes.template_hash(template_filename))
+        template_hashes.set_recorded_hash(self.path('src', 'b.pyx'), 'b')
+        template_hashes.remove_recorded_hash(self.path('src', 'b.pyx'))
+        template_hashes.save()
+
+        template_hashes = TemplateHashes(filename, self.root_directory)
+        self.assertEqual(template_hashes.recorded_hash(self.path('src', 'a.pyx')), git_blob_hash(template_filename))
+        self.assertIsNone(template_hashes.recorded_hash(self.path('src', 'b.pyx')))
+        self.assertIsNone(template_hashes.commit())
+
+    def test_current_hashes_forgotten_between_runs(self):
+        template_filename = self.write_file('src/a.cpx', 'a')
+        template_hashes = TemplateHashes(self.path('hashes.json'), self.root_directory)
+        first_hash = template_hashes.template_hash(template_filename)
+
+        # templates are hashed once per run
+        self.write_file('src/a.cpx', 'changed a')
+        self.assertEqual(template_hashes.template_hash(template_filename), first_hash)
+        template_hashes.start_run()
+        self.assertEqual(template_hashes.template_hash(template_filename), git_blob_hash(template_filename))
+
+
+@requires_python2
+class ChangeDetectionTest(GitTestCase):
+    def create_generator(self, **options):
+        generator = super(ChangeDetectionTest, self).create_generator(**options)
+        generator.register_action('src', '*.cpx', single_output({'name': 'x'}))
+        return generator
+
+    def generate(self, change_detection):
+        """
+        Generate the files of the temporary tree.
+
+        Returns:
+            The sorted list of the written files (relative).
+        """
+        written_filenames = list()
+
+        def record_written_file(outcome, filename):
+            if outcome == WRITTEN:
+                written_filenames.append(os.path.relpath(filename, self.root_directory))
+
+        generator = self.create_generator(change_detection=change_detection)
+        generator.add_event_listener(record_written_file)
+        generator.generate('src', '*.cpx')
+        return sorted(written_filenames)
+
+    def change_template(self):
+        # same modification time, older than the generated files
+        self.write_file('src/b.cpx', 'changed b @name@', mtime=1000000000)
+
+    def hashes_filename(self):
+        return self.path(STATE_DIRECTORY_NAME, TEMPLATE_HASHES_FILENAME)
+
+    def test_mtime_misses_content_changes(self):
+        self.generate('mtime')
+        self.change_template()
+
+        self.assertEqual(self.generate('mtime'), [])
+        self.assertFalse(os.path.exists(self.hashes_filename()))
+
+    def test_hash_detects_content_changes(self):
+        self.assertEqual(self.generate('hash'), [os.path.join('src', 'a.pyx'), os.path.join('src', 'b.pyx')])
+        self.assertEqual(self.generate('hash'), [])
+
+        self.change_template()
+        self.assertEqual(self.generate('hash'), [os.path.join('src', 'b.pyx')])
+        self.assertEqual(self.read_file('src/b.pyx'), 'changed b x')
+
+    def test_files_generated_before_tested_with_mtimes(self):
+        self.generate('mtime')
+
+        # hashes are recorded for the up to date files
+        self.assertEqual(self.generate('hash'), [])
+        self.change_template()
+        self.assertEqual(self.generate('hash'), [os.path.join('src', 'b.pyx')])
+
+    @requires_git
+    def test_git_detects_content_changes(self):
+        commit = self.init_repository()
+        self.generate('git')
+        self.assertEqual(TemplateHashes(self.hashes_filename(), self.root_directory).commit(), commit)
+
+        # a fresh checkout gives the same modification time to all the files
+        self.change_template()
+        for filename in ('src/a.pyx', 'src/b.pyx'):
+            self.set_mtime(filename, 1000000000)
+        self.assertEqual(self.generate('git'), [os.path.join('src', 'b.pyx')])
+
+        logger, messages = self.create_logger()
+        self.create_generator(change_detection='git', logger=logger).generate('src', '*.cpx')
+        self.assertIn('Templates compared with their hashes recorded up to commit %s' % commit, messages)
+
+    def test_git_without_repository(self):
+        self.skip_inside_repository()
+        self.generate('git')
+        self.change_template()
+
+        logger, messages = self.create_logger()
+        generator = self.create_generator(change_detection='git', logger=logger)
+        generator.generate('src', '*.cpx')
+        self.assertIn("Git repository not found in '%s': templates are hashed" % self.root_directory, messages)
+        self.assertEqual(self.read_file('src/b.pyx'), 'changed b x')
+
+    def test_clean_run(self):
+        self.generate('hash')
+        self.set_mtime('.cygenja/%s' % TEMPLATE_HASHES_FILENAME, 1000000000)
+        self.create_generator(change_detection='hash').generate('src', '*.cpx', action_ch='c')
+
+        # clean runs don't write in the state directory
+        self.assertFalse(os.path.exists(self.path('src', 'a.pyx')))
+        self.assertEqual(os.path.getmtime(self.hashes_filename()), 1000000000)
+        # removed files are generated again whatever their recorded hashes
+        self.assertEqual(self.generate('hash'), [os.path.join('src', 'a.pyx'), os.path.join('src', 'b.pyx')])
+
+    def test_unknown_change_detection(self):
+        self.assertRaises(RuntimeError, self.create_generator, change_detection='size')
@@ -0,0 +1,85 @@
+import unittest
+
+from cygenja.filters import type_filters
+from cygenja.filters.type_registry import TypeRegistry, CYSPARSE_TYPES, CYSPARSE_COMPLEX_ELEMENT_TYPES
+
+from tests.generator.generator_test_case import GeneratorTestCase, requires_python2
+
+
+class TypeRegistryTest(unittest.TestCase):
+    def test_tables_match_reference_filters(self):
+        filters = TypeRegistry().filters()
+
+        for cysparse_type in CYSPARSE_TYPES:
+            enum_type = type_filters.type2enum(cysparse_type)
+            self.assertEqual(filters['type2enum'](cysparse_type), enum_type)
+            for filter_name in ('cysparse_type_to_numpy_c_type', 'cysparse_type_to_numpy_type',
+                                'cysparse_type_to_numpy_enum_type'):
+                self.assertEqual(filters[filter_name](enum_type), getattr(type_filters, filter_name)(enum_type))
+            self.assertEqual(filters['cysparse_type_to_real_sum_cysparse_type'](cysparse_type),
+                             type_filters.cysparse_type_to_real_sum_cysparse_type(cysparse_type))
+
+        for cysparse_type in CYSPARSE_COMPLEX_ELEMENT_TYPES:
+            self.assertEqual(filters['cysparse_real_type_from_real_cysparse_complex_type'](cysparse_type),
+                             type_filters.cysparse_real_type_from_real_cysparse_complex_type(cysparse_type))
+
+    def test_unknown_types(self):
+        filters = TypeRegistry().filters()
+
+        # string transformations are computed on the fly
+        self.assertEqual(filters['cysparse_type_to_numpy_type']('INT8_T'), 'int8')
+        # other filters only know the registered types
+        self.assertRaises(TypeError, filters['cysparse_type_to_real_sum_cysparse_type'], 'INT8_t')
+        self.assertRaises(TypeError, filters['cysparse_real_type_from_real_cysparse_complex_type'], 'FLOAT64_t')
+
+    def test_user_types(self):
+        registry = TypeRegistry(register_cysparse_types=False)
+        registry.register_type('FLOAT64_t', real_sum_type='FLOAT64_t')
+        registry.register_type('INT8_t', real_sum_type='FLOAT64_t')
+
+        self.assertEqual(registry.registered_types_list(), ['FLOAT64_t', 'INT8_t'])
+        self.assertEqual(registry.filters()['cysparse_type_to_real_sum_cysparse_type']('INT8_t'), 'FLOAT64_t')
+
+        # tables are computed when the filters are asked for
+        filters = registry.filters()
+        registry.register_type('INT16_t', real_sum_type='FLOAT64_t')
+        self.assertRaises(TypeError, filters['cysparse_type_to_real_sum_cysparse_type'], 'INT16_t')
+
+    def test_validate(self):
+        registry = TypeRegistry(register_cysparse_types=False)
+        registry.register_type('FLOAT64', real_sum_type='FLOAT64')
+        self.assertRaises(TypeError, registry.validate)
+
+        registry = TypeRegistry(register_cysparse_types=False)
+        registry.register_type('INT8_t', real_sum_type='FLOAT64_t')
+        self.assertRaises(TypeError, registry.validate)
+
+        registry = TypeRegistry(register_cysparse_types=False)
+        registry.register_type('COMPLEX64_t', real_sum_type='COMPLEX64_t', real_part_type='COMPLEX64_t')
+        self.assertRaises(TypeError, registry.validate)
+
+
+class CommonTypeFiltersTest(GeneratorTestCase):
+    def test_registered_filters(self):
+        generator = self.create_generator()
+        generator.register_common_type_filters()
+
+        self.assertTrue(set(TypeRegistry().filters()).issubset(generator.registered_filters_list()))
+
+    def test_invalid_registry(self):
+        registry = TypeRegistry(register_cysparse_types=False)
+        registry.register_type('INT8_t', real_sum_type='FLOAT64_t')
+
+        generator = self.create_generator()
+        self.assertRaises(RuntimeError, generator.register_common_type_filters, registry)
+
+    @requires_python2
+    def test_rendering(self):
+        self.write_file('basic.cpx', '@type|cysparse_type_to_numpy_c_type@ @type|cysparse_type_to_real_sum_cysparse_type@')
+
+        generator = self.create_generator()
+        generator.register_common_type_filters()
+        generator.register_default_action('*.cpx', lambda: iter([('', {'type': 'INT32_t'})]))
+        generator.generate('.', '*.cpx')
+
+        self.assertEqual(self.read_file('basic.pyx'), 'npy_int32 FLOAT64_t')
@@ -0,0 +1,120 @@
+import pickle
+import sys
+import threading
+import unittest
+
+from cygenja.treemap.treemap import TreeMap
+
+# locations must be str (basestring)
+requires_python2 = unittest.skipIf(sys.version_info[0] > 2, 'TreeMap locations are Python 2 strings')
+
+
+def append_to(value):
+    """
+    Return an update of :meth:`TreeMap.update_element` appending a value to a **new** list.
+
+    """
+    def update(element):
+        return (element or []) + [value]
+
+    return update
+
+
+@requires_python2
+class TreeMapTest(unittest.TestCase):
+    def test_elements(self):
+        tree = TreeMap()
+        tree.add_element('src', 1)
+        tree.add_element('src/sub/deep', 3)
+
+        self.assertEqual(tree.retrieve_element('src'), 1)
+        self.assertIsNone(tree.retrieve_element('src/sub'))
+        self.assertEqual(tree.retrieve_element_or_default('other', 'default'), 'default')
+        self.assertRaises(RuntimeError, tree.add_unique_element, 'src', 2)
+        self.assertEqual(list(tree.generate_elements_along('src/sub/deep/deeper')), [1, 3])
+
+    def test_update_element(self):
+        for tree in (TreeMap(), TreeMap(copy_on_write=True)):
+            tree.update_element('src/sub', append_to(1))
+            tree.update_element('src/sub', append_to(2))
+
+            self.assertEqual(tree.retrieve_element('src/sub'), [1, 2])
+
+    def test_parents(self):
+        tree = TreeMap()
+        node = tree.add_element('src/sub', 1)
+
+        self.assertEqual(node.get_depth(), 2)
+        self.assertIs(node.get_parent().get_parent(), tree._get_dummy_root())
+        self.assertIsNone(tree._get_dummy_root().get_parent())
+
+
+@requires_python2
+class CopyOnWriteTreeMapTest(unittest.TestCase):
+    def test_snapshot_unchanged_by_writes(self):
+        tree = TreeMap(copy_on_write=True)
+        tree.add_element('src/sub', 1)
+        snapshot = tree.snapshot()
+        tree.add_element('src/sub', 2)
+        tree.add_element('other', 3)
+
+        self.assertEqual(snapshot.retrieve_element('src/sub'), 1)
+        self.assertIsNone(snapshot.retrieve_element_or_default('other'))
+        self.assertEqual(tree.retrieve_element('src/sub'), 2)
+        self.assertEqual(snapshot.version() + 2, tree.version())
+
+    def test_snapshot_frozen(self):
+        snapshot = TreeMap(copy_on_write=True).snapshot()
+
+        self.assertTrue(snapshot.is_frozen())
+        self.assertRaises(RuntimeError, snapshot.add_element, 'src', 1)
+        self.assertRaises(RuntimeError, snapshot.update_element, 'src', append_to(1))
+        self.assertRaises(RuntimeError, TreeMap().snapshot)
+
+    def test_no_stale_parents(self):
+        tree = TreeMap(copy_on_write=True)
+        tree.add_element('src/sub/deep', 1)
+        old_snapshot = tree.snapshot()
+        tree.add_element('src/other', 2)
+        tree.add_element('src/sub', 3)
+        snapshot = tree.snapshot()
+
+        # nodes are shared between versions: no node links to the parent of a version
+        to_visit = [snapshot._get_dummy_root()]
+        while to_visit:
+            node = to_visit.pop()
+            self.assertIsNone(node.get_parent())
+            for child_node in node.get_child_nodes():
+                self.assertEqual(child_node.get_depth(), node.get_depth() + 1)
+                to_visit.append(child_node)
+        self.assertIs(old_snapshot._get_node(old_snapshot._get_location_descriptor('src/sub/deep')),
+                      snapshot._get_node(snapshot._get_location_descriptor('src/sub/deep')))
+
+    def test_pickled(self):
+        tree = TreeMap(copy_on_write=True)
+        tree.add_element('src', 1)
+        tree = pickle.loads(pickle.dumps(tree))
+
+        tree.add_element('other', 2)
+        self.assertEqual(tree.snapshot().retrieve_element('src'), 1)
+
+    def test_concurrent_updates(self):
+        tree = TreeMap(copy_on_write=True)
+
+        def update(thread_index):
+            for index in range(200):
+                tree.update_element('src/sub', append_to((thread_index, index)))
+
+        threads = [threading.Thread(target=update, args=(thread_index,)) for thread_index in range(4)]
+        check_interval = sys.getcheckinterval()
+        # switch threads as often as possible
+        sys.setcheckinterval(1)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(check_interval)
+
+        self.assertEqual(len(tree.retrieve_element('src/sub')), 800)